@@ -0,0 +1,118 @@
+"""Recall / QPS / memory comparison of the ANN index types against IndexFlatIP.
+
+Usage (from the repo root):
+    python backend/benchmarks/ann_index.py --n 200000 --queries 2000
+    python backend/benchmarks/ann_index.py --from-index data/faiss_index_v3.bin
+
+Without --from-index a clustered synthetic corpus of normalized 768-d vectors
+is used, so no model download is needed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.index_factory import INDEX_TYPES, index_from_vectors, apply_search_params, all_vectors
+
+def synthetic_corpus(n: int, dimension: int, seed: int = 0):
+    # Sentence embeddings are clustered by topic, uniform noise would
+    # make every ANN index look worse than it is in practice
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 500, 16), dimension)).astype('float32')
+    labels = rng.integers(0, len(centers), n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def load_corpus(index_path: str):
+    from core.index_store import IndexStore
+    store = IndexStore(index_path, 768)
+    index, _ = store.load(lambda: faiss.IndexFlatIP(768))
+    return all_vectors(index)
+
+def make_queries(vectors, count: int, seed: int = 1):
+    # Perturbed copies of stored sentences, like paraphrased submissions
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    queries = picked + 0.05 * rng.standard_normal(picked.shape).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+def measure(index, queries, k: int = 1):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return ids, len(queries) / elapsed if elapsed else float("inf")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--from-index", help="benchmark on vectors from an existing index path")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", default="8,16,64", help="comma-separated sweep")
+    parser.add_argument("--ef-search", default="32,64,128", help="comma-separated sweep")
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = default)")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    dimension = 768
+    vectors = load_corpus(args.from_index) if args.from_index else synthetic_corpus(args.n, dimension)
+    queries = make_queries(vectors, args.queries)
+    print(f"Corpus: {len(vectors)} vectors, {len(queries)} queries")
+
+    base_config = {"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m, "train_size": 100000}
+    flat = index_from_vectors(vectors, dimension, dict(base_config, index_type="flat"))
+    truth, _ = measure(flat, queries)
+
+    results = []
+    for index_type in args.types.split(","):
+        config = dict(base_config, index_type=index_type)
+        start = time.perf_counter()
+        index = index_from_vectors(vectors, dimension, config)
+        build_seconds = time.perf_counter() - start
+        ram_per_million = faiss.serialize_index(index).nbytes / len(vectors) * 1_000_000
+
+        if index_type in ("ivf_flat", "ivf_pq", "opq_ivf_pq"):
+            sweep = [("nprobe", int(v)) for v in args.nprobe.split(",")]
+        elif index_type == "hnsw":
+            sweep = [("ef_search", int(v)) for v in args.ef_search.split(",")]
+        else:
+            sweep = [(None, None)]
+
+        for param, value in sweep:
+            if param:
+                apply_search_params(index, **{param: value})
+            ids, qps = measure(index, queries)
+            recall = float(np.mean(ids[:, 0] == truth[:, 0]))
+            row = {
+                "index_type": index_type,
+                "param": param,
+                "value": value,
+                "recall_at_1": round(recall, 4),
+                "qps": round(qps, 1),
+                "ram_mb_per_million": round(ram_per_million / 2**20, 1),
+                "build_seconds": round(build_seconds, 2),
+            }
+            results.append(row)
+            print(f"{index_type:>11} {param or '':>9}={value or '':<4} recall@1={row['recall_at_1']:.4f} "
+                  f"qps={row['qps']:>10} ram/1M={row['ram_mb_per_million']:>8} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"corpus_size": len(vectors), "queries": len(queries), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
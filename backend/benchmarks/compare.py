@@ -0,0 +1,92 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage (from the repo root):
+    python backend/benchmarks/compare.py baseline.json current.json
+    python backend/benchmarks/compare.py baseline.json current.json --tolerance 0.2 --only p50_ms,p99_ms
+
+Works on the JSON of pipeline.py, index_scaling.py, ann_index.py and
+inference_backends.py. Numbers are matched by their path in both files;
+the key name says which way is better:
+  *_ms, *_seconds, seconds, rss_mb, bytes_per_vector   lower is better
+  *_per_second, qps, self_hit_rate, recall_*, *speedup higher is better
+Everything else (counts, settings) is ignored. Exits with status 1 when
+any metric is worse than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_ms", "_seconds", "rss_mb", "bytes_per_vector", "ram_mb_per_million")
+HIGHER_IS_BETTER = ("_per_second", "qps", "self_hit_rate", "speedup")
+
+def direction(key: str):
+    # -1: lower is better, +1: higher is better, None: not a performance number
+    if key == "seconds" or key.endswith(LOWER_IS_BETTER):
+        return -1
+    if key.endswith(HIGHER_IS_BETTER) or key.startswith("recall"):
+        return 1
+    return None
+
+def flatten(value, path=()):
+    # {("stages", "encode", "p50_ms"): 1.2, ...}; list items are keyed by
+    # their identifying field when they have one (e.g. index_type, backend)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, path + (str(key),))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = str(i)
+            if isinstance(item, dict):
+                label = "/".join(str(item[k]) for k in ("index_type", "backend", "param", "value") if k in item) or label
+            yield from flatten(item, path + (label,))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool) and path:
+        yield path, value
+
+def compare(baseline: dict, current: dict, tolerance: float, only=None) -> list[dict]:
+    # Run details under "meta" are not measurements
+    base = dict(flatten({k: v for k, v in baseline.items() if k != "meta"}))
+    rows = []
+    for path, value in flatten({k: v for k, v in current.items() if k != "meta"}):
+        key = path[-1]
+        better = direction(key)
+        if better is None or path not in base or (only and key not in only):
+            continue
+        old = base[path]
+        if not old:
+            continue
+        change = (value - old) / abs(old)
+        rows.append({
+            "metric": ".".join(path), "baseline": old, "current": value, "change": round(change, 4),
+            "regression": change * better < -tolerance,
+            "improvement": change * better > tolerance,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative change (0.1 = 10%%)")
+    parser.add_argument("--only", help="comma-separated metric names to compare, e.g. p50_ms,calls_per_second")
+    parser.add_argument("--all", action="store_true", help="list unchanged metrics too")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    only = set(args.only.split(",")) if args.only else None
+    rows = compare(baseline, current, args.tolerance, only)
+
+    for meta in ("revision", "timestamp"):
+        print(f"{meta}: {baseline.get('meta', {}).get(meta)} -> {current.get('meta', {}).get(meta)}")
+    regressions = [r for r in rows if r["regression"]]
+    for row in rows:
+        if row["regression"] or row["improvement"] or args.all:
+            mark = "WORSE" if row["regression"] else "better" if row["improvement"] else ""
+            print(f"{mark:>6} {row['metric']}: {row['baseline']} -> {row['current']} ({row['change']:+.1%})")
+    print(f"{len(rows)} metrics compared, {len(regressions)} regressions beyond {args.tolerance:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
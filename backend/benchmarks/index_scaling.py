@@ -0,0 +1,157 @@
+"""How add throughput, search latency and memory scale with the index size.
+
+Usage (from the repo root):
+    python backend/benchmarks/index_scaling.py --types flat,ivf_pq --output scaling.json
+    python backend/benchmarks/index_scaling.py --sizes 10000,100000,1000000,10000000 --types ivf_pq --max-gb 16
+
+One index per type grows through every size in --sizes with synthetic
+clustered 768-d vectors (benchmarks/synthetic.py), generated a chunk at a
+time. At each size it records the add rate since the previous size,
+single-query latency percentiles, batched queries per second, the share of
+perturbed stored vectors found as their own top hit, and resident memory.
+Sizes whose estimated memory exceeds --max-gb are skipped. Index settings
+come from INDEX_NLIST, INDEX_PQ_M, ... as in the API (core/index_factory.py).
+Recall against exact search is measured by benchmarks/ann_index.py.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.index_factory import index_config_from_env, build_index, min_training_points, train_index, apply_search_params
+from core.metrics import resident_memory_bytes
+from benchmarks.synthetic import synthetic_vectors
+from benchmarks.pipeline import summarise, git_revision
+
+DIMENSION = 768
+
+def estimated_bytes_per_vector(config: dict) -> float:
+    # Before anything is measured: raw vectors, PQ codes or HNSW links, plus ids
+    if config["index_type"] in ("ivf_pq", "opq_ivf_pq"):
+        return config["pq_m"] + 8
+    if config["index_type"] == "hnsw":
+        return DIMENSION * 4 + config["hnsw_m"] * 2 * 4
+    return DIMENSION * 4 + (8 if config["index_type"] == "ivf_flat" else 0)
+
+def make_queries(block, count: int, seed: int = 1):
+    # Perturbed copies of the first `count` rows of a stored block, like
+    # paraphrased sentences
+    rng = np.random.default_rng(seed)
+    queries = block[:count] + 0.05 * rng.standard_normal((min(count, len(block)), DIMENSION)).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+def measure(index, queries, sources, single: int, batch: int) -> dict:
+    durations = []
+    for query in queries[:single]:
+        start = time.perf_counter()
+        index.search(query[None, :], 1)
+        durations.append(time.perf_counter() - start)
+    single_query = summarise(durations)
+
+    start = time.perf_counter()
+    hits = 0
+    for i in range(0, len(queries), batch):
+        _, ids = index.search(queries[i:i + batch], 1)
+        hits += int(np.sum(ids[:, 0] == sources[i:i + batch]))
+    seconds = time.perf_counter() - start
+    return {
+        "single_query": single_query,
+        "batch_queries_per_second": round(len(queries) / seconds, 1),
+        "self_hit_rate": round(hits / len(queries), 4),
+    }
+
+def scale_type(config: dict, sizes: list[int], args) -> dict:
+    results = {}
+    index = build_index(DIMENSION, **config)
+    if not index.is_trained:
+        train_n = max(min_training_points(**config), min(config["train_size"], sizes[0]))
+        start = time.perf_counter()
+        train_index(index, next(synthetic_vectors(train_n, DIMENSION, seed=args.seed + 100, chunk=train_n)), **config)
+        print(f"{config['index_type']}: trained on {train_n} vectors in {time.perf_counter() - start:.1f}s")
+    apply_search_params(index, **config)
+
+    per_vector = estimated_bytes_per_vector(config)
+    vectors = synthetic_vectors(sizes[-1], DIMENSION, seed=args.seed, chunk=args.chunk)
+    pending = np.zeros((0, DIMENSION), dtype='float32')
+    added_seconds = 0.0
+    previous, previous_rss = 0, None
+    last_block = None
+    for size in sizes:
+        if size * per_vector > args.max_gb * 2**30:
+            results[str(size)] = {"skipped": f"needs about {size * per_vector / 2**30:.1f} GB (--max-gb {args.max_gb})"}
+            print(f"{config['index_type']} {size}: skipped, {results[str(size)]['skipped']}")
+            break
+        while index.ntotal < size:
+            if not len(pending):
+                pending = next(vectors)
+            block, pending = pending[:size - index.ntotal], pending[size - index.ntotal:]
+            start = time.perf_counter()
+            index.add(block)
+            added_seconds += time.perf_counter() - start
+            last_block = (index.ntotal - len(block), block)
+
+        first_row, block = last_block
+        queries = make_queries(block, args.queries)
+        sources = np.arange(first_row, first_row + len(queries))
+        row = measure(index, queries, sources, args.single, args.batch)
+        rss = resident_memory_bytes()
+        if rss is not None:
+            row["rss_mb"] = round(rss / 2**20, 1)
+            if previous_rss is not None and rss > previous_rss:
+                # Memory growth since the previous size replaces the estimate
+                per_vector = (rss - previous_rss) / (size - previous)
+                row["bytes_per_vector"] = round(per_vector, 1)
+        row["add_vectors_per_second"] = round((size - previous) / added_seconds, 1) if added_seconds else None
+        results[str(size)] = row
+        print(f"{config['index_type']} {size}: p50={row['single_query'].get('p50_ms')}ms "
+              f"qps={row['batch_queries_per_second']} hits={row['self_hit_rate']} rss={row.get('rss_mb')}MB")
+        previous, previous_rss, added_seconds = size, rss, 0.0
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000,10000000")
+    parser.add_argument("--types", default=None, help="comma-separated index types (default: INDEX_TYPE)")
+    parser.add_argument("--queries", type=int, default=500, help="queries for the batched measurement")
+    parser.add_argument("--single", type=int, default=100, help="queries timed one at a time")
+    parser.add_argument("--batch", type=int, default=64, help="queries per batched search call")
+    parser.add_argument("--chunk", type=int, default=100000, help="vectors generated and added per step")
+    parser.add_argument("--max-gb", type=float, default=8.0, help="skip sizes estimated to need more memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads (0 = default)")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s)
+    base_config = index_config_from_env()
+    types = (args.types or base_config["index_type"]).split(",")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "dimension": DIMENSION,
+            "config": base_config,
+            "threads": args.threads or faiss.omp_get_max_threads(),
+            "queries": args.queries,
+        },
+        "results": {}
+    }
+    for index_type in types:
+        results["results"][index_type] = scale_type(dict(base_config, index_type=index_type), sizes, args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
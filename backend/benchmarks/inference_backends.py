@@ -0,0 +1,113 @@
+"""Accuracy parity and latency of the CPU inference backends against fp32 PyTorch.
+
+Usage (from the repo root):
+    python backend/benchmarks/inference_backends.py --backends torch_int8,onnx,onnx_int8
+    python backend/benchmarks/inference_backends.py --sentences my_sentences.txt --threads 4
+
+For each backend it reports the embedding cosine drift from fp32 (mean / min),
+the AI detector score drift in percentage points (mean / max), and latency.
+Models are cached under MODEL_CACHE_DIR (default data/models).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.inference_backend import BACKENDS, backend_config_from_env, load_sentence_model
+from core.ai_detector import AIDetector
+
+SAMPLE_SENTENCES = [
+    "The mitochondria is the powerhouse of the cell and produces most of its chemical energy.",
+    "In this essay I will argue that the industrial revolution reshaped family life in Britain.",
+    "Machine learning models can overfit when the training data is small or unrepresentative.",
+    "The results indicate a statistically significant correlation between sleep and grades.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose molecules.",
+    "Shakespeare's tragedies often explore ambition, guilt and the limits of human agency.",
+    "A balanced budget requires either reduced spending or increased taxation over time.",
+    "Climate change is expected to increase the frequency of extreme weather events.",
+    "Our survey of 200 students found that most preferred hybrid learning environments.",
+    "Furthermore, it is important to note that these findings have several limitations.",
+]
+
+def load_sentences(path: str = None, repeat: int = 1):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+    else:
+        sentences = SAMPLE_SENTENCES
+    return sentences * repeat
+
+def timed(func, runs: int):
+    func()  # warm-up
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(b for b in BACKENDS if b != "torch"))
+    parser.add_argument("--sentences", help="file with one sentence per line")
+    parser.add_argument("--repeat", type=int, default=10, help="repeat the sample to build a larger batch")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--detector-model", default="Hello-SimpleAI/chatgpt-detector-roberta")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.sentences, args.repeat)
+    document = " ".join(sentences)
+    base_config = dict(backend_config_from_env(), threads=args.threads or None)
+
+    def run(backend):
+        config = dict(base_config, backend=backend)
+        embedder = load_sentence_model(args.embedding_model, **config)
+        detector = AIDetector(args.detector_model, backend_config=config)
+        embeddings = embedder.encode(sentences, normalize_embeddings=True)
+        window_scores = np.array([w["score"] for w in detector.detect_windows(document)["windows"]])
+        sentence_scores = np.array([detector.detect(s) for s in sentences[:len(SAMPLE_SENTENCES)]])
+        return {
+            "embeddings": np.asarray(embeddings, dtype='float32'),
+            "detector_scores": np.concatenate([window_scores, sentence_scores]),
+            "encode_seconds": timed(lambda: embedder.encode(sentences, normalize_embeddings=True), args.runs),
+            "detect_seconds": timed(lambda: detector.detect(document), args.runs),
+        }
+
+    print(f"{len(sentences)} sentences, {len(document)} characters")
+    reference = run("torch")
+    results = []
+    for backend in ["torch"] + [b for b in args.backends.split(",") if b and b != "torch"]:
+        current = reference if backend == "torch" else run(backend)
+        cosine = np.sum(current["embeddings"] * reference["embeddings"], axis=1)
+        drift = np.abs(current["detector_scores"] - reference["detector_scores"])
+        row = {
+            "backend": backend,
+            "cosine_mean": round(float(cosine.mean()), 5),
+            "cosine_min": round(float(cosine.min()), 5),
+            "detector_drift_mean": round(float(drift.mean()), 3),
+            "detector_drift_max": round(float(drift.max()), 3),
+            "encode_ms_per_sentence": round(current["encode_seconds"] / len(sentences) * 1000, 3),
+            "detect_ms_per_document": round(current["detect_seconds"] * 1000, 1),
+            "encode_speedup": round(reference["encode_seconds"] / current["encode_seconds"], 2),
+            "detect_speedup": round(reference["detect_seconds"] / current["detect_seconds"], 2),
+        }
+        results.append(row)
+        print(f"{backend:>10} cos(mean/min)={row['cosine_mean']:.4f}/{row['cosine_min']:.4f} "
+              f"ai-drift(mean/max)={row['detector_drift_mean']:.2f}/{row['detector_drift_max']:.2f}pp "
+              f"encode={row['encode_ms_per_sentence']}ms/sent (x{row['encode_speedup']}) "
+              f"detect={row['detect_ms_per_document']}ms/doc (x{row['detect_speedup']})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sentences": len(sentences), "threads": args.threads, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
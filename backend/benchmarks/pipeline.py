@@ -0,0 +1,312 @@
+"""Offline latency and throughput of the detection pipeline, written as JSON.
+
+Usage (from the repo root):
+    python backend/benchmarks/pipeline.py --models tiny --output bench.json
+    python backend/benchmarks/pipeline.py --models cached --docs 300 --concurrency 1,4,16
+    python backend/benchmarks/pipeline.py --url http://127.0.0.1:8000 --skip stages
+
+Three sections, all on a seeded synthetic corpus (benchmarks/synthetic.py):
+  stages       each step in isolation: text extraction (txt, docx), sentence
+               splitting, stylometry, encoding, index add, search and AI detection
+  end_to_end   sequential POST /api/check latency
+  load         /api/check throughput and latency at each concurrency level
+
+Everything runs in a scratch directory (--workdir) with its own database and
+index, in process through the ASGI app unless --url points at a running API.
+--models tiny uses randomly initialised stand-ins (benchmarks/tiny_models.py)
+and spaCy's rule-based sentencizer, and needs no network; --models cached
+uses the real models from MODEL_CACHE_DIR / the Hugging Face cache and the
+installed en_core_web_sm. Downloads are disabled either way. Compare two
+result files with benchmarks/compare.py.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from benchmarks.synthetic import generate_corpus, write_documents
+from benchmarks.tiny_models import build_tiny_models
+
+def summarise(durations, total_seconds: float = None, items: int = None) -> dict:
+    # Latency percentiles in ms; with total_seconds, throughput as well
+    durations = np.asarray(durations, dtype=np.float64) * 1000
+    summary = {"count": int(len(durations))}
+    if len(durations):
+        summary.update({
+            "mean_ms": round(float(durations.mean()), 3),
+            "p50_ms": round(float(np.percentile(durations, 50)), 3),
+            "p90_ms": round(float(np.percentile(durations, 90)), 3),
+            "p99_ms": round(float(np.percentile(durations, 99)), 3),
+            "max_ms": round(float(durations.max()), 3),
+        })
+    if total_seconds:
+        summary["calls_per_second"] = round(len(durations) / total_seconds, 2)
+        if items:
+            summary["items_per_second"] = round(items / total_seconds, 1)
+    return summary
+
+def time_each(func, items, warmup: int = 1, size=None) -> dict:
+    # One call per item; size(item), e.g. its sentence count, adds items_per_second
+    for item in items[:warmup]:
+        func(item)
+    durations = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        func(item)
+        durations.append(time.perf_counter() - t0)
+    return summarise(durations, time.perf_counter() - start, sum(size(item) for item in items) if size else None)
+
+def prepare_environment(args) -> dict:
+    # Must run before any app module is imported: their settings are read
+    # from the environment at import time
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="plagiarism-bench-"))
+    if os.path.exists(os.path.join(workdir, "data")) and not args.keep_data:
+        shutil.rmtree(os.path.join(workdir, "data"))
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+
+    models = {}
+    if args.models == "tiny":
+        paths = build_tiny_models(os.path.abspath(args.tiny_dir))
+        os.environ["EMBEDDING_MODEL"] = paths["encoder"]
+        os.environ["AI_DETECTOR_MODEL"] = paths["detector"]
+        # Rule-based splitter: no en_core_web_sm needed
+        os.environ["SPACY_MODE"] = "sentencizer"
+        models = dict(paths)
+    else:
+        models = {"encoder": os.environ.get("EMBEDDING_MODEL", "default"),
+                  "detector": os.environ.get("AI_DETECTOR_MODEL", "default")}
+    # Never download: a missing model fails fast instead
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    os.environ["SPACY_AUTO_DOWNLOAD"] = "0"
+    models["spacy"] = os.environ.get("SPACY_MODE", "senter")
+    if not os.path.isabs(os.environ.get("MODEL_CACHE_DIR", "data/models")):
+        # Relative to where the benchmark was started, not the scratch directory
+        os.environ["MODEL_CACHE_DIR"] = os.path.abspath(os.environ.get("MODEL_CACHE_DIR", "data/models"))
+    # Every check does the full work unless asked otherwise
+    os.environ.setdefault("DEDUP_POLICY", args.dedup)
+    os.environ.setdefault("PRELOAD_WAIT", "1")
+    os.environ.setdefault("TRACE_MODE", "off")
+    os.chdir(workdir)
+    return {"workdir": workdir, "models": models}
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def bench_stages(corpus: list[dict], workdir: str) -> dict:
+    from core.extractor import TextExtractor
+    from core.preprocessor import Preprocessor
+    from core.stylometry import Stylometry
+    from core.ai_engine import AIEngine
+    from core.ai_detector import AIDetector
+
+    results = {}
+    texts = [doc["text"] for doc in corpus]
+
+    files = write_documents(corpus, os.path.join(workdir, "corpus"), formats=("txt", "docx"))
+    for ext in ("txt", "docx"):
+        paths = [p for p in files if p.endswith("." + ext)]
+        results[f"extract_{ext}"] = time_each(TextExtractor.extract_text, paths)
+        print(f"extract_{ext}: {results[f'extract_{ext}']}")
+
+    results["preprocess"] = time_each(Preprocessor.preprocess, texts)
+    start = time.perf_counter()
+    splits = [p["sentences"] for p in Preprocessor.preprocess_batch(texts)]
+    total_sentences = sum(len(s) for s in splits)
+    seconds = time.perf_counter() - start
+    results["preprocess_batch"] = {"documents": len(texts), "sentences": total_sentences, "seconds": round(seconds, 3),
+                                   "items_per_second": round(total_sentences / seconds, 1)}
+    results["stylometry"] = time_each(Stylometry.extract, texts)
+    print(f"preprocess: {results['preprocess']}")
+
+    engine = AIEngine(index_path=os.path.join(workdir, "data", "stage_index.bin"))
+    # Raw model time per document; the engine's cache is left out on purpose
+    encode = lambda sentences: engine.model.encode(sentences, batch_size=engine.batch_size, normalize_embeddings=True)
+    results["encode"] = time_each(encode, splits, size=len)
+    embeddings = [np.asarray(encode(s), dtype='float32') for s in splits]
+    print(f"encode: {results['encode']}")
+
+    # items_per_second counts sentences for the index stages
+    documents = list(range(len(splits)))
+    sentence_count = lambda i: len(splits[i])
+    results["add_to_index"] = time_each(
+        lambda i: engine.add_to_index(splits[i], str(i + 1), embeddings=embeddings[i]), documents, warmup=0,
+        size=sentence_count)
+    results["search_sentence"] = time_each(lambda s: engine.search(s, top_k=1), [s[0] for s in splits if s])
+    results["search_document"] = time_each(
+        lambda i: engine.search_document(splits[i], top_k=1, embeddings=embeddings[i]), documents,
+        size=sentence_count)
+    results["index_rows"] = engine.index_size()
+    print(f"search_document: {results['search_document']}")
+    engine.writer.shutdown()
+
+    detector = AIDetector()
+    results["detect"] = time_each(detector.detect, texts)
+    results["detect_windows"] = time_each(detector.detect_windows, texts)
+    print(f"detect_windows: {results['detect_windows']}")
+    return results
+
+class InProcessApi:
+    # /api/check through the ASGI app, no network
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import main
+        self.client = TestClient(main.app)
+
+    def __enter__(self):
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.client.__exit__(*exc)
+
+    def post(self, path: str, payload: dict) -> int:
+        return self.client.post(path, json=payload).status_code
+
+class RemoteApi:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def post(self, path: str, payload: dict) -> int:
+        import urllib.error
+        import urllib.request
+        request = urllib.request.Request(self.url + path, data=json.dumps(payload).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+def _check_payload(doc: dict) -> dict:
+    return {"text": doc["text"], "filename": doc["name"] + ".txt", "student_name": doc["name"],
+            "user_email": "benchmark@example.org"}
+
+def timed_check(api, doc: dict):
+    start = time.perf_counter()
+    status = api.post("/api/check", _check_payload(doc))
+    return time.perf_counter() - start, status
+
+def bench_end_to_end(api, docs: list[dict]) -> dict:
+    durations, failures = [], 0
+    start = time.perf_counter()
+    for doc in docs:
+        seconds, status = timed_check(api, doc)
+        if status == 200:
+            durations.append(seconds)
+        else:
+            failures += 1
+    result = summarise(durations, time.perf_counter() - start)
+    result["failures"] = failures
+    return result
+
+def bench_load(api, docs: list[dict], concurrency: int, requests: int) -> dict:
+    picked = [docs[i % len(docs)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda doc: timed_check(api, doc), picked))
+    wall = time.perf_counter() - start
+    ok = [seconds for seconds, status in outcomes if status == 200]
+    result = summarise(ok, wall)
+    result["rejected"] = sum(1 for _, status in outcomes if status == 503)
+    result["failures"] = sum(1 for _, status in outcomes if status not in (200, 503))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", choices=["tiny", "cached"], default="tiny")
+    parser.add_argument("--tiny-dir", default="data/bench_models", help="where the stand-in models are built")
+    parser.add_argument("--docs", type=int, default=100, help="documents per section")
+    parser.add_argument("--sentences", type=int, default=30, help="average sentences per document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-index", type=int, default=200, help="documents checked before measuring, so searches hit")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated load levels")
+    parser.add_argument("--requests", type=int, default=0, help="requests per load level (default 4 x concurrency, min 20)")
+    parser.add_argument("--dedup", default="off", help="DEDUP_POLICY for the checks")
+    parser.add_argument("--skip", default="", help="comma-separated sections to skip: stages,end_to_end,load")
+    parser.add_argument("--url", help="benchmark a running API instead of the in-process app")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temporary one)")
+    parser.add_argument("--keep-data", action="store_true", help="reuse the database and index in --workdir")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    # Paths given on the command line are relative to where it was started
+    args.tiny_dir = os.path.abspath(args.tiny_dir)
+    output = os.path.abspath(args.output) if args.output else None
+    skip = set(filter(None, args.skip.split(",")))
+
+    env = prepare_environment(args)
+    total = args.seed_index + args.docs * 2
+    corpus = generate_corpus(total, args.sentences, args.seed)
+    seed_docs = corpus[:args.seed_index]
+    measured = corpus[args.seed_index:args.seed_index + args.docs]
+    load_docs = corpus[args.seed_index + args.docs:]
+    print(f"Corpus: {len(corpus)} documents in {env['workdir']}")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "models": args.models,
+            "model_paths": env["models"],
+            "docs": args.docs,
+            "sentences": args.sentences,
+            "seed": args.seed,
+            "target": args.url or "in-process",
+        }
+    }
+    if "stages" not in skip:
+        results["stages"] = bench_stages(measured, env["workdir"])
+
+    if not skip >= {"end_to_end", "load"}:
+        with (RemoteApi(args.url) if args.url else InProcessApi()) as api:
+            api.post("/api/auth/register", {"name": "Benchmark", "email": "benchmark@example.org",
+                                            "password": "benchmark-password"})
+            start = time.perf_counter()
+            for doc in seed_docs:
+                timed_check(api, doc)
+            results["meta"]["seed_seconds"] = round(time.perf_counter() - start, 2)
+            print(f"Seeded the index with {len(seed_docs)} documents in {results['meta']['seed_seconds']}s")
+
+            if "end_to_end" not in skip:
+                results["end_to_end"] = bench_end_to_end(api, measured)
+                print(f"end_to_end: {results['end_to_end']}")
+            if "load" not in skip:
+                results["load"] = {}
+                for level in [int(c) for c in args.concurrency.split(",") if c]:
+                    requests = args.requests or max(20, 4 * level)
+                    results["load"][str(level)] = bench_load(api, load_docs, level, requests)
+                    print(f"load x{level}: {results['load'][str(level)]}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Seeded synthetic essays for the offline benchmarks.
+
+Documents are built from sentence templates over a few topic vocabularies,
+so they split, tokenise and embed like (dull) student prose. A share of
+them reuse sentences of earlier documents, verbatim or lightly reworded,
+so searches find matches the way they would on a real corpus.
+
+    python backend/benchmarks/synthetic.py --docs 100 --out data/bench_corpus
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+
+TOPICS = {
+    "biology": {
+        "nouns": ["cell", "protein", "enzyme", "membrane", "organism", "gene", "species", "tissue", "mitochondria",
+                  "chloroplast", "ecosystem", "population", "mutation", "receptor", "hormone"],
+        "verbs": ["regulates", "produces", "transports", "inhibits", "converts", "stores", "releases", "controls"],
+        "adjectives": ["cellular", "genetic", "metabolic", "microscopic", "complex", "essential", "natural"],
+    },
+    "history": {
+        "nouns": ["empire", "revolution", "treaty", "monarchy", "parliament", "war", "trade", "colony", "reform",
+                  "dynasty", "economy", "society", "industry", "army", "church"],
+        "verbs": ["transformed", "weakened", "shaped", "expanded", "challenged", "replaced", "financed", "ended"],
+        "adjectives": ["political", "medieval", "industrial", "colonial", "religious", "economic", "violent"],
+    },
+    "economics": {
+        "nouns": ["market", "price", "demand", "supply", "inflation", "budget", "tax", "wage", "investment",
+                  "bank", "currency", "growth", "debt", "policy", "consumer"],
+        "verbs": ["increases", "reduces", "stabilises", "distorts", "drives", "limits", "affects", "raises"],
+        "adjectives": ["fiscal", "monetary", "competitive", "global", "domestic", "long-term", "volatile"],
+    },
+    "literature": {
+        "nouns": ["novel", "poem", "narrator", "character", "tragedy", "metaphor", "theme", "author", "reader",
+                  "chapter", "plot", "symbol", "voice", "genre", "audience"],
+        "verbs": ["reveals", "explores", "questions", "portrays", "undermines", "reflects", "suggests", "echoes"],
+        "adjectives": ["ironic", "romantic", "tragic", "modern", "ambiguous", "lyrical", "unreliable"],
+    },
+    "computing": {
+        "nouns": ["algorithm", "network", "database", "compiler", "model", "server", "protocol", "memory",
+                  "processor", "query", "interface", "cache", "dataset", "thread", "index"],
+        "verbs": ["optimises", "stores", "computes", "predicts", "encrypts", "schedules", "parallelises", "indexes"],
+        "adjectives": ["distributed", "efficient", "scalable", "parallel", "secure", "neural", "concurrent"],
+    },
+}
+
+TEMPLATES = [
+    "The {adj} {noun} {verb} the {noun2} in ways that earlier studies did not expect.",
+    "In this essay I argue that the {noun} {verb} the {adj} {noun2}.",
+    "Furthermore, the {noun} {verb} each {noun2} through a {adj} process.",
+    "Most scholars agree that a {adj} {noun} rarely {verb} the {noun2} on its own.",
+    "However, the evidence suggests that the {noun2} {verb} the {noun} more than the {adj} {noun3}.",
+    "It is important to note that every {noun} {verb} some {adj} {noun2}.",
+    "A {adj} {noun} {verb} the {noun2}, while the {noun3} remains largely unchanged.",
+    "Therefore, we can conclude that the {noun} {verb} the {adj} {noun2} over time.",
+    "Why does the {noun} matter so much for the {adj} {noun2}?",
+    "Our results show that the {adj} {noun} {verb} the {noun2} in about {number} percent of cases.",
+]
+
+def vocabulary() -> list[str]:
+    # Every word the generator can emit, for the stand-in tokenizers
+    words = set()
+    for template in TEMPLATES:
+        words.update(w.strip(".,?!").lower() for w in template.split() if "{" not in w)
+    for topic in TOPICS.values():
+        for group in topic.values():
+            words.update(group)
+    words.update(str(n) for n in range(100))
+    return sorted(words)
+
+def sentence(rng: random.Random, topic: dict) -> str:
+    nouns = rng.sample(topic["nouns"], 3)
+    return rng.choice(TEMPLATES).format(
+        noun=nouns[0], noun2=nouns[1], noun3=nouns[2], verb=rng.choice(topic["verbs"]),
+        adj=rng.choice(topic["adjectives"]), number=rng.randint(5, 95)
+    )
+
+def reword(rng: random.Random, text: str, topic: dict) -> str:
+    # Light paraphrase: swap one adjective and drop a filler word
+    words = text.split()
+    adjectives = [i for i, w in enumerate(words) if w in topic["adjectives"]]
+    if adjectives:
+        words[rng.choice(adjectives)] = rng.choice(topic["adjectives"])
+    for filler in ("Furthermore,", "However,", "Therefore,"):
+        if filler in words:
+            words.remove(filler)
+            words[0] = words[0].capitalize()
+    return " ".join(words)
+
+def generate_corpus(docs: int, sentences: int = 30, seed: int = 0, copy_rate: float = 0.3,
+                    copied_share: float = 0.3) -> list[dict]:
+    # [{"name", "topic", "text", "copied_from"}]; copy_rate of the documents
+    # take copied_share of their sentences from one earlier document
+    rng = random.Random(seed)
+    names = list(TOPICS)
+    corpus = []
+    for i in range(docs):
+        topic_name = names[i % len(names)]
+        topic = TOPICS[topic_name]
+        count = max(1, int(rng.gauss(sentences, sentences / 4)))
+        lines = [sentence(rng, topic) for _ in range(count)]
+        source = None
+        same_topic = [d for d in corpus if d["topic"] == topic_name]
+        if same_topic and rng.random() < copy_rate:
+            source = rng.choice(same_topic)
+            borrowed = source["sentences"]
+            for j in rng.sample(range(count), max(1, int(count * copied_share))):
+                line = rng.choice(borrowed)
+                lines[j] = line if rng.random() < 0.5 else reword(rng, line, topic)
+        # A paragraph break every few sentences
+        paragraphs = [" ".join(lines[k:k + 5]) for k in range(0, len(lines), 5)]
+        corpus.append({"name": f"essay_{i:05d}", "topic": topic_name, "text": "\n\n".join(paragraphs),
+                       "sentences": lines, "copied_from": source["name"] if source else None})
+    return corpus
+
+def synthetic_vectors(n: int, dimension: int, seed: int = 0, clusters: int = 2048, chunk: int = 100000):
+    # Yields normalised float32 blocks of clustered vectors (sentence
+    # embeddings cluster by topic), chunk rows at a time so that 10M-row
+    # sweeps never hold the whole corpus
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    produced = 0
+    while produced < n:
+        size = min(chunk, n - produced)
+        block = centers[rng.integers(0, clusters, size)] + 0.6 * rng.standard_normal((size, dimension)).astype('float32')
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        produced += size
+        yield block
+
+def write_documents(corpus: list[dict], directory: str, formats=("txt",)) -> list[str]:
+    # Writes each document in every requested format (txt, docx); returns the paths
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for doc in corpus:
+        if "txt" in formats:
+            path = os.path.join(directory, doc["name"] + ".txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(doc["text"])
+            paths.append(path)
+        if "docx" in formats:
+            from docx import Document
+            document = Document()
+            for paragraph in doc["text"].split("\n\n"):
+                document.add_paragraph(paragraph)
+            path = os.path.join(directory, doc["name"] + ".docx")
+            document.save(path)
+            paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--sentences", type=int, default=30, help="average sentences per document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", default="txt", help="comma-separated: txt,docx")
+    parser.add_argument("--out", default="data/bench_corpus")
+    args = parser.parse_args()
+    corpus = generate_corpus(args.docs, args.sentences, args.seed)
+    paths = write_documents(corpus, args.out, args.formats.split(","))
+    print(f"Wrote {len(paths)} files to {args.out}")
@@ -0,0 +1,69 @@
+"""Tiny randomly initialised stand-ins for the sentence encoder and the AI detector.
+
+They have the same interfaces and output shapes as the real models (768-d
+sentence embeddings, a two-label classifier with a fast tokenizer), so the
+whole pipeline runs offline. Timings with them measure everything except
+real model cost: use cached real models for that (--models cached).
+
+    python backend/benchmarks/tiny_models.py --out data/bench_models
+    EMBEDDING_MODEL=data/bench_models/encoder AI_DETECTOR_MODEL=data/bench_models/detector ...
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import vocabulary
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+PUNCTUATION = list(".,;:!?'\"-()")
+
+def _tokenizer(max_length: int):
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast
+    vocab = {token: i for i, token in enumerate(SPECIAL_TOKENS + PUNCTUATION + vocabulary())}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])]
+    )
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, model_max_length=max_length, unk_token="[UNK]",
+                                   pad_token="[PAD]", cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]")
+
+def build_tiny_models(directory: str, dimension: int = 768, seed: int = 0) -> dict:
+    # Writes <directory>/encoder and <directory>/detector once; returns their paths
+    paths = {"encoder": os.path.join(directory, "encoder"), "detector": os.path.join(directory, "detector")}
+    if all(os.path.exists(os.path.join(path, "config.json")) for path in paths.values()):
+        return paths
+
+    import torch
+    from transformers import BertConfig, BertModel, BertForSequenceClassification
+    torch.manual_seed(seed)
+    tokenizer = _tokenizer(512)
+
+    # Sentence encoder: one layer at the real width, mean pooled by
+    # sentence-transformers when loaded from a plain transformers directory
+    encoder = BertModel(BertConfig(vocab_size=len(tokenizer), hidden_size=dimension, num_hidden_layers=1,
+                                   num_attention_heads=12, intermediate_size=dimension,
+                                   max_position_embeddings=512))
+    encoder.save_pretrained(paths["encoder"])
+    tokenizer.save_pretrained(paths["encoder"])
+
+    detector = BertForSequenceClassification(BertConfig(
+        vocab_size=len(tokenizer), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=128, max_position_embeddings=512, num_labels=2,
+        id2label={0: "Human", 1: "ChatGPT"}, label2id={"Human": 0, "ChatGPT": 1}
+    ))
+    detector.save_pretrained(paths["detector"])
+    tokenizer.save_pretrained(paths["detector"])
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="data/bench_models")
+    args = parser.parse_args()
+    for name, path in build_tiny_models(args.out).items():
+        print(f"{name}: {path}")
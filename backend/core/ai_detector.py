@@ -1,58 +1,108 @@
-from transformers import pipeline
+import torch
+import os
+from core.inference_backend import backend_config_from_env, load_classifier
+
+# Labels the detector uses for machine-generated text
+AI_LABELS = ['ChatGPT', 'Fake', 'AI', 'LABEL_1']
 
 class AIDetector:
-    def __init__(self):
+    def __init__(self, model_name=None, window_tokens=None, overlap_tokens=None, batch_size=None, backend_config=None):
         # Using a model trained on ChatGPT data for better detection of modern LLMs
         # 'Hello-SimpleAI/chatgpt-detector-roberta' is widely used for this purpose.
+        # AI_DETECTOR_MODEL overrides it (a hub name or a local directory).
+        model_name = model_name or os.environ.get("AI_DETECTOR_MODEL", "Hello-SimpleAI/chatgpt-detector-roberta")
+        # Documents are scored in token windows (incl. special tokens) that
+        # overlap so no passage is only ever seen cut in half.
+        self.window_tokens = window_tokens or int(os.environ.get("AI_DETECT_WINDOW_TOKENS", 512))
+        self.overlap_tokens = overlap_tokens or int(os.environ.get("AI_DETECT_OVERLAP_TOKENS", 64))
+        self.batch_size = batch_size or int(os.environ.get("AI_DETECT_BATCH_SIZE", 16))
+        # torch / torch_int8 / onnx / onnx_int8, see core/inference_backend.py
+        self.backend_config = backend_config or backend_config_from_env()
         try:
-            self.pipe = pipeline("text-classification", model="Hello-SimpleAI/chatgpt-detector-roberta")
+            self.tokenizer, self.model = load_classifier(model_name, **self.backend_config)
+            self.window_tokens = min(self.window_tokens, self.tokenizer.model_max_length)
+            self.ai_index, self.human_index = self._label_indices()
         except Exception as e:
             print(f"Error loading AI Detector model: {e}")
-            self.pipe = None
+            self.model = None
+
+    def _label_indices(self):
+        ai_index, human_index = None, None
+        for idx, label in self.model.config.id2label.items():
+            if label in AI_LABELS:
+                ai_index = int(idx)
+            else:
+                human_index = int(idx)
+        return ai_index, human_index
+
+    def _windows(self, texts: list[str]):
+        # Token windows over whole documents with character offsets;
+        # sample[i] is the index of the document window i came from
+        encoded = self.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.window_tokens,
+            stride=self.overlap_tokens,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+            padding=True,
+            return_tensors="pt"
+        )
+        spans = []
+        for offsets in encoded["offset_mapping"].tolist():
+            # Special and padding tokens have (0, 0) offsets
+            chars = [o for o in offsets if o[1] > o[0]]
+            spans.append((chars[0][0], chars[-1][1]) if chars else (0, 0))
+        return encoded["input_ids"], encoded["attention_mask"], spans, encoded["overflow_to_sample_mapping"].tolist()
+
+    def detect_windows(self, text: str) -> dict:
+        # Overall AI probability (0-100) plus a score per window, so reports
+        # can point at the passages that look generated
+        return self.detect_windows_batch([text])[0]
+
+    def detect_windows_batch(self, texts: list[str]) -> list[dict]:
+        # detect_windows() for many documents: windows from all of them share
+        # forward passes, similar lengths batched together so little of each
+        # batch is padding
+        results = [{"score": 0.0, "windows": []} for _ in texts]
+        live = [i for i, text in enumerate(texts) if text.strip()]
+        if not self.model or not live:
+            return results
+
+        try:
+            input_ids, attention_mask, spans, sample = self._windows([texts[i] for i in live])
+            lengths = attention_mask.sum(dim=1)
+            order = torch.argsort(lengths)
+            trim = self.tokenizer.padding_side == "right"
+            probs = [None] * len(input_ids)
+            with torch.inference_mode():
+                for start in range(0, len(order), self.batch_size):
+                    batch = order[start:start + self.batch_size]
+                    width = int(lengths[batch].max()) if trim else input_ids.shape[1]
+                    logits = self.model(input_ids=input_ids[batch, :width], attention_mask=attention_mask[batch, :width]).logits
+                    for row, p in zip(batch.tolist(), torch.softmax(logits, dim=-1)):
+                        probs[row] = p
+            probs = torch.stack(probs)
+        except Exception as e:
+            print(f"AI detection failed: {e}")
+            return results
+
+        if self.ai_index is not None:
+            ai_probs = probs[:, self.ai_index].tolist()
+        else:
+            ai_probs = (1 - probs[:, self.human_index]).tolist()
+
+        windows = [[] for _ in live]
+        for (start, end), p, doc in zip(spans, ai_probs, sample):
+            windows[doc].append({"start_pos": start, "end_pos": end, "score": round(float(p) * 100, 2), "p": p})
+        for doc, doc_windows in zip(live, windows):
+            # Average probability rounded to 2 decimal places
+            score = round(sum(w.pop("p") for w in doc_windows) / len(doc_windows) * 100, 2) if doc_windows else 0.0
+            results[doc] = {"score": score, "windows": doc_windows}
+        return results
 
     def detect(self, text: str) -> float:
-        if not self.pipe or not text.strip():
-            return 0.0
-        
-        # Split text into chunks of ~512 characters (approx tokens) to analyze the whole document
-        # The model has a limit (usually 512 tokens).
-        chunk_size = 500
-        chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-        
-        # Limit to first 10 chunks to keep it efficient (approx 5000 chars)
-        chunks = chunks[:10]
-        
-        scores = []
-        for chunk in chunks:
-            try:
-                result = self.pipe(chunk)[0]
-                # Model labels: 'Human' vs 'ChatGPT' (or similar)
-                # We need to normalize.
-                # Hello-SimpleAI usually returns 'ChatGPT' or 'Human'
-                
-                label = result['label']
-                score = result['score']
-                
-                if label in ['ChatGPT', 'Fake', 'AI']:
-                    scores.append(score * 100)
-                elif label in ['Human', 'Real']:
-                    scores.append((1 - score) * 100)
-                else:
-                    # Fallback for unknown labels (assume LABEL_1 is AI)
-                    if label == 'LABEL_1':
-                        scores.append(score * 100)
-                    else:
-                        scores.append((1 - score) * 100)
-                        
-            except Exception as e:
-                print(f"Chunk detection failed: {e}")
-                continue
-        
-        if not scores:
-            return 0.0
-            
-        # Return the average probability rounded to 2 decimal places
-        return round(sum(scores) / len(scores), 2)
+        return self.detect_windows(text)["score"]
 
 # Singleton
 # ai_detector = AIDetector()
@@ -1,64 +1,381 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import os
-import pickle
+from core.embedding_cache import EmbeddingCache
+from core.inference_backend import backend_config_from_env, load_sentence_model
+from core.index_store import IndexStore, DEFAULT_INDEX_PATH, DIMENSION
+from core.fingerprint import FingerprintIndex
+from core.document_index import DocumentIndex
+from core.index_writer import IndexWriter
+from core.rwlock import ReadWriteLock
+from core.metrics import stage, SENTENCES_PROCESSED
+from core.index_factory import (index_config_from_env, build_index, min_training_points,
+                                apply_search_params, all_vectors, index_from_vectors)
 
 class AIEngine:
-    def __init__(self, model_name='sentence-transformers/all-mpnet-base-v2', index_path='data/faiss_index_v3.bin'):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name=None, index_path=DEFAULT_INDEX_PATH, batch_size=None, backend_config=None):
+        # Any sentence-transformers model with DIMENSION-sized output; EMBEDDING_MODEL
+        # may also be a local directory (e.g. the benchmark stand-in models)
+        model_name = model_name or os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+        # torch / torch_int8 / onnx / onnx_int8, see core/inference_backend.py
+        self.backend_config = backend_config or backend_config_from_env()
+        self.model = load_sentence_model(model_name, **self.backend_config)
         self.index_path = index_path
-        self.dimension = 768 # Dimension for all-mpnet-base-v2
-        self.metadata = [] # To store mapping from index to (doc_id, text)
-        
-        # Load or initialize FAISS index
-        if os.path.exists(index_path):
-            self.index = faiss.read_index(index_path)
-            if os.path.exists(index_path + ".meta"):
-                with open(index_path + ".meta", "rb") as f:
-                    self.metadata = pickle.load(f)
+        # Sentences per encoder forward pass (override with EMBED_BATCH_SIZE)
+        self.batch_size = batch_size or int(os.environ.get("EMBED_BATCH_SIZE", 64))
+        # Shared by search and add so each distinct sentence is encoded once
+        self.embedding_cache = EmbeddingCache(int(os.environ.get("EMBED_CACHE_BYTES", 64 * 1024 * 1024)))
+        self.dimension = DIMENSION
+
+        # ANN index type and search parameters (see core/index_factory.py)
+        self.index_config = index_config_from_env()
+
+        # Searches hold the read side; only the writer thread takes the write
+        # side, briefly, to publish new rows or swap in a new index
+        self.lock = ReadWriteLock()
+
+        # Load the compacted snapshot and replay the append log on top of it
+        self.store = IndexStore(index_path, self.dimension)
+        self._owner_lock = self.store.lock_owner()
+        self.index, self.metadata = self.store.load(self.new_index)
+        self._prepare_index(self.index)
+
+        # Exact-copy pre-filter ahead of semantic search (see core/fingerprint.py)
+        self.use_fingerprints = os.environ.get("FINGERPRINT_ENABLED", "1") == "1"
+        # Two-stage retrieval: "sentence" searches every sentence row, "two_stage"
+        # first picks candidate documents (core/document_index.py), "auto"
+        # switches to two-stage once the index has TWO_STAGE_MIN_ROWS rows
+        self.retrieval_mode = os.environ.get("RETRIEVAL_MODE", "auto")
+        self.two_stage_min_rows = int(os.environ.get("TWO_STAGE_MIN_ROWS", 200000))
+        self.candidate_docs = int(os.environ.get("TWO_STAGE_DOCS", 20))
+        self.candidate_docs_per_sentence = int(os.environ.get("TWO_STAGE_PER_SENTENCE", 5))
+        self._load_sidecars()
+        self.writer = IndexWriter(self._apply_adds)
+
+    def _load_sidecars(self):
+        # Snapshot sidecars plus the rows replayed from the log; a snapshot
+        # without them (older format) is rebuilt from scratch and saved once
+        prefix = self.store.snapshot_prefix()
+        complete = True
+        if FingerprintIndex.exists(prefix):
+            self.fingerprints = FingerprintIndex.from_metadata(self.metadata, self.store.base_rows, FingerprintIndex.open(prefix))
         else:
-            # Use IndexFlatIP for Inner Product (Cosine Similarity when vectors are normalized)
-            self.index = faiss.IndexFlatIP(self.dimension)
-    
+            self.fingerprints = FingerprintIndex.from_metadata(self.metadata)
+            complete = False
+        if DocumentIndex.exists(prefix):
+            self.documents = DocumentIndex.from_rows(self.dimension, self.metadata, self._range_reader(self.index),
+                                                     self.store.base_rows, DocumentIndex.open(prefix, self.dimension))
+        else:
+            self.documents = DocumentIndex.from_rows(self.dimension, self.metadata, self._range_reader(self.index))
+            complete = False
+        if not complete and len(self.metadata):
+            self._compact()
+
+    def _prepare_index(self, index):
+        # Done once before an index is published: building the IVF direct map
+        # lazily would mutate the index under concurrent readers
+        apply_search_params(index, **self.index_config)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+        return index
+
+    @staticmethod
+    def _range_reader(index):
+        def read(start, end):
+            return index.reconstruct_n(start, end - start)
+        return read
+
+    def new_index(self):
+        # Index types that need training start as IndexFlatIP until there is
+        # enough data to train on (see _maybe_train_index)
+        if min_training_points(**self.index_config) > 0:
+            return faiss.IndexFlatIP(self.dimension)
+        return build_index(self.dimension, **self.index_config)
+
+    def _maybe_train_index(self, index):
+        # Swap the exact bootstrap index for the configured ANN index once the
+        # corpus is big enough to train it on a sample of existing submissions
+        if self.index_config["index_type"] == "flat":
+            return index
+        if not isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+            return index
+        if index.ntotal < max(min_training_points(**self.index_config), 1):
+            return index
+        print(f"Training {self.index_config['index_type']} index on {index.ntotal} vectors...")
+        return index_from_vectors(all_vectors(index), self.dimension, self.index_config)
+
     def generate_embeddings(self, texts: list[str]):
-        # normalize_embeddings=True ensures Cosine Similarity with IndexFlatIP
-        return self.model.encode(texts, normalize_embeddings=True)
+        # Only sentences missing from the cache go through the model;
+        # duplicates within one call are encoded once.
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+        pending = {}
+        for i, text in enumerate(texts):
+            cached = self.embedding_cache.get(text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                pending.setdefault(text, []).append(i)
+
+        if pending:
+            to_encode = list(pending.keys())
+            # normalize_embeddings=True ensures Cosine Similarity with IndexFlatIP
+            with stage("encoding"):
+                encoded = self.model.encode(to_encode, batch_size=self.batch_size, normalize_embeddings=True)
+            SENTENCES_PROCESSED.inc(len(to_encode), stage="encoding")
+            for text, vector in zip(to_encode, np.asarray(encoded, dtype='float32')):
+                self.embedding_cache.put(text, vector)
+                embeddings[pending[text]] = vector
+        return embeddings
 
-    def add_to_index(self, texts: list[str], doc_id: str):
+    def add_to_index(self, texts: list[str], doc_id: str, embeddings=None):
+        # Pass the embeddings computed for search_batch to avoid re-encoding
         if not texts:
             return
-        embeddings = self.generate_embeddings(texts)
-        self.index.add(np.array(embeddings).astype('float32'))
-        
-        # Store metadata
-        for text in texts:
-            self.metadata.append({"doc_id": doc_id, "text": text})
-            
-        self.save_index()
+        if embeddings is None:
+            embeddings = self.generate_embeddings(texts)
+        embeddings = np.array(embeddings).astype('float32')
+        # Returns once the rows are durable and visible to searches
+        self.writer.add((texts, doc_id, embeddings)).result()
+
+    def _apply_adds(self, batch):
+        # Writer thread only. batch: [(texts, doc_id, embeddings)]. A document
+        # already in the index is skipped: around a rebuild swap the same
+        # submission can be added by its own check and by the catch-up pass.
+        fresh, seen = [], set()
+        for item in batch:
+            if item[1] not in self.documents and item[1] not in seen:
+                seen.add(item[1])
+                fresh.append(item)
+        batch = fresh
+        if not batch:
+            return
+        vectors = np.vstack([embeddings for _, _, embeddings in batch])
+        with stage("index_write"):
+            # Persist first so a crash never loses an acknowledged submission
+            self.store.append_batch(vectors, [(doc_id, texts, None) for texts, doc_id, _ in batch])
+            with self.lock.write():
+                first_row = len(self.metadata)
+                self.index.add(vectors)
+                for texts, doc_id, embeddings in batch:
+                    # Row id -> (doc_id, text) mapping, see core/metadata_store.py
+                    self.metadata.append(texts, doc_id)
+                    self.fingerprints.add_document(texts, first_row)
+                    self.documents.add(doc_id, first_row, embeddings)
+                    first_row += len(texts)
+        SENTENCES_PROCESSED.inc(len(vectors), stage="indexing")
+
+        if self.store.needs_compaction():
+            self._compact()
+
+    def has_document(self, doc_id) -> bool:
+        with self.lock.read():
+            return doc_id in self.documents
+
+    def index_size(self) -> int:
+        return self.index.ntotal
 
     def search(self, query_text: str, top_k: int = 5):
-        if not query_text.strip():
-            return []
-        query_embedding = self.model.encode([query_text], normalize_embeddings=True)
-        # Inner product with normalized vectors = Cosine Similarity
-        scores, indices = self.index.search(np.array(query_embedding).astype('float32'), top_k)
-        
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1 and idx < len(self.metadata):
-                meta = self.metadata[idx]
-                results.append({
-                    "score": float(scores[0][i]), # Score is already Cosine Similarity [0, 1]
-                    "text": meta["text"],
-                    "doc_id": meta["doc_id"]
+        return self.search_batch([query_text], top_k)[0]
+
+    def search_batch(self, query_texts: list[str], top_k: int = 5, embeddings=None):
+        # One encode call and one matrix search for the whole document,
+        # returns a result list per query (empty for blank queries)
+        results = [[] for _ in query_texts]
+        positions = [i for i, t in enumerate(query_texts) if t.strip()]
+        if not positions or self.index.ntotal == 0:
+            return results
+
+        if embeddings is None:
+            query_embeddings = self.generate_embeddings([query_texts[i] for i in positions])
+        else:
+            query_embeddings = np.asarray(embeddings)[positions]
+        with stage("faiss_search"), self.lock.read():
+            return self._search_vectors(results, positions, query_embeddings, top_k)
+
+    def _search_vectors(self, results, positions, query_embeddings, top_k, exclude_doc_ids=()):
+        # Caller holds the read lock. Each excluded document can take at most
+        # about one slot per query, so search that much deeper and drop them.
+        k = top_k * (1 + len(exclude_doc_ids))
+        scores, indices = self.index.search(np.array(query_embeddings).astype('float32'), k)
+
+        for row, pos in enumerate(positions):
+            for i, idx in enumerate(indices[row]):
+                if len(results[pos]) >= top_k:
+                    break
+                if idx != -1 and idx < len(self.metadata):
+                    doc_id = self.metadata.doc_id(idx)
+                    if doc_id in exclude_doc_ids:
+                        continue
+                    results[pos].append({
+                        "score": float(scores[row][i]),
+                        "text": self.metadata.text(idx),
+                        "doc_id": doc_id
+                    })
+        return results
+
+    def search_document(self, sentences: list[str], top_k: int = 5, exclude_doc_ids=(), embeddings=None):
+        # Verbatim and near-verbatim copies are resolved by fingerprint lookup;
+        # only the remaining sentences are searched semantically. Verbatim
+        # copies reuse their stored row's vector instead of being encoded.
+        # exclude_doc_ids (earlier copies of the same document) never match.
+        # embeddings: vectors already computed for the sentences, e.g. by one
+        # generate_embeddings() call for a whole batch of documents.
+        # Returns (results per sentence, embeddings for add_to_index).
+        exclude = {str(doc_id) for doc_id in exclude_doc_ids}
+        SENTENCES_PROCESSED.inc(len(sentences), stage="search")
+        provided = None if embeddings is None else np.asarray(embeddings, dtype='float32')
+        results = [[] for _ in sentences]
+        embeddings = np.zeros((len(sentences), self.dimension), dtype='float32')
+        pending = list(range(len(sentences)))
+        to_encode = pending
+
+        if self.use_fingerprints and len(self.metadata):
+            # Row ids are only meaningful within one read section
+            with stage("fingerprint_search"), self.lock.read():
+                hits = self.fingerprints.search(sentences, self.metadata, exclude)
+                # A verbatim copy has the same vector as its stored row; near
+                # copies and neighbour-extended hits are encoded like the rest
+                exact = [i for i, hit in enumerate(hits) if hit is not None and hit["exact"]]
+                reused = None
+                if exact and provided is None and self._stores_exact_vectors():
+                    reused = self._reconstruct([hits[i]["row"] for i in exact])
+            for i, hit in enumerate(hits):
+                if hit is not None:
+                    results[i] = [hit]
+            pending = [i for i, hit in enumerate(hits) if hit is None]
+            if reused is not None:
+                embeddings[exact] = reused
+                skip = set(exact)
+                to_encode = [i for i in range(len(sentences)) if i not in skip]
+
+        # Encode outside the lock, search inside it
+        if provided is not None:
+            embeddings = provided
+        elif to_encode:
+            embeddings[to_encode] = self.generate_embeddings([sentences[i] for i in to_encode])
+
+        if pending:
+            pending_texts = [sentences[i] for i in pending]
+            positions = [n for n, text in enumerate(pending_texts) if text.strip()]
+            with stage("faiss_search"), self.lock.read():
+                semantic = None
+                if self._two_stage_active():
+                    boost = [r[0]["doc_id"] for r in results if r]
+                    semantic = self._search_candidates(pending_texts, embeddings[pending], top_k,
+                                                       boost_doc_ids=boost, exclude_doc_ids=exclude)
+                if semantic is None:
+                    semantic = [[] for _ in pending_texts]
+                    if positions and self.index.ntotal:
+                        self._search_vectors(semantic, positions, embeddings[pending][positions], top_k, exclude)
+            for i, found in zip(pending, semantic):
+                if not results[i]:
+                    results[i] = found
+        return results, embeddings
+
+    def _two_stage_active(self) -> bool:
+        if self.retrieval_mode == "two_stage":
+            return True
+        return self.retrieval_mode == "auto" and self.index.ntotal >= self.two_stage_min_rows
+
+    def _search_candidates(self, query_texts: list[str], embeddings, top_k: int = 5, boost_doc_ids=(), exclude_doc_ids=()):
+        # Stage one: pick candidate source documents by centroid similarity.
+        # Stage two: exact comparison against only their sentence vectors.
+        # Returns None when stored vectors can't be read back for this index type.
+        # Caller holds the read lock.
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        doc_ids = self.documents.candidates(embeddings, self.candidate_docs,
+                                            self.candidate_docs_per_sentence, boost_doc_ids, exclude_doc_ids)
+        results = [[] for _ in query_texts]
+        ranges = [self.documents.rows(doc_id) for doc_id in doc_ids]
+        rows = np.fromiter((row for r in ranges for row in r), dtype='int64')
+        if len(rows) == 0:
+            return results
+        try:
+            read = self._range_reader(self.index)
+            vectors = np.vstack([read(r.start, r.stop) for r in ranges if len(r)])
+        except RuntimeError:
+            return None
+
+        scores = embeddings @ vectors.T
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for q, candidates in enumerate(best):
+            for c in sorted(candidates.tolist(), key=lambda c: -scores[q, c]):
+                row = int(rows[c])
+                results[q].append({
+                    "score": float(scores[q, c]),
+                    "text": self.metadata.text(row),
+                    "doc_id": self.metadata.doc_id(row)
                 })
         return results
 
+    def _stores_exact_vectors(self) -> bool:
+        # PQ indexes only give back approximations of the stored vectors
+        return (self.index_config["index_type"] in ("flat", "ivf_flat", "hnsw") or
+                isinstance(faiss.downcast_index(self.index), faiss.IndexFlat))
+
+    def _reconstruct(self, rows: list[int]):
+        # Stored vectors for FAISS row ids, or None if the index type can't
+        # give them back. Caller holds the read lock.
+        try:
+            return np.vstack([self.index.reconstruct(int(row)) for row in rows]).astype('float32')
+        except RuntimeError:
+            return None
+
+    def encode_bulk(self, texts: list[str], batch_size: int = None, pool=None):
+        # Large-batch encoding for rebuilds. Skips the embedding cache, which
+        # a full corpus pass would only flush; `pool` is an optional
+        # SentenceTransformer multi-process pool.
+        batch_size = batch_size or self.batch_size
+        if pool is not None:
+            embeddings = self.model.encode_multi_process(texts, pool, batch_size=batch_size, normalize_embeddings=True)
+        else:
+            embeddings = self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        return np.asarray(embeddings, dtype='float32')
+
+    def open_shadow_index(self, restart: bool = False):
+        # Store for an index being rebuilt beside the live one. An unfinished
+        # build is resumed unless restart is set. Returns (store, index, metadata).
+        shadow = IndexStore(self.index_path, self.dimension, root=self.store.root + ".new")
+        if restart:
+            shadow.discard()
+        # A trainable type stays flat until promote_shadow_index trains it.
+        # The legacy single-file index was migrated into the live store long
+        # ago (and never deleted), so the shadow must not import it again.
+        index, metadata = shadow.load(self.new_index, migrate_legacy=False)
+        return shadow, index, metadata
+
+    def promote_shadow_index(self, shadow, index, metadata):
+        # Snapshot the finished rebuild and swap it in for the live index.
+        # Runs on the writer thread so no add lands in the old store mid-swap.
+        self.writer.call(self._promote, shadow, index, metadata)
+
+    def _promote(self, shadow, index, metadata):
+        index = self._prepare_index(self._maybe_train_index(index))
+        fingerprints = FingerprintIndex.from_metadata(metadata)
+        documents = DocumentIndex.from_rows(self.dimension, metadata, self._range_reader(index))
+        shadow.compact(index, metadata, sidecars=[fingerprints, documents])
+        shadow.promote(self.store.root)
+        with self.lock.write():
+            self.store, self.index, self.metadata = shadow, index, metadata
+            self.fingerprints, self.documents = fingerprints, documents
+
     def save_index(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.index_path + ".meta", "wb") as f:
-            pickle.dump(self.metadata, f)
+        # Full snapshot; normally only triggered by log size or age
+        self.writer.call(self._compact)
+
+    def _compact(self):
+        # Writer thread only (or before it starts). Searches keep running
+        # while the snapshot is written; they wait only for the switch over.
+        with stage("index_save"):
+            index = self._maybe_train_index(self.index)
+            if index is not self.index:
+                self._prepare_index(index)
+                with self.lock.write():
+                    self.index = index
+            self.store.compact(self.index, self.metadata, sidecars=[self.fingerprints, self.documents],
+                               lock=self.lock.write)
 
 # Singleton instance
 # ai_engine = AIEngine()
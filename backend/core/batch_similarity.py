@@ -0,0 +1,73 @@
+import numpy as np
+
+# Cross-document comparison within one batch (e.g. a whole class): every
+# sentence against the sentences of every other document in the batch,
+# computed as row blocks of one similarity matrix over the normalised
+# sentence embeddings.
+
+def cross_document_matches(embeddings, doc_sizes: list[int], threshold: float = 0.85,
+                           block_rows: int = 1024, max_examples: int = 5):
+    # embeddings: (sentences, dim), the documents' sentences back to back in
+    # order, doc_sizes[d] of them for document d.
+    # Returns (coverage, pairs):
+    #   coverage[a][b]  % of document a's sentences with a match >= threshold in b
+    #   pairs           one entry per pair of documents sharing any match, most
+    #                   similar first, with up to max_examples sentence pairs
+    #                   as (sentence in a, sentence in b, score)
+    vectors = np.ascontiguousarray(embeddings, dtype='float32')
+    sizes = np.asarray(doc_sizes, dtype=np.int64)
+    n_docs = len(sizes)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    owner = np.repeat(np.arange(n_docs), sizes)
+    present = np.nonzero(sizes)[0]
+    # Column of each present document in the per-document maxima below
+    column = np.full(n_docs, -1)
+    column[present] = np.arange(len(present))
+
+    matched = np.zeros((n_docs, n_docs), dtype=np.int64)
+    best = np.zeros((n_docs, n_docs), dtype=np.float32)
+    examples = {}
+
+    for start in range(0, len(vectors), block_rows):
+        sims = vectors[start:start + block_rows] @ vectors.T
+        rows = owner[start:start + len(sims)]
+        # Best score of each sentence in each document; its own never counts
+        per_doc = np.maximum.reduceat(sims, offsets[present], axis=1)
+        per_doc[np.arange(len(sims)), column[rows]] = -1.0
+        for col, doc in enumerate(present):
+            hit_rows = np.nonzero(per_doc[:, col] >= threshold)[0]
+            if not len(hit_rows):
+                continue
+            scores = per_doc[hit_rows, col]
+            np.add.at(matched[:, doc], rows[hit_rows], 1)
+            np.maximum.at(best[:, doc], rows[hit_rows], scores)
+            targets = sims[hit_rows, offsets[doc]:offsets[doc + 1]].argmax(axis=1)
+            for row, target, score in zip(hit_rows, targets, scores):
+                source = rows[row]
+                examples.setdefault((int(source), int(doc)), []).append(
+                    (int(start + row - offsets[source]), int(target), float(score)))
+
+    safe_sizes = np.maximum(sizes, 1)[:, None]
+    coverage = np.round(matched / safe_sizes * 100, 2)
+
+    pairs = []
+    for a in range(n_docs):
+        for b in range(a + 1, n_docs):
+            if not matched[a, b] and not matched[b, a]:
+                continue
+            # Both directions, as (sentence in a, sentence in b), best first
+            found = {}
+            for i, j, score in examples.get((a, b), []):
+                found[(i, j)] = max(score, found.get((i, j), -1.0))
+            for j, i, score in examples.get((b, a), []):
+                found[(i, j)] = max(score, found.get((i, j), -1.0))
+            top = sorted(found.items(), key=lambda item: -item[1])[:max_examples]
+            pairs.append({
+                "documents": [a, b],
+                "coverage": [float(coverage[a, b]), float(coverage[b, a])],
+                "matched_sentences": [int(matched[a, b]), int(matched[b, a])],
+                "max_score": round(float(max(best[a, b], best[b, a])), 4),
+                "examples": [{"sentence_a": i, "sentence_b": j, "score": round(score, 4)} for (i, j), score in top]
+            })
+    pairs.sort(key=lambda p: (-max(p["coverage"]), -p["max_score"]))
+    return coverage.tolist(), pairs
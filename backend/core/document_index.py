@@ -0,0 +1,110 @@
+import os
+from array import array
+
+import faiss
+import numpy as np
+
+class DocumentIndex:
+    # One normalized centroid per indexed submission plus the range of
+    # sentence rows it occupies in the main index (rows of a document are
+    # always contiguous). Used as stage one of two-stage retrieval: find
+    # candidate source documents, then compare sentences only against those.
+    #
+    # Snapshot files: <prefix>.doc_centroids.npy, <prefix>.doc_ranges.npy
+    # (doc_id, first_row, end_row per document).
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.index = faiss.IndexFlatIP(dimension)
+        self._ranges = array('q')
+        self._positions = {}
+
+    @classmethod
+    def open(cls, prefix: str, dimension: int):
+        documents = cls(dimension)
+        centroids = np.load(prefix + ".doc_centroids.npy")
+        ranges = np.load(prefix + ".doc_ranges.npy")
+        if len(centroids):
+            documents.index.add(np.ascontiguousarray(centroids, dtype='float32'))
+        documents._ranges.extend(ranges.reshape(-1).tolist())
+        for position, doc_id in enumerate(ranges[:, 0].tolist() if len(ranges) else []):
+            documents._positions[doc_id] = position
+        return documents
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(prefix + ".doc_centroids.npy") and os.path.exists(prefix + ".doc_ranges.npy")
+
+    @classmethod
+    def from_rows(cls, dimension: int, metadata, vectors_for_range, start_row: int = 0, documents=None):
+        # Add documents for rows [start_row, len(metadata)); vectors_for_range(start, end)
+        # returns their stored vectors
+        documents = documents or cls(dimension)
+        doc_ids = metadata.doc_ids()[start_row:]
+        if len(doc_ids) == 0:
+            return documents
+        boundaries = np.flatnonzero(np.diff(doc_ids)) + 1
+        starts = np.concatenate([[0], boundaries]) + start_row
+        ends = np.concatenate([boundaries, [len(doc_ids)]]) + start_row
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            documents.add(int(doc_ids[start - start_row]), start, vectors_for_range(start, end))
+        return documents
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def __contains__(self, doc_id) -> bool:
+        return int(doc_id) in self._positions
+
+    def add(self, doc_id, first_row: int, vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        if len(vectors) == 0:
+            return
+        centroid = vectors.mean(axis=0, keepdims=True)
+        faiss.normalize_L2(centroid)
+        self._positions[int(doc_id)] = self.index.ntotal
+        self.index.add(centroid)
+        self._ranges.extend((int(doc_id), first_row, first_row + len(vectors)))
+
+    def rows(self, doc_id) -> range:
+        position = self._positions.get(int(doc_id))
+        if position is None:
+            return range(0)
+        return range(self._ranges[3 * position + 1], self._ranges[3 * position + 2])
+
+    def candidates(self, query_vectors, top_docs: int, per_query: int, boost_doc_ids=(), exclude_doc_ids=()) -> list[int]:
+        # Each query sentence votes for its closest document centroids; a
+        # document's score is the sum of its (positive) similarities.
+        # boost_doc_ids (e.g. fingerprint hits) are always included,
+        # exclude_doc_ids never.
+        excluded = {int(d) for d in exclude_doc_ids}
+        chosen = [int(d) for d in dict.fromkeys(boost_doc_ids) if int(d) in self._positions and int(d) not in excluded]
+        if self.index.ntotal == 0 or len(query_vectors) == 0:
+            return chosen
+        scores, positions = self.index.search(np.ascontiguousarray(query_vectors, dtype='float32'),
+                                              min(per_query + len(excluded), self.index.ntotal))
+        totals = {}
+        for row_scores, row_positions in zip(scores, positions):
+            for score, position in zip(row_scores.tolist(), row_positions.tolist()):
+                if position != -1 and score > 0:
+                    totals[position] = totals.get(position, 0.0) + score
+        ranked = sorted(totals, key=totals.get, reverse=True)
+        for position in ranked:
+            if len(chosen) >= top_docs:
+                break
+            doc_id = self._ranges[3 * position]
+            if doc_id not in chosen and doc_id not in excluded:
+                chosen.append(doc_id)
+        return chosen
+
+    def save(self, prefix: str):
+        centroids = self.index.reconstruct_n(0, self.index.ntotal) if self.index.ntotal else np.zeros((0, self.dimension), dtype='float32')
+        ranges = np.frombuffer(self._ranges, dtype='int64').reshape(-1, 3)
+        for suffix, data in ((".doc_centroids.npy", centroids), (".doc_ranges.npy", ranges)):
+            with open(prefix + suffix, "wb") as f:
+                np.save(f, data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reopen(self, prefix: str):
+        # Centroids stay in memory; nothing to switch
+        pass
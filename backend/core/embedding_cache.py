@@ -0,0 +1,54 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class EmbeddingCache:
+    # LRU cache of sentence embeddings keyed by a hash of the sentence text.
+    # Bounded by the total size of the stored vectors, not the entry count.
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def get(self, text: str):
+        k = self.key(text)
+        with self._lock:
+            vector = self._entries.get(k)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector):
+        if self.max_bytes <= 0:
+            return
+        vector = np.asarray(vector, dtype='float32')
+        k = self.key(text)
+        with self._lock:
+            old = self._entries.pop(k, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[k] = vector
+            self.current_bytes += vector.nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
@@ -1,53 +1,176 @@
 import pdfplumber
 import docx
 import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 import pytesseract
+from core.metrics import stage
 
 # Set tesseract path if needed (Windows default)
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+# Limits for a single document (0 disables a limit)
+EXTRACT_MAX_PAGES = int(os.environ.get("EXTRACT_MAX_PAGES", 1000))
+EXTRACT_MAX_CHARS = int(os.environ.get("EXTRACT_MAX_CHARS", 5_000_000))
+# OCR runs in its own processes: scanned pages without a text layer and images
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES", max(1, min(4, (os.cpu_count() or 1) - 1))))
+OCR_RESOLUTION = int(os.environ.get("OCR_RESOLUTION", 300))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".png", ".jpg", ".jpeg")
+
+class ExtractionLimitExceeded(ValueError):
+    pass
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+    return _ocr_pool
+
+def shutdown_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+# Process pool tasks: arguments are plain paths and numbers, never open files
+def _ocr_image(file_path: str) -> str:
+    try:
+        with Image.open(file_path) as image:
+            return pytesseract.image_to_string(image)
+    except Exception as e:
+        return f"Error extracting text from image: {str(e)}. Ensure Tesseract-OCR is installed."
+
+def _ocr_pdf_page(file_path: str, page_number: int, resolution: int) -> str:
+    with pdfplumber.open(file_path, pages=[page_number + 1]) as pdf:
+        image = pdf.pages[0].to_image(resolution=resolution).original
+    try:
+        return pytesseract.image_to_string(image)
+    except Exception as e:
+        print(f"OCR failed on page {page_number + 1} of {file_path}: {e}")
+        return ""
+
 class TextExtractor:
     @staticmethod
-    def extract_text(file_path: str) -> str:
+    def extract_text(file_path: str, max_pages: int = None, max_chars: int = None) -> str:
+        with stage("extraction"):
+            return "".join(TextExtractor.iter_text(file_path, max_pages, max_chars))
+
+    @staticmethod
+    def iter_text(file_path: str, max_pages: int = None, max_chars: int = None):
+        # Yields the document a page or paragraph at a time, in order; raises
+        # ExtractionLimitExceeded past max_pages / max_chars
         ext = os.path.splitext(file_path)[1].lower()
-        
+        max_chars = EXTRACT_MAX_CHARS if max_chars is None else max_chars
+
         if ext == ".pdf":
-            return TextExtractor._extract_from_pdf(file_path)
+            chunks = TextExtractor._extract_from_pdf(file_path, EXTRACT_MAX_PAGES if max_pages is None else max_pages)
         elif ext == ".docx":
-            return TextExtractor._extract_from_docx(file_path)
+            chunks = TextExtractor._extract_from_docx(file_path)
         elif ext == ".txt":
-            return TextExtractor._extract_from_txt(file_path)
-        elif ext in [".png", ".jpg", ".jpeg"]:
-            return TextExtractor._extract_from_image(file_path)
+            chunks = TextExtractor._extract_from_txt(file_path)
+        elif ext in (".png", ".jpg", ".jpeg"):
+            chunks = TextExtractor._extract_from_image(file_path)
         else:
             raise ValueError(f"Unsupported file format: {ext}")
 
+        total = 0
+        for chunk in chunks:
+            total += len(chunk)
+            if max_chars and total > max_chars:
+                chunks.close()
+                raise ExtractionLimitExceeded(f"Document has more than {max_chars} characters of text")
+            yield chunk
+
     @staticmethod
-    def _extract_from_image(file_path: str) -> str:
+    def _extract_from_image(file_path: str):
+        yield get_ocr_pool().submit(_ocr_image, file_path).result()
+
+    @staticmethod
+    def _extract_from_pdf(file_path: str, max_pages: int):
+        # Pages with a text layer are read directly; scanned ones are OCR'd in
+        # the process pool, a bounded number at a time, and yielded in order
+        pending = deque()
+        window = OCR_PROCESSES * 2
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text
-        except Exception as e:
-            return f"Error extracting text from image: {str(e)}. Ensure Tesseract-OCR is installed."
+            with pdfplumber.open(file_path) as pdf:
+                if max_pages and len(pdf.pages) > max_pages:
+                    raise ExtractionLimitExceeded(f"PDF has {len(pdf.pages)} pages, the limit is {max_pages}")
+                for number, page in enumerate(pdf.pages):
+                    extracted = page.extract_text()
+                    if not extracted or not extracted.strip():
+                        pending.append(get_ocr_pool().submit(_ocr_pdf_page, file_path, number, OCR_RESOLUTION))
+                    else:
+                        pending.append(extracted)
+                    # Release the page's parsed objects before moving on
+                    page.close()
+                    while pending and (isinstance(pending[0], str) or pending[0].done() or len(pending) > window):
+                        text = TextExtractor._resolve(pending.popleft())
+                        if text:
+                            yield text + "\n"
+            while pending:
+                text = TextExtractor._resolve(pending.popleft())
+                if text:
+                    yield text + "\n"
+        finally:
+            for item in pending:
+                if not isinstance(item, str):
+                    item.cancel()
 
     @staticmethod
-    def _extract_from_pdf(file_path: str) -> str:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-        return text
+    def _resolve(item) -> str:
+        return item if isinstance(item, str) else item.result()
 
     @staticmethod
-    def _extract_from_docx(file_path: str) -> str:
+    def _extract_from_docx(file_path: str):
         doc = docx.Document(file_path)
-        return "\n".join([para.text for para in doc.paragraphs])
+        for i, para in enumerate(doc.paragraphs):
+            yield ("\n" if i else "") + para.text
 
     @staticmethod
-    def _extract_from_txt(file_path: str) -> str:
+    def _extract_from_txt(file_path: str):
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+def expand_archive(zip_path: str, dest_dir: str, max_files: int, max_member_bytes: int, max_total_bytes: int):
+    # Unpacks the supported documents of a zip archive into dest_dir, returns
+    # [(name inside the archive, path)]. Sizes are counted while copying, not
+    # taken from the archive headers; other files and folders are skipped.
+    documents = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+                continue
+            ext = os.path.splitext(base)[1].lower()
+            if ext not in SUPPORTED_EXTENSIONS:
+                continue
+            if max_files and len(documents) >= max_files:
+                raise ExtractionLimitExceeded(f"Archive has more than {max_files} documents")
+            path = os.path.join(dest_dir, f"{len(documents)}{ext}")
+            size = 0
+            with archive.open(info) as source, open(path, "wb") as target:
+                while chunk := source.read(1024 * 1024):
+                    size += len(chunk)
+                    total += len(chunk)
+                    if max_member_bytes and size > max_member_bytes:
+                        raise ExtractionLimitExceeded(f"{name} is larger than {max_member_bytes} bytes")
+                    if max_total_bytes and total > max_total_bytes:
+                        raise ExtractionLimitExceeded(f"Archive contents are larger than {max_total_bytes} bytes")
+                    target.write(chunk)
+            documents.append((name, path))
+    return documents
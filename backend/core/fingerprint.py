@@ -0,0 +1,173 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from core.preprocessor import Preprocessor
+
+class FingerprintIndex:
+    # Winnowing fingerprints (Schleimer et al.) over word k-grams, mapping
+    # each fingerprint to the FAISS row id of the sentence it starts in.
+    # Resolves verbatim and near-verbatim copies without the encoder.
+    #
+    # Fingerprints of a document are taken over its whole token stream, so
+    # k-grams cross sentence boundaries and a copied passage is still found
+    # when it is split into sentences differently.
+    #
+    # Compacted postings are two memory-mapped arrays sorted by hash
+    # (<prefix>.fp_hashes.npy, <prefix>.fp_rows.npy); newer ones live in a dict.
+    def __init__(self, k: int = None, window: int = None, threshold: float = None):
+        self.k = k or int(os.environ.get("FINGERPRINT_K", 5))
+        self.window = window or int(os.environ.get("FINGERPRINT_WINDOW", 4))
+        # Share of the query's k-grams that must appear in the source
+        self.threshold = threshold or float(os.environ.get("FINGERPRINT_THRESHOLD", 0.9))
+        self._base_hashes = np.zeros(0, dtype='int64')
+        self._base_rows = np.zeros(0, dtype='int64')
+        self._tail = {}
+
+    @classmethod
+    def open(cls, prefix: str):
+        fingerprints = cls()
+        fingerprints._base_hashes = np.load(prefix + ".fp_hashes.npy", mmap_mode='r')
+        fingerprints._base_rows = np.load(prefix + ".fp_rows.npy", mmap_mode='r')
+        return fingerprints
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(prefix + ".fp_hashes.npy") and os.path.exists(prefix + ".fp_rows.npy")
+
+    @classmethod
+    def from_metadata(cls, metadata, start_row: int = 0, fingerprints=None):
+        # Index rows [start_row, len(metadata)) of a MetadataStore, one
+        # document per run of equal doc ids
+        fingerprints = fingerprints or cls()
+        doc_ids = metadata.doc_ids()[start_row:]
+        if len(doc_ids) == 0:
+            return fingerprints
+        boundaries = np.flatnonzero(np.diff(doc_ids)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(doc_ids)]])
+        for start, end in zip(starts, ends):
+            first_row = start_row + int(start)
+            texts = [metadata.text(row) for row in range(first_row, start_row + int(end))]
+            fingerprints.add_document(texts, first_row)
+        return fingerprints
+
+    @staticmethod
+    def tokens(text: str) -> list[str]:
+        return re.findall(r'\w+', Preprocessor.clean_text(text))
+
+    @staticmethod
+    def _hash(tokens) -> int:
+        digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)
+
+    def _shingles(self, tokens: list[str]) -> list[int]:
+        return [self._hash(tokens[i:i + self.k]) for i in range(len(tokens) - self.k + 1)]
+
+    def _winnow(self, hashes: list[int]) -> list[int]:
+        # Positions of the selected fingerprints: the minimum of every window
+        # (rightmost on ties), each position recorded once
+        if len(hashes) <= self.window:
+            return [min(range(len(hashes)), key=lambda i: (hashes[i], -i))] if hashes else []
+        selected = []
+        last = -1
+        for start in range(len(hashes) - self.window + 1):
+            window = range(start, start + self.window)
+            pos = min(window, key=lambda i: (hashes[i], -i))
+            if pos != last:
+                selected.append(pos)
+                last = pos
+        return selected
+
+    def add_document(self, sentences: list[str], first_row: int):
+        # sentences occupy rows first_row .. first_row + len(sentences) - 1
+        tokens, token_rows = [], []
+        for offset, sentence in enumerate(sentences):
+            sentence_tokens = self.tokens(sentence)
+            tokens.extend(sentence_tokens)
+            token_rows.extend([first_row + offset] * len(sentence_tokens))
+        hashes = self._shingles(tokens)
+        for pos in self._winnow(hashes):
+            self._tail.setdefault(hashes[pos], []).append(token_rows[pos])
+
+    def _postings(self, fingerprint: int):
+        rows = list(self._tail.get(fingerprint, ()))
+        if len(self._base_hashes):
+            left = np.searchsorted(self._base_hashes, fingerprint, side='left')
+            right = np.searchsorted(self._base_hashes, fingerprint, side='right')
+            rows.extend(int(r) for r in self._base_rows[left:right])
+        return rows
+
+    def search(self, sentences: list[str], metadata, exclude_doc_ids=()) -> list:
+        # One entry per sentence: a match dict or None when the sentence has
+        # to go through semantic search. Rows of exclude_doc_ids are ignored.
+        results = []
+        for sentence in sentences:
+            results.append(self._search_one(sentence, metadata, exclude_doc_ids))
+        return results
+
+    def _search_one(self, sentence: str, metadata, exclude_doc_ids=()):
+        tokens = self.tokens(sentence)
+        hashes = self._shingles(tokens)
+        if not hashes:
+            return None
+
+        hits = {}
+        for pos in self._winnow(hashes):
+            for row in self._postings(hashes[pos]):
+                if row < len(metadata) and (not exclude_doc_ids or metadata.doc_id(row) not in exclude_doc_ids):
+                    hits[row] = hits.get(row, 0) + 1
+        if not hits:
+            return None
+
+        # Verify against the best-hit row, extended by a neighbouring row of
+        # the same document when that covers more of the query, since the
+        # copied text may straddle a source sentence boundary
+        query = set(hashes)
+        best_row = max(hits, key=lambda row: (hits[row], -row))
+        doc_id = metadata.doc_id(best_row)
+        rows = [best_row]
+        covered = len(query & set(self._shingles(self.tokens(metadata.text(best_row)))))
+        for neighbour in (best_row - 1, best_row + 1):
+            if not 0 <= neighbour < len(metadata) or metadata.doc_id(neighbour) != doc_id:
+                continue
+            candidate = sorted(rows + [neighbour])
+            text = " ".join(metadata.text(row) for row in candidate)
+            candidate_covered = len(query & set(self._shingles(self.tokens(text))))
+            if candidate_covered > covered:
+                rows, covered = candidate, candidate_covered
+
+        containment = covered / len(query)
+        if containment < self.threshold:
+            return None
+        return {
+            "score": round(containment, 4),
+            "text": " ".join(metadata.text(row) for row in rows),
+            "doc_id": doc_id,
+            "row": best_row,
+            # The stored row is this very sentence (not a near copy or a
+            # neighbour-extended match), so its vector can be reused
+            "exact": rows == [best_row] and Preprocessor.clean_text(metadata.text(best_row)) == Preprocessor.clean_text(sentence),
+            "method": "fingerprint"
+        }
+
+    def save(self, prefix: str):
+        # Merge the in-memory postings into a new sorted snapshot; reopen()
+        # switches to it
+        tail_hashes = np.fromiter((h for h, rows in self._tail.items() for _ in rows), dtype='int64')
+        tail_rows = np.fromiter((r for rows in self._tail.values() for r in rows), dtype='int64')
+        hashes = np.concatenate([np.asarray(self._base_hashes), tail_hashes])
+        rows = np.concatenate([np.asarray(self._base_rows), tail_rows])
+        order = np.argsort(hashes, kind='stable')
+        for suffix, data in ((".fp_hashes.npy", hashes[order]), (".fp_rows.npy", rows[order])):
+            with open(prefix + suffix, "wb") as f:
+                np.save(f, data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reopen(self, prefix: str):
+        self._base_hashes = np.load(prefix + ".fp_hashes.npy", mmap_mode='r')
+        self._base_rows = np.load(prefix + ".fp_rows.npy", mmap_mode='r')
+        self._tail = {}
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+class IndexRebuilder:
+    # Streams every stored submission into a fresh index built beside the
+    # live one, then swaps it in. Live checks keep searching (and adding to)
+    # the old index until the swap.
+    #
+    # fetch_page(after_id, limit) -> rows ordered by id, row[0] being the doc id
+    # segment_page(rows) -> one sentence list per row (may persist splits)
+    # count_total() -> number of submissions to index
+    #
+    # Pages are appended to the shadow store in id order, so after a crash
+    # the highest doc id in it is where the rebuild resumes.
+    def __init__(self, engine, fetch_page, segment_page, count_total, page_size: int = None,
+                 encode_batch_size: int = None, encode_processes: int = None):
+        self.engine = engine
+        self.fetch_page = fetch_page
+        self.segment_page = segment_page
+        self.count_total = count_total
+        self.page_size = page_size or int(os.environ.get("REBUILD_PAGE_SIZE", 200))
+        self.encode_batch_size = encode_batch_size or int(os.environ.get("REBUILD_BATCH_SIZE", 256))
+        self.encode_processes = encode_processes or int(os.environ.get("REBUILD_ENCODE_PROCESSES", 1))
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = {"status": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self.state)
+
+    def _update(self, **state):
+        with self._lock:
+            self.state.update(state)
+
+    def start(self, restart: bool = False) -> bool:
+        # False if a rebuild is already in progress
+        with self._lock:
+            if self.running:
+                return False
+            self.state = {"status": "starting", "processed": 0, "total": None, "started": time.time()}
+            self._thread = threading.Thread(target=self.run, args=(restart,), name="index-rebuild", daemon=True)
+            self._thread.start()
+            return True
+
+    def run(self, restart: bool = False):
+        pool = None
+        try:
+            shadow, index, metadata = self.engine.open_shadow_index(restart=restart)
+            doc_ids = metadata.doc_ids()
+            last_id = int(doc_ids.max()) if len(doc_ids) else 0
+            self._update(status="running", error=None, total=self.count_total(), resumed_from=last_id or None,
+                         processed=0, indexed_sentences=len(metadata))
+
+            if self.encode_processes > 1 and hasattr(self.engine.model, "start_multi_process_pool"):
+                pool = self.engine.model.start_multi_process_pool(["cpu"] * self.encode_processes)
+
+            while True:
+                rows = self.fetch_page(last_id, self.page_size)
+                if not rows:
+                    break
+                self._index_page(shadow, index, metadata, rows, pool)
+                last_id = rows[-1][0]
+                self._update(processed=self.state["processed"] + len(rows), last_id=last_id,
+                             indexed_sentences=len(metadata))
+
+            self._update(status="swapping")
+            self.engine.promote_shadow_index(shadow, index, metadata)
+
+            # Submissions committed while the last page was being indexed
+            # went to the old index; add them to the new one. The writer
+            # skips any whose check adds them (or already did) after the swap.
+            while True:
+                rows = self.fetch_page(last_id, self.page_size)
+                if not rows:
+                    break
+                for row, sentences in zip(rows, self.segment_page(rows)):
+                    if sentences and not self.engine.has_document(row[0]):
+                        self.engine.add_to_index(sentences, str(row[0]))
+                last_id = rows[-1][0]
+
+            self._update(status="completed", finished=time.time(), indexed_sentences=len(self.engine.metadata))
+        except Exception as e:
+            print(f"Index rebuild failed: {e}")
+            self._update(status="failed", error=str(e), finished=time.time())
+        finally:
+            if pool is not None:
+                self.engine.model.stop_multi_process_pool(pool)
+
+    def _index_page(self, shadow, index, metadata, rows, pool):
+        sentence_lists = self.segment_page(rows)
+        documents = [(str(row[0]), sentences, None)
+                     for row, sentences in zip(rows, sentence_lists) if sentences]
+        if not documents:
+            return
+        texts = [text for _, sentences, _ in documents for text in sentences]
+        vectors = self.engine.encode_bulk(texts, batch_size=self.encode_batch_size, pool=pool)
+        # Durable first, then visible, same order as AIEngine.add_to_index
+        shadow.append_batch(vectors, documents)
+        index.add(np.ascontiguousarray(vectors, dtype='float32'))
+        for doc_id, sentences, _ in documents:
+            metadata.append(sentences, doc_id)
@@ -0,0 +1,87 @@
+import base64
+import json
+import os
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from core.metrics import TRACE_HEADER, current_trace
+
+# Wire format for embeddings: base64 of little-endian float32 rows
+def encode_vectors(vectors) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype='<f4').tobytes()).decode("ascii")
+
+def decode_vectors(data: str, dimension: int):
+    return np.frombuffer(base64.b64decode(data), dtype='<f4').reshape(-1, dimension).astype('float32')
+
+class IndexServiceError(Exception):
+    pass
+
+class IndexServiceClient:
+    # Stand-in for AIEngine and AIDetector in API workers started with
+    # INDEX_SERVICE_URL: the models, the FAISS index and its metadata live
+    # only in the index server (index_server.py) and every worker shares them.
+    def __init__(self, url: str, timeout: float = None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout or float(os.environ.get("INDEX_SERVICE_TIMEOUT", 300))
+
+    def _request(self, method: str, path: str, payload: dict = None, timeout: float = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        # A traced request is traced under the same id by the index server
+        trace = current_trace()
+        if trace is not None:
+            headers[TRACE_HEADER] = trace.id
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise IndexServiceError(f"Index service {path} failed ({e.code}): {e.read().decode(errors='replace')}")
+        except urllib.error.URLError as e:
+            raise IndexServiceError(f"Index service unreachable at {self.url}: {e.reason}")
+
+    # AIEngine interface used by the API
+    def search_document(self, sentences: list[str], top_k: int = 5, exclude_doc_ids=(), embeddings=None):
+        payload = {"sentences": sentences, "top_k": top_k, "exclude_doc_ids": [str(d) for d in exclude_doc_ids]}
+        if embeddings is not None:
+            payload["embeddings"] = encode_vectors(embeddings)
+        response = self._request("POST", "/search_document", payload)
+        return response["results"], decode_vectors(response["embeddings"], response["dimension"])
+
+    def generate_embeddings(self, texts: list[str]):
+        response = self._request("POST", "/encode", {"texts": texts})
+        return decode_vectors(response["embeddings"], response["dimension"])
+
+    def add_to_index(self, texts: list[str], doc_id: str, embeddings=None):
+        payload = {"texts": texts, "doc_id": doc_id}
+        if embeddings is not None:
+            payload["embeddings"] = encode_vectors(embeddings)
+        self._request("POST", "/add", payload)
+
+    def index_size(self, timeout: float = None) -> int:
+        return self._request("GET", "/stats", timeout=timeout)["index_size"]
+
+    def ready(self) -> dict:
+        # The server answers 503 while its models load; that is not an error here
+        try:
+            return self._request("GET", "/ready", timeout=5)
+        except IndexServiceError as e:
+            return {"ready": False, "error": str(e)}
+
+    def start_rebuild(self, restart: bool = False) -> dict:
+        return self._request("POST", "/rebuild", {"restart": restart})
+
+    def rebuild_status(self) -> dict:
+        return self._request("GET", "/rebuild/status")["rebuild"]
+
+    # AIDetector interface
+    def detect_windows(self, text: str) -> dict:
+        return self._request("POST", "/detect", {"text": text})
+
+    def detect_windows_batch(self, texts: list[str]) -> list[dict]:
+        return self._request("POST", "/detect_batch", {"texts": texts})["results"]
+
+    def detect(self, text: str) -> float:
+        return self.detect_windows(text)["score"]
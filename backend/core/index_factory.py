@@ -0,0 +1,78 @@
+import os
+
+import faiss
+import numpy as np
+
+# Supported index types (INDEX_TYPE env var). All use inner product on
+# normalized vectors, i.e. cosine similarity, like the original IndexFlatIP.
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "opq_ivf_pq")
+
+def index_config_from_env() -> dict:
+    return {
+        "index_type": os.environ.get("INDEX_TYPE", "flat"),
+        "nlist": int(os.environ.get("INDEX_NLIST", 1024)),
+        "pq_m": int(os.environ.get("INDEX_PQ_M", 64)),
+        "hnsw_m": int(os.environ.get("INDEX_HNSW_M", 32)),
+        "nprobe": int(os.environ.get("INDEX_NPROBE", 16)),
+        "ef_search": int(os.environ.get("INDEX_EF_SEARCH", 64)),
+        "train_size": int(os.environ.get("INDEX_TRAIN_SIZE", 100000)),
+    }
+
+def factory_string(index_type: str, nlist: int = 1024, pq_m: int = 64, hnsw_m: int = 32, **_) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m}"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "opq_ivf_pq":
+        return f"OPQ{pq_m},IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"Unsupported index type: {index_type}")
+
+def build_index(dimension: int, index_type: str = "flat", **params):
+    return faiss.index_factory(dimension, factory_string(index_type, **params), faiss.METRIC_INNER_PRODUCT)
+
+def min_training_points(index_type: str, nlist: int = 1024, **_) -> int:
+    # Rough lower bound FAISS needs for k-means without warning
+    if index_type in ("ivf_flat", "ivf_pq", "opq_ivf_pq"):
+        return 39 * nlist
+    return 0
+
+def train_index(index, vectors, train_size: int = 100000, seed: int = 0, **_):
+    # Train on a random sample of existing vectors
+    if index.is_trained:
+        return index
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if len(vectors) > train_size:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), train_size, replace=False)]
+    index.train(vectors)
+    return index
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None, **_):
+    # ParameterSpace reaches through OPQ/IDMap wrappers; unknown
+    # parameters for the index type are skipped.
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and "HNSW" in type(faiss.downcast_index(index)).__name__:
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+def all_vectors(index):
+    # Copy every stored vector out of an index. Exact for Flat/HNSW/IVF-Flat,
+    # lossy for the PQ variants.
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def index_from_vectors(vectors, dimension: int, config: dict):
+    index = build_index(dimension, **config)
+    train_index(index, vectors, **config)
+    if len(vectors):
+        index.add(np.ascontiguousarray(vectors, dtype='float32'))
+    apply_search_params(index, **config)
+    return index
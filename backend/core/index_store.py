@@ -0,0 +1,312 @@
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from core.metadata_store import MetadataStore
+
+# The shared index; defined here so its size can be read without loading AIEngine
+DEFAULT_INDEX_PATH = 'data/faiss_index_v3.bin'
+DIMENSION = 768 # Dimension for all-mpnet-base-v2
+
+def _fsync_directory(path: str):
+    # A rename is only durable once its directory is synced (not possible on Windows)
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class IndexStore:
+    # Append-only on-disk layout for the FAISS index and its metadata.
+    #
+    #   <index_path>.d/MANIFEST            current generation (replaced atomically)
+    #   <index_path>.d/base_<gen>.bin      compacted FAISS snapshot
+    #   <index_path>.d/base_<gen>.*        compacted metadata columns (see MetadataStore)
+    #   <index_path>.d/log_<gen>.vec       float32 vectors appended since the snapshot
+    #   <index_path>.d/log_<gen>.jsonl     one record per append: doc_id + texts
+    #
+    # An append writes its vectors first and its metadata record second, so a
+    # crash can only leave unreferenced vector bytes, which recovery truncates.
+    # Compaction writes a new generation and then swaps MANIFEST, so a crash
+    # mid-compaction leaves the previous generation intact.
+    #
+    # A rebuild writes a complete store in <root>.new and promotes it with two
+    # directory renames; load() finishes or rolls back an interrupted promote.
+    def __init__(self, index_path: str, dimension: int, compact_rows: int = None, compact_seconds: float = None, root: str = None):
+        self.legacy_path = index_path
+        self.root = root or index_path + ".d"
+        self.dimension = dimension
+        self.compact_rows = compact_rows or int(os.environ.get("INDEX_COMPACT_ROWS", 50000))
+        self.compact_seconds = compact_seconds or float(os.environ.get("INDEX_COMPACT_SECONDS", 24 * 3600))
+        self.generation = 0
+        self.log_rows = 0
+        # Rows in the loaded snapshot; rows past it were replayed from the log
+        self.base_rows = 0
+        self.last_compaction = time.time()
+
+    def lock_owner(self):
+        # Only one process may write an index: a second one appending to and
+        # compacting the same files corrupts them. The lock lasts as long as
+        # the returned file object stays open.
+        os.makedirs(os.path.dirname(os.path.abspath(self.legacy_path)), exist_ok=True)
+        handle = open(self.legacy_path + ".lock", "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            raise RuntimeError(f"{self.legacy_path} is already open in another process; with several "
+                               "API workers run index_server.py and set INDEX_SERVICE_URL")
+        return handle
+
+    def _path(self, name: str, generation: int = None) -> str:
+        gen = self.generation if generation is None else generation
+        return os.path.join(self.root, name.format(gen=gen))
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.root, "MANIFEST"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self):
+        path = os.path.join(self.root, "MANIFEST")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"generation": self.generation, "dimension": self.dimension, "format": 2}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_directory(self.root)
+
+    def load(self, new_index, migrate_legacy: bool = True):
+        # Returns (index, metadata). new_index() builds an empty index.
+        # migrate_legacy=False starts an empty store even when the legacy
+        # single-file index is still on disk (rebuild shadows).
+        # faiss is imported here, not at module level, so processes that only
+        # read sizes off the files (count_rows) never load it
+        import faiss
+        self._recover_promote()
+        os.makedirs(self.root, exist_ok=True)
+        manifest = self._read_manifest()
+
+        if manifest is None:
+            # First start: migrate a legacy single-file index if there is one
+            index, metadata = new_index(), MetadataStore()
+            if migrate_legacy and os.path.exists(self.legacy_path):
+                index = faiss.read_index(self.legacy_path)
+                metadata = self._read_pickled_metadata(self.legacy_path + ".meta")
+            self.compact(index, metadata)
+            self.base_rows = 0
+            return index, metadata
+
+        self.generation = manifest["generation"]
+        index = faiss.read_index(self._path("base_{gen}.bin"))
+        if manifest.get("format", 1) < 2:
+            # Snapshot written before the columnar metadata store
+            metadata = self._read_pickled_metadata(self._path("base_{gen}.meta"))
+        else:
+            metadata = MetadataStore.open(self._path("base_{gen}"))
+
+        self.base_rows = index.ntotal
+        self.log_rows = self._replay_log(index, metadata)
+        if manifest.get("format", 1) < 2:
+            self.compact(index, metadata)
+            self.base_rows = 0
+        self._remove_stale_generations()
+        return index, metadata
+
+    def count_rows(self):
+        # Rows in the stored index, read from file headers and sizes without
+        # loading it (a crash's torn log tail may count until the next load).
+        # None when there is no format-2 store to read.
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("format", 1) < 2:
+            return None
+        gen = manifest["generation"]
+        try:
+            base_rows = np.load(self._path("base_{gen}.docids.npy", gen), mmap_mode='r').shape[0]
+            log_bytes = os.path.getsize(self._path("log_{gen}.vec", gen))
+        except OSError:
+            return None
+        return int(base_rows) + log_bytes // (self.dimension * 4)
+
+    @staticmethod
+    def _read_pickled_metadata(path: str):
+        if not os.path.exists(path):
+            return MetadataStore()
+        with open(path, "rb") as f:
+            return MetadataStore.from_records(pickle.load(f))
+
+    def _replay_log(self, index, metadata) -> int:
+        records = []
+        meta_path = self._path("log_{gen}.jsonl")
+        if os.path.exists(meta_path):
+            with open(meta_path, "rb") as f:
+                valid_bytes = 0
+                for line in f:
+                    # A record without its newline was cut off by a crash
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+            with open(meta_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+        rows = sum(len(r["texts"]) for r in records)
+        vec_path = self._path("log_{gen}.vec")
+        row_bytes = self.dimension * 4
+        if os.path.exists(vec_path):
+            available = os.path.getsize(vec_path) // row_bytes
+            if available < rows:
+                # Metadata is only written after its vectors are durable
+                raise RuntimeError(f"Index log is missing vectors: {available} < {rows}")
+            with open(vec_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+        elif rows:
+            raise RuntimeError("Index log metadata has no vector file")
+
+        if rows:
+            vectors = np.fromfile(vec_path, dtype='float32').reshape(-1, self.dimension)
+            index.add(vectors)
+            for record in records:
+                metadata.append(record["texts"], record["doc_id"], record.get("spans"))
+        return rows
+
+    def _remove_stale_generations(self):
+        current = (f"base_{self.generation}.", f"log_{self.generation}.")
+        for name in os.listdir(self.root):
+            if name == "MANIFEST" or name.startswith(current):
+                continue
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+    def append(self, vectors, texts: list[str], doc_id: str, spans=None):
+        # Write cost is proportional to the number of new rows
+        self.append_batch(vectors, [(doc_id, texts, spans)])
+
+    def append_batch(self, vectors, documents):
+        # documents: (doc_id, texts, spans or None) in the same order as the
+        # vector rows. One write + fsync per file for the whole batch.
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        lines = []
+        for doc_id, texts, spans in documents:
+            record = {"doc_id": doc_id, "texts": list(texts)}
+            if spans:
+                record["spans"] = [list(span) for span in spans]
+            lines.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        # A failed write (e.g. disk full) is cut back off both files; left
+        # in place it would shift every later row of a running process
+        sizes = {}
+        for path in (self._path("log_{gen}.vec"), self._path("log_{gen}.jsonl")):
+            sizes[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        try:
+            with open(self._path("log_{gen}.vec"), "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._path("log_{gen}.jsonl"), "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            for path, size in sizes.items():
+                try:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+                        os.fsync(f.fileno())
+                except OSError:
+                    pass
+            raise
+        self.log_rows += len(vectors)
+
+    def needs_compaction(self) -> bool:
+        if self.log_rows == 0:
+            return False
+        return (self.log_rows >= self.compact_rows or
+                time.time() - self.last_compaction >= self.compact_seconds)
+
+    def snapshot_prefix(self) -> str:
+        # Path prefix of the current snapshot, for sidecar files
+        return self._path("base_{gen}")
+
+    def compact(self, index, metadata, sidecars=(), lock=None):
+        # Snapshot the full index into a new generation and drop the old log.
+        # Each sidecar (e.g. the fingerprint index) is saved with the
+        # snapshot via sidecar.save(prefix). All files are written without
+        # lock; only switching metadata and sidecars over to them (reopen)
+        # happens under lock(). The caller must keep rows from being added
+        # in between (the index writer thread does).
+        import faiss
+        os.makedirs(self.root, exist_ok=True)
+        new_gen = self.generation + 1
+        prefix = self._path("base_{gen}", new_gen)
+        base_bin = prefix + ".bin"
+        faiss.write_index(index, base_bin)
+        with open(base_bin, "rb") as f:
+            os.fsync(f.fileno())
+        metadata.save(prefix)
+        for sidecar in sidecars:
+            sidecar.save(prefix)
+        with (lock or contextlib.nullcontext)():
+            metadata.reopen(prefix)
+            for sidecar in sidecars:
+                sidecar.reopen(prefix)
+        # Empty logs for the new generation
+        open(self._path("log_{gen}.vec", new_gen), "wb").close()
+        open(self._path("log_{gen}.jsonl", new_gen), "wb").close()
+
+        self.generation = new_gen
+        self._write_manifest()
+        self._remove_stale_generations()
+        self.log_rows = 0
+        self.last_compaction = time.time()
+
+    def discard(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def promote(self, target_root: str):
+        # Atomically replace the store at target_root with this one. The READY
+        # marker lets load() finish the swap if we crash between the renames.
+        open(os.path.join(self.root, "READY"), "wb").close()
+        _fsync_directory(self.root)
+        old_root = target_root + ".old"
+        shutil.rmtree(old_root, ignore_errors=True)
+        if os.path.exists(target_root):
+            os.replace(target_root, old_root)
+        os.replace(self.root, target_root)
+        _fsync_directory(os.path.dirname(os.path.abspath(target_root)))
+        self.root = target_root
+        os.remove(os.path.join(self.root, "READY"))
+        shutil.rmtree(old_root, ignore_errors=True)
+
+    def _recover_promote(self):
+        new_root, old_root = self.root + ".new", self.root + ".old"
+        if not os.path.exists(self.root):
+            if os.path.exists(os.path.join(new_root, "READY")):
+                os.replace(new_root, self.root)
+            elif os.path.exists(old_root):
+                os.replace(old_root, self.root)
+        ready = os.path.join(self.root, "READY")
+        if os.path.exists(ready):
+            os.remove(ready)
+        shutil.rmtree(old_root, ignore_errors=True)
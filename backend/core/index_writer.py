@@ -0,0 +1,71 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+class IndexWriter:
+    # The single thread allowed to change the shared index. Adds queued by
+    # concurrent checks are drained together and handed to apply_adds as one
+    # batch; anything else that mutates the index (compaction, swapping in a
+    # rebuild) runs here too via call(), so writes never interleave.
+    def __init__(self, apply_adds, max_batch: int = None):
+        self.apply_adds = apply_adds
+        # Upper bound on documents published per batch
+        self.max_batch = max_batch or int(os.environ.get("INDEX_WRITE_BATCH", 32))
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="index-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def add(self, item) -> Future:
+        future = Future()
+        self._queue.put(("add", item, future))
+        return future
+
+    def call(self, func, *args, **kwargs):
+        # Run func on the writer thread and wait for its result
+        if threading.current_thread() is self._thread:
+            return func(*args, **kwargs)
+        future = Future()
+        self._queue.put(("call", lambda: func(*args, **kwargs), future))
+        return future.result()
+
+    def _run(self):
+        # A task read past the end of an add batch runs next, keeping order
+        held = None
+        while True:
+            task, held = held or self._queue.get(), None
+            if task[0] == "stop":
+                return
+            if task[0] == "call":
+                self._complete([task], lambda: [task[1]()])
+                continue
+
+            batch = [task]
+            while len(batch) < self.max_batch:
+                try:
+                    task = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task[0] != "add":
+                    held = task
+                    break
+                batch.append(task)
+            self._complete(batch, lambda: self.apply_adds([item for _, item, _ in batch]) or [None] * len(batch))
+
+    @staticmethod
+    def _complete(batch, run):
+        try:
+            results = run()
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def shutdown(self):
+        self._queue.put(("stop", None, None))
@@ -0,0 +1,132 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+# Selectable CPU inference backends for both models (INFERENCE_BACKEND env var):
+#   torch       stock PyTorch fp32 (default)
+#   torch_int8  PyTorch with dynamic int8 quantisation of Linear layers
+#   onnx        ONNX Runtime fp32
+#   onnx_int8   ONNX Runtime with dynamic int8 quantisation
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+
+def backend_config_from_env() -> dict:
+    return {
+        "backend": os.environ.get("INFERENCE_BACKEND", "torch"),
+        "threads": int(os.environ.get("INFERENCE_THREADS", 0)) or None,
+        "cache_dir": os.environ.get("MODEL_CACHE_DIR", "data/models"),
+        # ONNX Runtime quantisation target, see onnxruntime.quantization
+        "int8_config": os.environ.get("INT8_QUANT_CONFIG", "avx2"),
+    }
+
+def configure_threads(threads: int = None):
+    if threads:
+        torch.set_num_threads(threads)
+
+def _ort_session_options(threads: int = None):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+def _local_dir(cache_dir: str, model_name: str, suffix: str) -> str:
+    return os.path.join(cache_dir, model_name.replace("/", "--") + "-" + suffix)
+
+def _quantize_torch(module):
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_sentence_model(model_name: str, backend: str = "torch", threads: int = None,
+                        cache_dir: str = "data/models", int8_config: str = "avx2", **_):
+    from sentence_transformers import SentenceTransformer
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    configure_threads(threads)
+
+    if backend in ("torch", "torch_int8"):
+        model = SentenceTransformer(model_name, cache_folder=cache_dir, device="cpu")
+        if backend == "torch_int8":
+            model[0].auto_model = _quantize_torch(model[0].auto_model)
+        return model
+
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": _ort_session_options(threads)}
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx", cache_folder=cache_dir, model_kwargs=model_kwargs)
+
+    # onnx_int8: export and quantise once, then load the local copy
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    local_dir = _local_dir(cache_dir, model_name, "onnx")
+    file_name = f"onnx/model_qint8_{int8_config}.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        exported = SentenceTransformer(model_name, backend="onnx", cache_folder=cache_dir)
+        exported.save(local_dir)
+        export_dynamic_quantized_onnx_model(exported, int8_config, local_dir)
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs=dict(model_kwargs, file_name=file_name))
+
+class OnnxSequenceClassifier:
+    # Minimal stand-in for a transformers sequence classifier backed by an
+    # ONNX Runtime session: model(input_ids=..., attention_mask=...).logits
+    def __init__(self, onnx_path: str, config, threads: int = None):
+        import onnxruntime as ort
+        self.config = config
+        self.session = ort.InferenceSession(onnx_path, _ort_session_options(threads),
+                                            providers=["CPUExecutionProvider"])
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, attention_mask):
+        logits = self.session.run(["logits"], {
+            "input_ids": input_ids.numpy().astype(np.int64),
+            "attention_mask": attention_mask.numpy().astype(np.int64)
+        })[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+def _export_classifier_onnx(model, tokenizer, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sample = tokenizer("export sample", return_tensors="pt")
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"}
+        },
+        opset_version=17,
+        # TorchScript exporter; the dynamo exporter needs onnxscript
+        dynamo=False
+    )
+
+def load_classifier(model_name: str, backend: str = "torch", threads: int = None,
+                    cache_dir: str = "data/models", **_):
+    # Returns (tokenizer, model) for sequence classification
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    configure_threads(threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, cache_dir=cache_dir)
+    model.eval()
+    if backend == "torch":
+        return tokenizer, model
+    if backend == "torch_int8":
+        return tokenizer, _quantize_torch(model)
+
+    local_dir = _local_dir(cache_dir, model_name, "onnx")
+    fp32_path = os.path.join(local_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        _export_classifier_onnx(model, tokenizer, fp32_path)
+    onnx_path = fp32_path
+    if backend == "onnx_int8":
+        onnx_path = os.path.join(local_dir, "model_qint8.onnx")
+        if not os.path.exists(onnx_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, onnx_path, weight_type=QuantType.QInt8)
+    return tokenizer, OnnxSequenceClassifier(onnx_path, model.config, threads)
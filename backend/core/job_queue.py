@@ -0,0 +1,96 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class JobQueueFull(Exception):
+    pass
+
+class JobQueue:
+    # In-process priority queue for long-running checks. Jobs are identified by
+    # their Submission id; the handler persists results on that row, this class
+    # only keeps live progress for the status and event endpoints.
+    def __init__(self, handler, workers: int = None, max_pending: int = None, retention: int = None):
+        self.handler = handler
+        self.workers = workers or int(os.environ.get("JOB_WORKERS", 2))
+        self.max_pending = max_pending or int(os.environ.get("JOB_QUEUE_LIMIT", 100))
+        # Finished jobs whose state (incl. result) stays in memory
+        self.retention = retention or int(os.environ.get("JOB_RESULT_RETENTION", 256))
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._states = {}
+        self._finished = OrderedDict()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"check-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def submit(self, job_id: int, priority: int = 5):
+        # Lower priority values run first; equal priorities run in FIFO order
+        with self._cond:
+            if len(self._heap) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._heap)} jobs pending")
+            heapq.heappush(self._heap, (priority, next(self._counter), job_id))
+            self._states[job_id] = {"status": "queued", "stage": "queued", "updated": time.time()}
+            self._cond.notify()
+
+    def update(self, job_id: int, **state):
+        with self._cond:
+            current = self._states.setdefault(job_id, {})
+            current.update(state, updated=time.time())
+
+    def get(self, job_id: int):
+        with self._cond:
+            state = self._states.get(job_id)
+            return dict(state) if state else None
+
+    def position(self, job_id: int):
+        # 1-based place in the queue, None once the job has started
+        with self._cond:
+            ordered = sorted(self._heap)
+            for i, (_, _, queued_id) in enumerate(ordered):
+                if queued_id == job_id:
+                    return i + 1
+        return None
+
+    def _finish(self, job_id: int):
+        with self._cond:
+            self._finished[job_id] = True
+            while len(self._finished) > self.retention:
+                old_id, _ = self._finished.popitem(last=False)
+                self._states.pop(old_id, None)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                _, _, job_id = heapq.heappop(self._heap)
+
+            self.update(job_id, status="running")
+            try:
+                result = self.handler(job_id, lambda stage: self.update(job_id, stage=stage))
+                self.update(job_id, status="completed", stage="completed", result=result)
+            except Exception as e:
+                print(f"Check job {job_id} failed: {e}")
+                self.update(job_id, status="failed", error=str(e))
+            finally:
+                self._finish(job_id)
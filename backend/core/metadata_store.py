@@ -0,0 +1,126 @@
+import os
+from array import array
+
+import numpy as np
+
+class MetadataStore:
+    # Columnar mapping from FAISS row id to (doc_id, sentence text).
+    #
+    # The compacted part lives in memory-mapped files written next to the
+    # index snapshot:
+    #   <prefix>.docids.npy   int32 submission id per row
+    #   <prefix>.offsets.npy  int64 start of each row in the text blob (n + 1 entries)
+    #   <prefix>.spans.npy    int32 (start, end) character span in the source text, -1 if unknown
+    #   <prefix>.text         UTF-8 sentences, concatenated
+    # Rows appended since the last compaction are kept in compact arrays.
+    def __init__(self):
+        self._set_base(np.zeros(0, dtype='int32'), np.zeros(1, dtype='int64'),
+                       np.zeros((0, 2), dtype='int32'), np.zeros(0, dtype='uint8'))
+        self._clear_tail()
+
+    def _set_base(self, doc_ids, offsets, spans, blob):
+        self._base_doc_ids = doc_ids
+        self._base_offsets = offsets
+        self._base_spans = spans
+        self._base_blob = blob
+        self._base_len = len(doc_ids)
+
+    def _clear_tail(self):
+        self._tail_doc_ids = array('i')
+        self._tail_offsets = array('q', [0])
+        self._tail_spans = array('i')
+        self._tail_blob = bytearray()
+
+    @classmethod
+    def from_records(cls, records: list[dict]):
+        # Build from the legacy list of {"doc_id", "text"} dicts
+        store = cls()
+        for record in records:
+            store.append([record["text"]], record["doc_id"])
+        return store
+
+    @classmethod
+    def open(cls, prefix: str):
+        store = cls()
+        store._open_base(prefix)
+        return store
+
+    def _open_base(self, prefix: str):
+        doc_ids = np.load(prefix + ".docids.npy", mmap_mode='r')
+        offsets = np.load(prefix + ".offsets.npy", mmap_mode='r')
+        spans = np.load(prefix + ".spans.npy", mmap_mode='r')
+        # np.memmap refuses empty files
+        if os.path.getsize(prefix + ".text") > 0:
+            blob = np.memmap(prefix + ".text", dtype='uint8', mode='r')
+        else:
+            blob = np.zeros(0, dtype='uint8')
+        self._set_base(doc_ids, offsets, spans, blob)
+
+    def __len__(self):
+        return self._base_len + len(self._tail_doc_ids)
+
+    def append(self, texts: list[str], doc_id, spans=None):
+        doc_id = int(doc_id)
+        for i, text in enumerate(texts):
+            self._tail_blob += text.encode("utf-8")
+            self._tail_offsets.append(len(self._tail_blob))
+            self._tail_doc_ids.append(doc_id)
+            start, end = spans[i] if spans else (-1, -1)
+            self._tail_spans.extend((start, end))
+
+    def doc_id(self, idx: int) -> str:
+        if idx < self._base_len:
+            return str(int(self._base_doc_ids[idx]))
+        return str(self._tail_doc_ids[idx - self._base_len])
+
+    def text(self, idx: int) -> str:
+        if idx < self._base_len:
+            start, end = self._base_offsets[idx], self._base_offsets[idx + 1]
+            return self._base_blob[start:end].tobytes().decode("utf-8")
+        idx -= self._base_len
+        start, end = self._tail_offsets[idx], self._tail_offsets[idx + 1]
+        return self._tail_blob[start:end].decode("utf-8")
+
+    def span(self, idx: int):
+        if idx < self._base_len:
+            start, end = self._base_spans[idx]
+        else:
+            idx -= self._base_len
+            start, end = self._tail_spans[2 * idx], self._tail_spans[2 * idx + 1]
+        return (int(start), int(end)) if start >= 0 else None
+
+    def __getitem__(self, idx: int) -> dict:
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        return {"doc_id": self.doc_id(idx), "text": self.text(idx)}
+
+    def doc_ids(self):
+        # All doc ids as one int32 array (used for per-document filtering)
+        return np.concatenate([np.asarray(self._base_doc_ids),
+                               np.frombuffer(self._tail_doc_ids, dtype='int32')])
+
+    def save(self, prefix: str):
+        # Write base + tail as a new set of files; reopen(prefix) switches to
+        # mapping them. Nothing here changes what readers see.
+        base_blob_len = int(self._base_offsets[-1])
+        tail_offsets = np.frombuffer(self._tail_offsets, dtype='int64')[1:] + base_blob_len
+        offsets = np.concatenate([np.asarray(self._base_offsets), tail_offsets])
+        doc_ids = self.doc_ids()
+        spans = np.concatenate([np.asarray(self._base_spans).reshape(-1, 2),
+                                np.frombuffer(self._tail_spans, dtype='int32').reshape(-1, 2)])
+
+        for suffix, data in ((".docids.npy", doc_ids), (".offsets.npy", offsets), (".spans.npy", spans)):
+            with open(prefix + suffix, "wb") as f:
+                np.save(f, data)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(prefix + ".text", "wb") as f:
+            f.write(memoryview(np.asarray(self._base_blob)))
+            f.write(self._tail_blob)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reopen(self, prefix: str):
+        # Map the files written by save(prefix) in place of base + tail
+        self._open_base(prefix)
+        self._clear_tail()
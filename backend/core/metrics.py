@@ -0,0 +1,248 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text format, served on /metrics by
+# the API and the index server. Values are per process: with several
+# uvicorn workers, scrape each one (or the index server for the stages
+# that run there).
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        # Read at scrape time, for values owned by other objects
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, func, **labels):
+        # func() -> number, or None to leave the series out
+        self._functions[self._key(labels)] = func
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, func in self._functions.items():
+            try:
+                value = func()
+            except Exception as e:
+                print(f"Metric {self.name} unavailable: {e}")
+                value = None
+            if value is not None:
+                values[key] = value
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "pipeline_stage_seconds", "Time spent in each stage of document processing", ["stage"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]))
+SENTENCES_PROCESSED = REGISTRY.register(Counter(
+    "sentences_processed_total", "Sentences segmented, searched or indexed", ["stage"]))
+CHECKS = REGISTRY.register(Counter(
+    "checks_total", "Completed plagiarism checks", ["outcome"]))
+CACHE_HITS = REGISTRY.register(Counter(
+    "cache_hits_total", "Lookups answered from a cache", ["cache"]))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "cache_misses_total", "Lookups that had to compute the value", ["cache"]))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "queue_depth", "Tasks waiting in a queue", ["queue"]))
+INDEX_VECTORS = REGISTRY.register(Gauge(
+    "index_vectors", "Sentence vectors in the shared index"))
+MEMORY_BYTES = REGISTRY.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory of this process"))
+
+def resident_memory_bytes():
+    # Linux only; None elsewhere leaves the gauge out
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+MEMORY_BYTES.set_function(resident_memory_bytes)
+
+# Per-request tracing: TRACE_MODE=header traces requests sent with an
+# X-Trace-Id header (used as the trace id when it is 8-64 letters, digits,
+# "-" or "_"), TRACE_MODE=all traces everything. Each trace is written
+# to TRACE_DIR in Chrome trace-event format (chrome://tracing, Perfetto).
+TRACE_MODE = os.environ.get("TRACE_MODE", "off")
+TRACE_DIR = os.environ.get("TRACE_DIR", "data/traces")
+# Only keep traces of requests slower than this
+TRACE_MIN_SECONDS = float(os.environ.get("TRACE_MIN_SECONDS", 0))
+TRACE_HEADER = "X-Trace-Id"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Ids from clients name the dump files, so only plain ones are kept
+_TRACE_ID = re.compile(r"[A-Za-z0-9_-]{8,64}")
+
+class Trace:
+    def __init__(self, name: str, trace_id: str = None):
+        self.name = name
+        self.id = trace_id if trace_id and _TRACE_ID.fullmatch(trace_id) else uuid.uuid4().hex[:16]
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self.duration = None
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float):
+        with self._lock:
+            self.events.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": round((start - self._origin) * 1e6), "dur": round(duration * 1e6)
+            })
+
+    def dump(self, directory: str = None) -> str:
+        directory = directory or TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.{os.getpid()}.json")
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "otherData": {
+                "name": self.name, "trace_id": self.id, "started": self.started, "duration": self.duration
+            }}, f)
+        return path
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def trace(name: str, trace_id: str = None):
+    # Stages timed inside the block, including in worker threads started
+    # with a copy of this context, are recorded on the trace
+    current = Trace(name, trace_id)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.duration = time.perf_counter() - current._origin
+        current.add(name, current._origin, current.duration)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(name, start, duration)
+
+async def http_middleware(request, call_next):
+    # Request latency by route template, plus tracing per TRACE_MODE
+    trace_id = request.headers.get(TRACE_HEADER)
+    traced = TRACE_MODE == "all" or (TRACE_MODE == "header" and trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        if not traced:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        with trace(f"{request.method} {request.url.path}", trace_id) as current:
+            response = await call_next(request)
+            status = response.status_code
+        response.headers[TRACE_HEADER] = current.id
+        if current.duration >= TRACE_MIN_SECONDS:
+            current.dump()
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                route=getattr(route, "path", "unmatched"), status=status)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+class ModelSlot:
+    # A model loaded at most once, by whichever needs it first: a request or
+    # the startup warm-up. Its state is what /health and /ready report.
+    #   not_loaded -> loading -> ready | degraded | failed (the next get() retries)
+    # degraded: loaded but unable to do its job, per healthy(instance), e.g.
+    # the AI detector that falls back to scoring 0 without its model
+    def __init__(self, name: str, load, warm=None, healthy=None):
+        self.name = name
+        self._load = load
+        # Called once on the new instance, e.g. a dummy inference so the
+        # first real request doesn't pay for lazy initialisation
+        self._warm = warm
+        self._healthy = healthy
+        self.instance = None
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.instance is None:
+            with self._lock:
+                if self.instance is None:
+                    self._load_locked()
+        return self.instance
+
+    def _load_locked(self):
+        self.state = "loading"
+        start = time.perf_counter()
+        try:
+            instance = self._load()
+            if self._warm is not None:
+                self._warm(instance)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            raise
+        self.load_seconds = round(time.perf_counter() - start, 2)
+        self.error = None
+        self.state = "ready"
+        if self._healthy is not None and not self._healthy(instance):
+            self.state = "degraded"
+            self.error = "loaded without its model"
+        self.instance = instance
+
+    @property
+    def ready(self) -> bool:
+        # Degraded models still serve requests, so they don't block readiness
+        return self.state in ("ready", "degraded")
+
+    def status(self) -> dict:
+        status = {"state": self.state}
+        if self.load_seconds is not None:
+            status["load_seconds"] = self.load_seconds
+        if self.error:
+            status["error"] = self.error
+        return status
+
+def parse_preload(policy: str, names) -> list:
+    # "all", "none" or a comma-separated subset of names
+    policy = (policy or "").strip().lower()
+    if policy in ("", "none", "0", "false"):
+        return []
+    if policy == "all":
+        return list(names)
+    requested = [name.strip() for name in policy.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown models in preload policy: {', '.join(unknown)} (expected {', '.join(names)})")
+    return requested
+
+def warm_up(slots, wait: bool = False):
+    # Loads the slots one after another on a background thread; with wait,
+    # returns only when all are done
+    def run():
+        for slot in slots:
+            try:
+                print(f"Preloading {slot.name}...")
+                slot.get()
+                print(f"{slot.name} ready in {slot.load_seconds}s")
+            except Exception as e:
+                print(f"Preloading {slot.name} failed: {e}")
+
+    thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+    thread.start()
+    if wait:
+        thread.join()
+    return thread
@@ -1,15 +1,87 @@
-import spacy
 import re
+import os
+import sys
+import hashlib
+from bisect import bisect_right
+from core.model_slot import ModelSlot
 
-# Load English tokenizer, tagger, parser and NER
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    import subprocess
-    subprocess.run(["python", "-m", "spacy", "download", "en_core_web_sm"])
-    nlp = spacy.load("en_core_web_sm")
+# Sentence splitting only needs sentence boundaries, not tags, parses or
+# entities. SPACY_MODE picks how they are found:
+#   senter       en_core_web_sm's statistical sentence recogniser only (default)
+#   parser       full en_core_web_sm pipeline, boundaries from the dependency parse
+#   sentencizer  rule-based punctuation splitter, no trained model needed
+SPACY_MODE = os.environ.get("SPACY_MODE", "senter")
+SPACY_MODEL = "en_core_web_sm"
+SPACY_BATCH_SIZE = int(os.environ.get("SPACY_BATCH_SIZE", 64))
+SPACY_N_PROCESS = int(os.environ.get("SPACY_N_PROCESS", 1))
+# Download en_core_web_sm on first load when it isn't installed
+SPACY_AUTO_DOWNLOAD = os.environ.get("SPACY_AUTO_DOWNLOAD", "1") == "1"
+
+def _load_model(**kwargs):
+    import spacy
+    try:
+        return spacy.load(SPACY_MODEL, **kwargs)
+    except OSError:
+        if not SPACY_AUTO_DOWNLOAD:
+            raise
+        import subprocess
+        subprocess.run([sys.executable, "-m", "spacy", "download", SPACY_MODEL])
+        return spacy.load(SPACY_MODEL, **kwargs)
+
+def _load_nlp():
+    # spaCy (and the torch it imports) is only imported here, on first use
+    import spacy
+    if SPACY_MODE == "sentencizer":
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    if SPACY_MODE == "parser":
+        # Load English tokenizer, tagger, parser and NER
+        return _load_model()
+    nlp = _load_model(exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"])
+    nlp.enable_pipe("senter")
+    return nlp
+
+nlp_model = ModelSlot("spacy", _load_nlp, warm=lambda nlp: nlp("Warm up the pipeline."))
+
+class OffsetMap:
+    # Positions in clean_text(text) back to positions in text. Cleaning only
+    # drops characters (leading whitespace, all but one of each whitespace
+    # run), so the shift is constant between those places: one breakpoint
+    # per run, looked up by bisection.
+    def __init__(self, clean_starts: list[int], original_starts: list[int], cleaned_length: int, original_length: int):
+        self.clean_starts = clean_starts
+        self.original_starts = original_starts
+        self.cleaned_length = cleaned_length
+        self.original_length = original_length
+
+    def to_original(self, pos: int) -> int:
+        if pos >= self.cleaned_length:
+            return self.original_length
+        i = bisect_right(self.clean_starts, pos) - 1
+        # Clamped for characters that lowercase to several
+        end = self.original_starts[i + 1] if i + 1 < len(self.original_starts) else self.original_length
+        return min(self.original_starts[i] + pos - self.clean_starts[i], end - 1)
+
+    def span(self, start: int, end: int) -> tuple[int, int]:
+        # Half-open cleaned span -> half-open original span; the end maps via
+        # its last character so trailing collapsed whitespace isn't included
+        if end <= start:
+            return self.to_original(start), self.to_original(start)
+        return self.to_original(start), self.to_original(end - 1) + 1
 
 class Preprocessor:
+    @staticmethod
+    def signature() -> str:
+        # Identifies the segmentation a stored sentence list came from
+        nlp = nlp_model.get()
+        return f"{SPACY_MODE}:{nlp.meta.get('name', 'blank')}-{nlp.meta.get('version', '')}"
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        # Over the cleaned text, so case and whitespace changes still match
+        return hashlib.sha256(Preprocessor.clean_text(text).encode("utf-8")).hexdigest()
+
     @staticmethod
     def clean_text(text: str) -> str:
         # Lowercase and remove excessive whitespace
@@ -17,16 +89,88 @@ class Preprocessor:
         text = re.sub(r'\s+', ' ', text)
         return text
 
+    @staticmethod
+    def clean_text_with_offsets(text: str) -> tuple[str, OffsetMap]:
+        # clean_text() plus the map back to `text`, in one pass over the
+        # whitespace runs
+        cleaned = Preprocessor.clean_text(text)
+        if len(text.lower()) != len(text):
+            # A few characters lowercase to several (e.g. "İ")
+            return cleaned, Preprocessor._offsets_by_character(text, cleaned)
+        lead = len(text) - len(text.lstrip())
+        clean_starts, original_starts = [0], [lead]
+        removed = 0
+        for run in re.finditer(r'\s{2,}', text.strip()):
+            # The run becomes one space; what follows it is shifted further
+            clean_starts.append(run.start() - removed + 1)
+            original_starts.append(run.end() + lead)
+            removed += len(run.group()) - 1
+        return cleaned, OffsetMap(clean_starts, original_starts, len(cleaned), len(text))
+
+    @staticmethod
+    def _offsets_by_character(text: str, cleaned: str) -> OffsetMap:
+        # Slow path: a breakpoint per character or whitespace run
+        lead = len(text) - len(text.lstrip())
+        clean_starts, original_starts = [0], [lead]
+        pos = 0
+        for piece in re.finditer(r'\s+|\S', text.strip()):
+            clean_starts.append(pos)
+            original_starts.append(piece.start() + lead)
+            pos += 1 if piece.group().isspace() else len(piece.group().lower())
+        return OffsetMap(clean_starts, original_starts, len(cleaned), len(text))
+
+    @staticmethod
+    def _sentences(doc) -> tuple[list[str], list[list[int]]]:
+        # Stripped sentences of more than 10 characters and their [start, end)
+        # in the text the doc was parsed from
+        sentences, offsets = [], []
+        for sent in doc.sents:
+            stripped = sent.text.strip()
+            if len(stripped) > 10:
+                start = sent.start_char + len(sent.text) - len(sent.text.lstrip())
+                sentences.append(stripped)
+                offsets.append([start, start + len(stripped)])
+        return sentences, offsets
+
     @staticmethod
     def split_sentences(text: str) -> list[str]:
-        doc = nlp(text)
-        return [sent.text.strip() for sent in doc.sents if len(sent.text.strip()) > 10]
+        return Preprocessor._sentences(nlp_model.get()(text))[0]
+
+    @staticmethod
+    def locate_sentences(cleaned: str, sentences: list[str]) -> list:
+        # [start, end) of each sentence in the cleaned text, for splits stored
+        # without offsets. Sentences are in document order, so each search
+        # starts where the previous sentence ended; None when not found.
+        offsets = []
+        pos = 0
+        for sent in sentences:
+            sent = Preprocessor.clean_text(sent)
+            start = cleaned.find(sent, pos)
+            if start == -1:
+                offsets.append(None)
+                continue
+            offsets.append([start, start + len(sent)])
+            pos = start + len(sent)
+        return offsets
 
     @staticmethod
     def preprocess(text: str) -> dict:
         cleaned = Preprocessor.clean_text(text)
-        sentences = Preprocessor.split_sentences(cleaned)
+        sentences, offsets = Preprocessor._sentences(nlp_model.get()(cleaned))
         return {
             "cleaned_text": cleaned,
-            "sentences": sentences
+            "sentences": sentences,
+            "offsets": offsets
         }
+
+    @staticmethod
+    def preprocess_batch(texts: list[str], batch_size: int = None, n_process: int = None) -> list[dict]:
+        # Bulk version of preprocess() for rebuilds: streams documents through
+        # nlp.pipe, optionally across several processes
+        cleaned = [Preprocessor.clean_text(text) for text in texts]
+        docs = nlp_model.get().pipe(cleaned, batch_size=batch_size or SPACY_BATCH_SIZE, n_process=n_process or SPACY_N_PROCESS)
+        results = []
+        for text, doc in zip(cleaned, docs):
+            sentences, offsets = Preprocessor._sentences(doc)
+            results.append({"cleaned_text": text, "sentences": sentences, "offsets": offsets})
+        return results
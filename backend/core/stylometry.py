@@ -1,27 +1,175 @@
 import numpy as np
-from collections import Counter
 import re
 
+# Style features of a text as one fixed-length vector, in four groups:
+#   function_words    rate of each word in FUNCTION_WORDS per word
+#   char_ngrams       character trigram profile, hashed into NGRAM_BUCKETS
+#   sentence_lengths  distribution of sentence lengths over SENTENCE_LENGTH_BINS
+#   punctuation       rate of each mark in PUNCTUATION per character
+# Bump FEATURE_VERSION whenever the layout changes; stored profiles with
+# another version are started over.
+FEATURE_VERSION = "1"
+
+FUNCTION_WORDS = (
+    "a", "about", "above", "after", "again", "against", "all", "also", "although", "am", "an", "and", "any",
+    "are", "as", "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by",
+    "can", "could", "did", "do", "does", "during", "each", "either", "every", "few", "for", "from", "further",
+    "had", "has", "have", "he", "her", "here", "hers", "him", "his", "how", "however", "i", "if", "in", "into",
+    "is", "it", "its", "may", "me", "might", "more", "most", "much", "must", "my", "neither", "no", "nor",
+    "not", "of", "on", "once", "one", "only", "or", "other", "our", "out", "over", "own", "same", "shall",
+    "she", "should", "since", "so", "some", "such", "than", "that", "the", "their", "them", "then", "there",
+    "therefore", "these", "they", "this", "those", "though", "thus", "to", "too", "under", "until", "up",
+    "upon", "us", "very", "was", "we", "were", "what", "when", "where", "whereas", "whether", "which",
+    "while", "whilst", "who", "whom", "why", "will", "with", "within", "without", "would", "yet", "you", "your"
+)
+PUNCTUATION = ",.;:!?'\"-()"
+NGRAM_BUCKETS = 256
+# Upper edges; the last bin takes everything longer
+SENTENCE_LENGTH_BINS = (5, 10, 15, 20, 25, 30, 40, 60)
+
+FEATURE_GROUPS = (
+    ("function_words", len(FUNCTION_WORDS)),
+    ("char_ngrams", NGRAM_BUCKETS),
+    ("sentence_lengths", len(SENTENCE_LENGTH_BINS) + 1),
+    ("punctuation", len(PUNCTUATION)),
+)
+SENTENCE_LENGTH_LABELS = [f"<={b}" for b in SENTENCE_LENGTH_BINS] + [f">{SENTENCE_LENGTH_BINS[-1]}"]
+FEATURE_NAMES = (
+    [f"function_words:{w}" for w in FUNCTION_WORDS]
+    + [f"char_ngrams:{i}" for i in range(NGRAM_BUCKETS)]
+    + [f"sentence_lengths:{label}" for label in SENTENCE_LENGTH_LABELS]
+    + [f"punctuation:{p}" for p in PUNCTUATION]
+)
+DIMENSION = len(FEATURE_NAMES)
+_GROUP_SIZES = np.array([size for _, size in FEATURE_GROUPS])
+_GROUP_STARTS = np.concatenate([[0], np.cumsum(_GROUP_SIZES)[:-1]])
+
+_SORTED_FUNCTION_WORDS = np.array(sorted(FUNCTION_WORDS))
+_FUNCTION_WORD_ORDER = np.argsort(np.array(FUNCTION_WORDS))
+_PUNCTUATION_CODES = np.array([ord(p) for p in PUNCTUATION])
+_SENTENCE_END_CODES = np.array([ord(p) for p in ".!?"])
+_WORD = re.compile(r'\w+')
+_SPACES = re.compile(r'\s+')
+
 class Stylometry:
     @staticmethod
     def analyze(text: str) -> dict:
-        words = re.findall(r'\w+', text.lower())
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s for s in sentences if s.strip()]
-        
-        if not words:
-            return {}
-
-        avg_sentence_length = np.mean([len(s.split()) for s in sentences]) if sentences else 0
-        lexical_diversity = len(set(words)) / len(words) if words else 0
-        
-        # Simple function word usage (example)
-        function_words = {"the", "and", "of", "to", "in", "a", "is", "that", "for", "it"}
-        func_word_counts = Counter([w for w in words if w in function_words])
-        func_word_freq = {k: v/len(words) for k, v in func_word_counts.items()}
-
-        return {
-            "avg_sentence_length": float(avg_sentence_length),
+        return Stylometry.extract(text)[0]
+
+    @staticmethod
+    def extract(text: str):
+        # (metrics for the report, feature vector); ({}, None) for text without words
+        lowered = _SPACES.sub(" ", text.lower())
+        spans = [(m.start(), m.group()) for m in _WORD.finditer(lowered)]
+        if not spans:
+            return {}, None
+        starts = np.fromiter((s for s, _ in spans), dtype=np.int64, count=len(spans))
+        words = np.array([w for _, w in spans])
+        n_words = len(words)
+        codes = np.frombuffer(lowered.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+        # Word counts once; function words looked up among the distinct words
+        distinct, counts = np.unique(words, return_counts=True)
+        lexical_diversity = len(distinct) / n_words
+        at = np.minimum(np.searchsorted(distinct, _SORTED_FUNCTION_WORDS), len(distinct) - 1)
+        found = np.where(distinct[at] == _SORTED_FUNCTION_WORDS, counts[at], 0)
+        function_words = np.empty(len(FUNCTION_WORDS))
+        function_words[_FUNCTION_WORD_ORDER] = found / n_words
+
+        # Character trigrams, hashed
+        if len(codes) >= 3:
+            grams = (codes[:-2] * 961 + codes[1:-1] * 31 + codes[2:]) * 2654435761 & 0xFFFFFFFF
+            ngrams = np.bincount(grams * NGRAM_BUCKETS >> 32, minlength=NGRAM_BUCKETS) / len(grams)
+        else:
+            ngrams = np.zeros(NGRAM_BUCKETS)
+
+        # Sentence lengths in words: each word belongs to the sentence ending at
+        # the next terminator
+        ends = np.flatnonzero(np.isin(codes, _SENTENCE_END_CODES))
+        lengths = np.bincount(np.searchsorted(ends, starts))
+        lengths = lengths[lengths > 0]
+        sentence_lengths = np.bincount(np.searchsorted(SENTENCE_LENGTH_BINS, lengths),
+                                       minlength=len(SENTENCE_LENGTH_BINS) + 1) / len(lengths)
+
+        # Punctuation marks per character
+        marks = codes[np.isin(codes, _PUNCTUATION_CODES)]
+        punctuation = (marks[:, None] == _PUNCTUATION_CODES).sum(axis=0) / len(codes)
+
+        vector = np.concatenate([function_words, ngrams, sentence_lengths, punctuation]).astype(np.float32)
+        metrics = {
+            "avg_sentence_length": float(lengths.mean()),
+            "sentence_length_std": float(lengths.std()),
             "lexical_diversity": float(lexical_diversity),
-            "function_word_freq": func_word_freq
+            "function_word_freq": {w: float(f) for w, f in zip(FUNCTION_WORDS, function_words) if f},
+            "sentence_length_distribution": {label: round(float(f), 4)
+                                             for label, f in zip(SENTENCE_LENGTH_LABELS, sentence_lengths)},
+            "punctuation_per_1000_chars": {p: round(float(r) * 1000, 2) for p, r in zip(PUNCTUATION, punctuation) if r}
         }
+        return metrics, vector
+
+def _group_normalise(vectors: np.ndarray) -> np.ndarray:
+    # Each feature group scaled to unit length, so that a row-wise product
+    # summed per group is the cosine similarity of that group
+    norms = np.sqrt(np.add.reduceat(vectors * vectors, _GROUP_STARTS, axis=1))
+    return vectors / np.repeat(np.maximum(norms, 1e-12), _GROUP_SIZES, axis=1)
+
+class StyleProfile:
+    # One student's style: running mean and variance (Welford) of every
+    # feature over all their checked documents, plus the vectors of the last
+    # `limit` ones. Kept up to date one document at a time.
+    def __init__(self, count: int = 0, mean=None, m2=None, history=None, history_ids=None, limit: int = 50):
+        self.count = count
+        self.mean = np.zeros(DIMENSION, dtype=np.float64) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(DIMENSION, dtype=np.float64) if m2 is None else np.asarray(m2, dtype=np.float64)
+        self.history = np.zeros((0, DIMENSION), dtype=np.float32) if history is None else \
+            np.asarray(history, dtype=np.float32).reshape(-1, DIMENSION)
+        self.history_ids = list(history_ids or [])
+        self.limit = limit
+
+    def contains(self, vector: np.ndarray) -> bool:
+        # Identical text gives an identical vector; re-checks are not counted twice
+        return bool(len(self.history)) and bool(np.any(np.all(self.history == vector, axis=1)))
+
+    def add(self, vector: np.ndarray, doc_id):
+        self.count += 1
+        delta = vector - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (vector - self.mean)
+        self.history = np.vstack([self.history, vector[None, :]])[-self.limit:]
+        self.history_ids = (self.history_ids + [doc_id])[-self.limit:]
+
+    def compare(self, vector: np.ndarray, min_history: int = 3, drift_z: float = 3.0, top_features: int = 5) -> dict:
+        # Similarity of a new document to this profile, per feature group. The
+        # student's own spread (each stored document against the profile) sets
+        # what counts as unusual, so drift is judged relative to how
+        # consistent they usually are.
+        result = {"history": self.count, "min_history": min_history}
+        if self.count < min_history or not len(self.history):
+            result["drift"] = None
+            return result
+
+        # New document and history against the profile mean, in one product
+        rows = _group_normalise(np.vstack([self.history, vector[None, :]]).astype(np.float64))
+        centroid = _group_normalise(self.mean[None, :])
+        similarity = np.add.reduceat(rows * centroid, _GROUP_STARTS, axis=1)
+        distance = 1.0 - similarity.mean(axis=1)
+        past, new = distance[:-1], distance[-1]
+        spread = past.std() if len(past) > 1 else 0.0
+        z = float((new - past.mean()) / max(spread, 0.01))
+
+        # Features furthest from the student's usual values
+        std = np.sqrt(self.m2 / max(self.count - 1, 1))
+        deviation = (vector - self.mean) / np.maximum(std, 1e-3)
+        named = [i for i in np.argsort(-np.abs(deviation)) if not FEATURE_NAMES[i].startswith("char_ngrams:")]
+
+        result.update({
+            "similarity": round(float(similarity[-1].mean()), 4),
+            "group_similarity": {name: round(float(s), 4) for (name, _), s in zip(FEATURE_GROUPS, similarity[-1])},
+            "typical_similarity": round(float(1.0 - past.mean()), 4),
+            "z_score": round(z, 2),
+            "drift": z > drift_z,
+            "changed_features": [{"feature": FEATURE_NAMES[i], "value": round(float(vector[i]), 5),
+                                  "usual": round(float(self.mean[i]), 5), "z": round(float(deviation[i]), 2)}
+                                 for i in named[:top_features]]
+        })
+        return result
@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class WorkerPoolFull(Exception):
+    pass
+
+class WorkerPool:
+    # Bounded pool for model inference and document parsing so the asyncio
+    # event loop stays free for /health, auth and other light requests.
+    # Threads (not processes) so every worker shares the loaded models;
+    # torch, FAISS and tesseract release the GIL while they compute.
+    def __init__(self, max_workers: int = None, max_queue: int = None):
+        self.max_workers = max_workers or int(os.environ.get("WORKER_THREADS", min(4, os.cpu_count() or 1)))
+        # Tasks allowed to wait for a worker before new ones are rejected
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("WORKER_QUEUE_LIMIT", 16))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._in_flight - self.max_workers, 0)
+
+    def _acquire(self):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise WorkerPoolFull(f"{self._in_flight} tasks in flight")
+            self._in_flight += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def submit(self, func, *args, **kwargs):
+        # Returns a concurrent.futures.Future; raises WorkerPoolFull when saturated
+        self._acquire()
+        try:
+            # Run in a copy of the caller's context so request tracing follows the task
+            future = self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def call(self, func, *args, **kwargs):
+        # Blocking run for background workers (check and batch jobs): they
+        # wait for a free worker instead of being rejected, so their
+        # inference shares the same WORKER_THREADS limit as API requests
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
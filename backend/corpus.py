@@ -0,0 +1,57 @@
+# Access to the stored submissions that make up the shared index, used by
+# the API and by the standalone index server (index_server.py)
+from database import SessionLocal
+from models import Submission, SubmissionContent
+from core.preprocessor import Preprocessor
+
+def fallback_sentences(text: str, sentences: list[str]) -> list[str]:
+    if not sentences:
+        sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 5]
+    if not sentences:
+        sentences = [text.strip()]
+    return sentences
+
+# Paged reads for IndexRebuilder (see core/index_builder.py)
+def rebuild_fetch_page(after_id: int, limit: int):
+    db = SessionLocal()
+    try:
+        return db.query(Submission.id, SubmissionContent.text, SubmissionContent.sentences).join(SubmissionContent).filter(
+            Submission.status == "completed", Submission.duplicate_of.is_(None), Submission.id > after_id
+        ).order_by(Submission.id).limit(limit).all()
+    finally:
+        db.close()
+
+def rebuild_segment_page(rows) -> list[list[str]]:
+    # Stored splits are reused; the rest are parsed in one nlp.pipe pass and saved
+    results = [None] * len(rows)
+    stale = []
+    for i, (_, _, stored) in enumerate(rows):
+        if stored and stored.get("segmenter") == Preprocessor.signature():
+            results[i] = stored["sentences"]
+        else:
+            stale.append(i)
+    if not stale:
+        return results
+
+    parsed = Preprocessor.preprocess_batch([rows[i][1] for i in stale])
+    db = SessionLocal()
+    try:
+        for i, preprocessed in zip(stale, parsed):
+            doc_id, text, _ = rows[i]
+            results[i] = fallback_sentences(text, preprocessed["sentences"])
+            db.query(Submission).filter(Submission.id == doc_id).update({"text_hash": Preprocessor.text_hash(text)})
+            db.query(SubmissionContent).filter(SubmissionContent.submission_id == doc_id).update({
+                "sentences": {"segmenter": Preprocessor.signature(), "sentences": results[i],
+                              "offsets": preprocessed["offsets"] if preprocessed["sentences"] else None}
+            })
+        db.commit()
+    finally:
+        db.close()
+    return results
+
+def rebuild_count_total() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Submission).filter(Submission.status == "completed", Submission.duplicate_of.is_(None)).count()
+    finally:
+        db.close()
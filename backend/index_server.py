@@ -0,0 +1,174 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+import uvicorn
+import os
+import sys
+
+# Add the current directory to sys.path to allow imports to work when run from root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import rebuild_fetch_page, rebuild_segment_page, rebuild_count_total
+from core.index_builder import IndexRebuilder
+from core.index_client import encode_vectors, decode_vectors
+from core.index_store import IndexStore, DEFAULT_INDEX_PATH, DIMENSION
+from core.worker_pool import WorkerPool, WorkerPoolFull
+from core.model_slot import ModelSlot, parse_preload, warm_up
+from core.preprocessor import nlp_model
+from core.metrics import (REGISTRY, CONTENT_TYPE, http_middleware, CACHE_HITS, CACHE_MISSES,
+                          QUEUE_DEPTH, INDEX_VECTORS)
+
+# Index server: the one process that loads the sentence model, the AI
+# detector and the shared FAISS index. API workers started with
+# INDEX_SERVICE_URL pointing here stay thin, however many there are, and
+# only this process ever writes the index files.
+#
+#   uvicorn backend.index_server:app --host 127.0.0.1 --port 8001
+#
+# Run it with a single worker.
+app = FastAPI(title="AI Plagiarism Detector Index Server", version="1.0.0")
+app.middleware("http")(http_middleware)
+
+_index_rebuilder = None
+
+def _load_ai_engine():
+    print("Loading AI Engine (Sentence Transformers)...")
+    from core.ai_engine import AIEngine
+    return AIEngine()
+
+def _load_ai_detector():
+    print("Loading AI Detector (RoBERTa)...")
+    from core.ai_detector import AIDetector
+    return AIDetector()
+
+ai_engine_model = ModelSlot("engine", _load_ai_engine,
+                            warm=lambda engine: engine.model.encode(["Warm up the encoder."], normalize_embeddings=True))
+ai_detector_model = ModelSlot("detector", _load_ai_detector,
+                              warm=lambda detector: detector.detect("Warm up the classifier with a short text."),
+                              healthy=lambda detector: detector.model is not None)
+# spaCy is only needed here for index rebuilds
+_models = [ai_engine_model, ai_detector_model, nlp_model]
+
+# Same policy as the API (PRELOAD_MODELS, PRELOAD_WAIT)
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "all")
+PRELOAD_WAIT = os.environ.get("PRELOAD_WAIT", "0") == "1"
+_preload = [slot for slot in _models if slot.name in parse_preload(PRELOAD_MODELS, ["spacy", "engine", "detector"])]
+
+@app.on_event("startup")
+def start_model_warm_up():
+    if _preload:
+        warm_up(_preload, wait=PRELOAD_WAIT)
+
+def get_ai_engine():
+    return ai_engine_model.get()
+
+def get_ai_detector():
+    return ai_detector_model.get()
+
+def get_index_rebuilder():
+    global _index_rebuilder
+    if _index_rebuilder is None:
+        _index_rebuilder = IndexRebuilder(get_ai_engine(), rebuild_fetch_page,
+                                          rebuild_segment_page, rebuild_count_total)
+    return _index_rebuilder
+
+# Requests from all API workers share this pool (WORKER_THREADS, WORKER_QUEUE_LIMIT)
+worker_pool = WorkerPool()
+
+async def run_in_pool(func, *args, **kwargs):
+    try:
+        return await worker_pool.run(func, *args, **kwargs)
+    except WorkerPoolFull:
+        raise HTTPException(status_code=503, detail="Index server is busy", headers={"Retry-After": "5"})
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    worker_pool.shutdown()
+
+QUEUE_DEPTH.set_function(lambda: worker_pool.queue_depth, queue="worker_pool")
+_engine = lambda: ai_engine_model.instance
+QUEUE_DEPTH.set_function(lambda: _engine().writer.pending if _engine() else None, queue="index_writer")
+CACHE_HITS.set_function(lambda: _engine().embedding_cache.hits if _engine() else None, cache="embedding")
+CACHE_MISSES.set_function(lambda: _engine().embedding_cache.misses if _engine() else None, cache="embedding")
+INDEX_VECTORS.set_function(lambda: _engine().index_size() if _engine() else None)
+
+@app.get("/metrics")
+def metrics_api():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/health")
+def health_check():
+    return {"status": "healthy", "engine_loaded": ai_engine_model.ready, "detector_loaded": ai_detector_model.ready,
+            "models": {slot.name: slot.state for slot in _models}}
+
+@app.get("/ready")
+def readiness_check():
+    ready = all(slot.ready for slot in _preload)
+    return JSONResponse({"ready": ready, "models": {slot.name: slot.status() for slot in _models}},
+                        status_code=200 if ready else 503)
+
+def _search_document(sentences: list[str], top_k: int, exclude_doc_ids: list, embeddings) -> dict:
+    engine = get_ai_engine()
+    if embeddings is not None:
+        embeddings = decode_vectors(embeddings, engine.dimension)
+    results, embeddings = engine.search_document(sentences, top_k=top_k, exclude_doc_ids=exclude_doc_ids,
+                                                 embeddings=embeddings)
+    return {"results": results, "embeddings": encode_vectors(embeddings), "dimension": engine.dimension}
+
+@app.post("/search_document")
+async def search_document_api(request: dict):
+    return await run_in_pool(_search_document, request["sentences"], int(request.get("top_k", 5)),
+                             request.get("exclude_doc_ids", []), request.get("embeddings"))
+
+def _encode(texts: list[str]) -> dict:
+    engine = get_ai_engine()
+    return {"embeddings": encode_vectors(engine.generate_embeddings(texts)), "dimension": engine.dimension}
+
+@app.post("/encode")
+async def encode_api(request: dict):
+    return await run_in_pool(_encode, request["texts"])
+
+def _add(texts: list[str], doc_id: str, embeddings):
+    engine = get_ai_engine()
+    if embeddings is not None:
+        embeddings = decode_vectors(embeddings, engine.dimension)
+    engine.add_to_index(texts, doc_id, embeddings=embeddings)
+
+@app.post("/add")
+async def add_api(request: dict):
+    await run_in_pool(_add, request["texts"], str(request["doc_id"]), request.get("embeddings"))
+    return {"success": True}
+
+@app.post("/detect")
+async def detect_api(request: dict):
+    return await run_in_pool(lambda text: get_ai_detector().detect_windows(text), request["text"])
+
+@app.post("/detect_batch")
+async def detect_batch_api(request: dict):
+    results = await run_in_pool(lambda texts: get_ai_detector().detect_windows_batch(texts), request["texts"])
+    return {"results": results}
+
+@app.get("/stats")
+def stats_api():
+    # Never loads the engine just for a number: until it is loaded, read the
+    # size off the index files
+    engine = ai_engine_model.instance
+    if engine is not None:
+        return {"index_size": engine.index_size()}
+    return {"index_size": IndexStore(DEFAULT_INDEX_PATH, DIMENSION).count_rows() or 0}
+
+@app.post("/rebuild")
+async def rebuild_api(request: dict = None):
+    restart = bool((request or {}).get("restart", False))
+    rebuilder = await run_in_pool(get_index_rebuilder)
+    started = rebuilder.start(restart=restart)
+    return {"started": started, "rebuild": rebuilder.status()}
+
+@app.get("/rebuild/status")
+def rebuild_status_api():
+    if _index_rebuilder is None:
+        return {"rebuild": {"status": "idle"}}
+    return {"rebuild": _index_rebuilder.status()}
+
+if __name__ == "__main__":
+    port = int(os.environ.get("INDEX_SERVER_PORT", 8001))
+    uvicorn.run("index_server:app", host="127.0.0.1", port=port)
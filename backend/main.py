@@ -1,11 +1,19 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 import uvicorn
+import asyncio
+import contextvars
+import hashlib
+import json
 import os
 import shutil
-import uuid
+import tempfile
 import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 import time
 from datetime import datetime
@@ -13,41 +21,101 @@ from datetime import datetime
 # Add the current directory to sys.path to allow imports to work when run from root
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import engine, Base, get_db
-from models import Submission, User
-from core.extractor import TextExtractor
-from core.preprocessor import Preprocessor
-from core.ai_engine import AIEngine
+from database import engine, Base, SessionLocal, get_db, upgrade_schema
+from models import Submission, SubmissionContent, User, UploadCache, BatchCheck, StudentStyleProfile
+from migrations import migrate_submission_content
+from corpus import fallback_sentences, rebuild_fetch_page, rebuild_segment_page, rebuild_count_total
+from style_profiles import compare_and_update, profile_summary
+from core.extractor import (TextExtractor, ExtractionLimitExceeded, SUPPORTED_EXTENSIONS, expand_archive,
+                            shutdown_ocr_pool)
+from core.batch_similarity import cross_document_matches
+from core.preprocessor import Preprocessor, nlp_model
+from core.index_store import IndexStore, DEFAULT_INDEX_PATH, DIMENSION
 from core.stylometry import Stylometry
-from core.ai_detector import AIDetector
+from core.worker_pool import WorkerPool, WorkerPoolFull
+from core.job_queue import JobQueue, JobQueueFull
+from core.index_builder import IndexRebuilder
+from core.index_client import IndexServiceClient, IndexServiceError
+from core.model_slot import ModelSlot, parse_preload, warm_up
+from core.metrics import (REGISTRY, CONTENT_TYPE, stage, http_middleware, SENTENCES_PROCESSED, CHECKS,
+                          CACHE_HITS, CACHE_MISSES, QUEUE_DEPTH, INDEX_VECTORS)
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Create Tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema()
+migrate_submission_content()
 
 app = FastAPI(title="AI Plagiarism Detector", version="1.0.0")
 
-# Lazy-loaded engines to prevent startup timeouts on Render
-_ai_engine = None
-_ai_detector = None
+# With INDEX_SERVICE_URL set, models and the shared index live in a separate
+# index server (index_server.py) and this process only talks to it, so any
+# number of uvicorn workers share one copy of each
+INDEX_SERVICE_URL = os.environ.get("INDEX_SERVICE_URL")
+_index_service = IndexServiceClient(INDEX_SERVICE_URL) if INDEX_SERVICE_URL else None
+
+# Models are imported and loaded on first use (torch, transformers and faiss
+# too), so the API starts in about a second; see PRELOAD_MODELS below
+def _load_ai_engine():
+    print("Loading AI Engine (Sentence Transformers)... This may take a few minutes on first run.")
+    from core.ai_engine import AIEngine
+    return AIEngine()
+
+def _load_ai_detector():
+    print("Loading AI Detector (RoBERTa)... This may take a few minutes on first run.")
+    from core.ai_detector import AIDetector
+    return AIDetector()
+
+ai_engine_model = ModelSlot("engine", _load_ai_engine,
+                            warm=lambda engine: engine.model.encode(["Warm up the encoder."], normalize_embeddings=True))
+ai_detector_model = ModelSlot("detector", _load_ai_detector,
+                              warm=lambda detector: detector.detect("Warm up the classifier with a short text."),
+                              healthy=lambda detector: detector.model is not None)
 
 def get_ai_engine():
-    global _ai_engine
-    if _ai_engine is None:
-        print("Loading AI Engine (Sentence Transformers)... This may take a few minutes on first run.")
-        from core.ai_engine import AIEngine
-        _ai_engine = AIEngine()
-    return _ai_engine
+    if _index_service is not None:
+        return _index_service
+    return ai_engine_model.get()
 
 def get_ai_detector():
-    global _ai_detector
-    if _ai_detector is None:
-        print("Loading AI Detector (RoBERTa)... This may take a few minutes on first run.")
-        from core.ai_detector import AIDetector
-        _ai_detector = AIDetector()
-    return _ai_detector
+    if _index_service is not None:
+        return _index_service
+    return ai_detector_model.get()
+
+# Models this process loads itself; with an index server only spaCy
+_models = [nlp_model] if _index_service is not None else [nlp_model, ai_engine_model, ai_detector_model]
+
+# Loaded in the background at startup so the first check doesn't wait for
+# them: PRELOAD_MODELS=all (default), none, or a comma-separated subset of
+# spacy, engine, detector. PRELOAD_WAIT=1 holds startup until they are ready.
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "all")
+PRELOAD_WAIT = os.environ.get("PRELOAD_WAIT", "0") == "1"
+_preload = [slot for slot in _models if slot.name in parse_preload(PRELOAD_MODELS, ["spacy", "engine", "detector"])]
+
+@app.on_event("startup")
+def start_model_warm_up():
+    if _preload:
+        warm_up(_preload, wait=PRELOAD_WAIT)
+
+# Bounded pool for model inference and parsing (WORKER_THREADS, WORKER_QUEUE_LIMIT)
+worker_pool = WorkerPool()
+
+async def run_in_pool(func, *args, **kwargs):
+    try:
+        return await worker_pool.run(func, *args, **kwargs)
+    except WorkerPoolFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing other documents, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    worker_pool.shutdown()
+    shutdown_ocr_pool()
 
 # CORS Setup
 app.add_middleware(
@@ -64,13 +132,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency for /metrics and optional per-request traces (TRACE_MODE)
+app.middleware("http")(http_middleware)
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model_loaded": True, "index_ready": True, "version": "1.0.0"}
+    # Liveness only; models may still be loading, see /ready
+    return {
+        "status": "healthy",
+        "model_loaded": all(slot.ready for slot in _models),
+        "index_ready": _index_service is not None or ai_engine_model.ready,
+        "models": {slot.name: slot.state for slot in _models},
+        "version": "1.0.0"
+    }
+
+@app.get("/ready")
+def readiness_check():
+    # 200 once every preloaded model (and the index server, if used) is
+    # ready, 503 until then. Models that aren't preloaded load on first use.
+    ready = all(slot.ready for slot in _preload)
+    body = {"models": {slot.name: slot.status() for slot in _models}}
+    if _index_service is not None:
+        body["index_service"] = _index_service.ready()
+        ready = ready and body["index_service"].get("ready", False)
+    body["ready"] = ready
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 # Authentication Endpoints
 @app.post("/api/auth/register")
-async def register_user(request: dict, db: Session = Depends(get_db)):
+def register_user(request: dict, db: Session = Depends(get_db)):
     name = request.get("name")
     email = request.get("email")
     password = request.get("password")
@@ -97,7 +187,7 @@ async def register_user(request: dict, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/login")
-async def login_user(request: dict, db: Session = Depends(get_db)):
+def login_user(request: dict, db: Session = Depends(get_db)):
     email = request.get("email")
     password = request.get("password")
     
@@ -111,23 +201,77 @@ async def login_user(request: dict, db: Session = Depends(get_db)):
         "message": "Login successful"
     }
 
+# Duplicate handling for checks of text that was checked before:
+#   reuse    the same owner re-checking unchanged text gets the earlier analysis back
+#   recheck  analyse again, but never match or re-index its own earlier copies
+#   off      every check is analysed and indexed as new
+# Re-uploads of identical files reuse the extracted text unless it is off.
+DEDUP_POLICY = os.environ.get("DEDUP_POLICY", "reuse")
+
+# Uploads are spooled to UPLOAD_TMP_DIR and removed once extracted
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_TMP_DIR = os.environ.get("UPLOAD_TMP_DIR", "data/uploads")
+
+async def _spool_upload(file: UploadFile, directory: str, max_bytes: int):
+    # Stream an upload to a temporary file in directory, enforcing the size
+    # limit. Returns (path, size, content hash); the caller removes the file.
+    file_ext = os.path.splitext(file.filename or "")[1]
+    fd, file_path = tempfile.mkstemp(suffix=file_ext, dir=directory)
+    size = 0
+    # Identical bytes with the same extension extract to identical text
+    digest = hashlib.sha256(file_ext.lower().encode("utf-8") + b"\0")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{file.filename} is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    return file_path, size, digest.hexdigest()
+
+def _file_hash(path: str) -> str:
+    # Same hash as _spool_upload, for files unpacked from an archive
+    digest = hashlib.sha256(os.path.splitext(path)[1].lower().encode("utf-8") + b"\0")
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 @app.post("/api/upload")
 async def upload_file_api(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    # Save file locally
-    file_ext = os.path.splitext(file.filename)[1]
-    file_path = f"data/{uuid.uuid4()}{file_ext}"
-    os.makedirs("data", exist_ok=True)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Extract text
+    # Stream to a temporary file (deleted after extraction), enforcing the size limit
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    file_path, size, content_hash = await _spool_upload(file, UPLOAD_TMP_DIR, UPLOAD_MAX_BYTES)
     try:
-        text = TextExtractor.extract_text(file_path)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        cached = db.query(UploadCache).filter(UploadCache.content_hash == content_hash).first() \
+            if DEDUP_POLICY != "off" else None
+        if cached is not None:
+            CACHE_HITS.inc(cache="upload")
+            text = cached.text
+        else:
+            CACHE_MISSES.inc(cache="upload")
+            # Extract text
+            try:
+                text = await run_in_pool(TextExtractor.extract_text, file_path)
+            except HTTPException:
+                raise
+            except ExtractionLimitExceeded as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if text.strip() and DEDUP_POLICY != "off":
+                db.merge(UploadCache(content_hash=content_hash, text=text))
+                db.commit()
+    finally:
+        os.remove(file_path)
 
     if not text.strip():
         raise HTTPException(status_code=400, detail="Could not extract text from file.")
@@ -136,7 +280,9 @@ async def upload_file_api(
         "success": True,
         "filename": file.filename,
         "content_type": file.content_type,
-        "size": os.path.getsize(file_path),
+        "size": size,
+        "content_hash": content_hash,
+        "cached": cached is not None,
         "text": text,
         "character_count": len(text),
         "word_count": len(text.split())
@@ -158,47 +304,159 @@ async def submit_text_api(request: dict, db: Session = Depends(get_db)):
         "word_count": len(text.split())
     }
 
-@app.post("/api/check")
-async def check_plagiarism_api(request: dict, db: Session = Depends(get_db)):
-    text = request.get("text", "")
-    filename = request.get("filename", "unknown.txt")
-    user_email = request.get("user_email")
-    student_name = request.get("student_name", "Academic User")
-    threshold_high = request.get("threshold_high", 0.85)
-    threshold_medium = request.get("threshold_medium", 0.7)
-    
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Text cannot be empty")
-        
-    # Find user for ownership
-    user = db.query(User).filter(User.email == user_email).first()
-    user_id = user.id if user else None
+def _stored_sentences(submission: Submission):
+    stored = submission.sentences
+    if stored and stored.get("segmenter") == Preprocessor.signature():
+        return stored
+    return None
+
+def _segment_submission(db: Session, submission: Submission) -> list[str]:
+    return _segment_submissions(db, [submission])[0]
+
+def _segment_submissions(db: Session, submissions: list) -> list[list[str]]:
+    # Reuse the split of each row or of any earlier submission of the same
+    # text; the rest are parsed with spaCy in one nlp.pipe pass. Sentence
+    # offsets are into the cleaned text, which copies share.
+    results = []
+    for submission in submissions:
+        submission.text_hash = Preprocessor.text_hash(submission.content_text)
+        stored = _stored_sentences(submission)
+        if stored is None:
+            previous = db.query(SubmissionContent.sentences).join(Submission).filter(
+                Submission.text_hash == submission.text_hash,
+                SubmissionContent.sentences.isnot(None)
+            ).order_by(Submission.id.desc()).first()
+            if previous is not None and previous.sentences.get("segmenter") == Preprocessor.signature():
+                stored = previous.sentences
+        (CACHE_MISSES if stored is None else CACHE_HITS).inc(cache="sentence_split")
+        results.append(stored)
 
+    stale = [i for i, stored in enumerate(results) if stored is None]
+    if stale:
+        parsed = Preprocessor.preprocess_batch([submissions[i].content_text for i in stale])
+        for i, preprocessed in zip(stale, parsed):
+            sentences = fallback_sentences(submissions[i].content_text, preprocessed["sentences"])
+            # Fallback splits are located later, when a report needs them
+            results[i] = {"sentences": sentences, "offsets": preprocessed["offsets"] if preprocessed["sentences"] else None}
+    for submission, stored in zip(submissions, results):
+        submission.sentences = {"segmenter": Preprocessor.signature(), "sentences": stored["sentences"],
+                                "offsets": stored.get("offsets")}
+    return [stored["sentences"] for stored in results]
+
+# Pipeline stages reported by check jobs, in order
+CHECK_STAGES = ["queued", "preprocessing", "stylometry", "ai_detection", "similarity_search", "saving", "indexing", "completed"]
+
+def _group_matches_by_source(matches: list, n_sentences: int) -> list:
+    # Per-source view of the matches: contiguous runs of matched sentences
+    # merged into spans, and the share of the submission each source covers.
+    # Matches are produced in chunk order, so one pass extends each source's
+    # last span.
+    if any(a["chunk_id"] > b["chunk_id"] for a, b in zip(matches, matches[1:])):
+        matches = sorted(matches, key=lambda m: m["chunk_id"])
+    by_source = {}
+    for m in matches:
+        source = by_source.get(m["source_id"])
+        if source is None:
+            source = by_source[m["source_id"]] = {"source_id": m["source_id"], "matched_sentences": 0,
+                                                  "max_score": m["similarity_score"], "spans": []}
+        source["matched_sentences"] += 1
+        source["max_score"] = max(source["max_score"], m["similarity_score"])
+        spans = source["spans"]
+        if spans and m["chunk_id"] == spans[-1]["end_chunk"] + 1:
+            span = spans[-1]
+            span["end_chunk"] = m["chunk_id"]
+            span["max_score"] = max(span["max_score"], m["similarity_score"])
+        else:
+            spans.append({"start_chunk": m["chunk_id"], "end_chunk": m["chunk_id"],
+                          "max_score": m["similarity_score"]})
+
+    sources = [{
+        "source_id": source["source_id"],
+        "matched_sentences": source["matched_sentences"],
+        "coverage": round(source["matched_sentences"] / n_sentences * 100, 2) if n_sentences else 0,
+        "max_score": source["max_score"],
+        "spans": source["spans"]
+    } for source in by_source.values()]
+    sources.sort(key=lambda s: (-s["coverage"], -s["max_score"]))
+    return sources
+
+def _sentence_positions(submission: Submission, sentences: list[str]) -> list:
+    # [start, end) of each sentence in the submitted text, or None. Stored
+    # offsets are into the cleaned text and mapped back through its OffsetMap;
+    # older splits without them are located in one forward pass.
+    cleaned, offset_map = Preprocessor.clean_text_with_offsets(submission.content_text)
+    stored = submission.sentences or {}
+    offsets = stored.get("offsets")
+    if not offsets or stored.get("sentences") != sentences:
+        offsets = Preprocessor.locate_sentences(cleaned, sentences)
+    return [offset_map.span(*offset) if offset else None for offset in offsets]
+
+def _source_positions(sources: list, chunks: list) -> list:
+    # Character range in the submitted text of every merged source span
+    by_chunk = {chunk["chunk_id"]: chunk for chunk in chunks}
+    result = []
+    for source in sources:
+        spans = []
+        for span in source["spans"]:
+            first, last = by_chunk.get(span["start_chunk"]), by_chunk.get(span["end_chunk"])
+            if first and last:
+                span = dict(span, start_pos=first["start_pos"], end_pos=last["end_pos"])
+            spans.append(span)
+        result.append(dict(source, spans=spans))
+    return result
+
+def _run_check(db: Session, submission: Submission, threshold_high: float, threshold_medium: float, on_stage=None):
+    # Full /api/check pipeline; fills in and commits `submission`.
+    # Runs in a worker pool or job thread, never on the event loop.
+    on_stage = on_stage or (lambda stage: None)
+    text = submission.content_text
     start_time = time.time()
 
     # 1. Preprocess
-    preprocessed = Preprocessor.preprocess(text)
-    sentences = preprocessed["sentences"]
-    if not sentences:
-        sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 5]
-    if not sentences:
-        sentences = [text.strip()]
+    on_stage("preprocessing")
+    with stage("preprocessing"):
+        sentences = _segment_submission(db, submission)
+        own_copies, indexed_copy = _earlier_copies(db, submission)
+    SENTENCES_PROCESSED.inc(len(sentences), stage="preprocessing")
+    if own_copies and DEDUP_POLICY == "reuse":
+        return _reuse_check(db, submission, own_copies[-1], indexed_copy, sentences, threshold_high, threshold_medium)
 
     # 2. Stylometry
-    style_metrics = Stylometry.analyze(text)
+    on_stage("stylometry")
+    with stage("stylometry"):
+        style_metrics, style_vector = Stylometry.extract(text)
 
     # 3. AI Text Detection
-    ai_prob = get_ai_detector().detect(text)
+    on_stage("ai_detection")
+    with stage("ai_detection"):
+        ai_detection = get_ai_detector().detect_windows(text)
 
     # 4. Plagiarism Analysis (Search against SHARED index)
+    on_stage("similarity_search")
+    # Exact copies are found by fingerprint, the rest by embedding search;
+    # the returned vectors are reused for the index add in step 7
+    # A re-check never matches its own earlier copies
+    with stage("similarity_search"):
+        batch_results, embeddings = get_ai_engine().search_document(sentences, top_k=1, exclude_doc_ids=own_copies)
+
+    return _complete_check(db, submission, sentences, style_metrics, ai_detection, batch_results, embeddings,
+                           indexed_copy, threshold_high, threshold_medium, start_time, on_stage,
+                           style_vector=style_vector)
+
+def _complete_check(db: Session, submission: Submission, sentences: list[str], style_metrics: dict, ai_detection: dict,
+                    batch_results: list, embeddings, indexed_copy, threshold_high: float, threshold_medium: float,
+                    start_time: float, on_stage, extra_report: dict = None, style_vector=None):
+    # Steps 5-7 of a check: score the search results, save the report and
+    # add the sentences to the shared index
+    ai_prob = ai_detection["score"]
     matches = []
-    for i, sent in enumerate(sentences):
-        results = get_ai_engine().search(sent, top_k=1)
+    for i, results in enumerate(batch_results):
         if results:
             best_match = results[0]
             if best_match['score'] > 0.4:
                 match_type = "semantic"
-                if best_match['score'] > 0.90:
+                # Same comparison as FINGERPRINT_THRESHOLD (0.9 by default)
+                if best_match['score'] >= 0.90:
                     match_type = "exact"
                 elif best_match['score'] > 0.70:
                     match_type = "paraphrase"
@@ -211,6 +469,8 @@ async def check_plagiarism_api(request: dict, db: Session = Depends(get_db)):
                     "match_type": match_type
                 })
 
+    sources = _group_matches_by_source(matches, len(sentences))
+
     # 5. Calculate scores
     significant_matches = [m for m in matches if m['similarity_score'] > 0.65]
     plagiarism_score = min(len(significant_matches) / len(sentences) * 100, 100) if sentences else 0
@@ -221,129 +481,754 @@ async def check_plagiarism_api(request: dict, db: Session = Depends(get_db)):
     processing_time = round(time.time() - start_time, 2)
     timestamp = datetime.now().isoformat()
 
-    # Calculate risk counts
-    high_risk = len([m for m in matches if m['similarity_score'] >= threshold_high])
-    medium_risk = len([m for m in matches if threshold_medium <= m['similarity_score'] < threshold_high])
-    low_risk = len([m for m in matches if m['similarity_score'] < threshold_medium])
+    # 6. Save to DB with USER_ID (Isolation), comparing the writing style
+    # with the student's earlier documents on the way
+    on_stage("saving")
+    db.add(submission)
+    db.flush()
+    with stage("style_profile"):
+        style_drift = compare_and_update(db, submission.user_id, submission.student_name, style_vector, submission.id)
+    if style_drift is not None:
+        style_metrics = dict(style_metrics, drift=style_drift)
+    submission.similarity_score = plagiarism_score
+    submission.ai_score = ai_prob
+    submission.plagiarism_report = {
+        "matches": matches,
+        "sources": sources,
+        "overall_score": plagiarism_score,
+        "ai_score": ai_prob,
+        "ai_windows": ai_detection["windows"],
+        "processing_time": processing_time,
+        "timestamp": timestamp,
+        "risk_counts": _risk_counts(matches, threshold_high, threshold_medium),
+        **(extra_report or {})
+    }
+    submission.stylometry_data = style_metrics
+    submission.duplicate_of = indexed_copy
+    submission.status = "completed"
+    submission.stage = "completed"
+    db.add(submission)
+    with stage("db_commit"):
+        db.commit()
+    db.refresh(submission)
+
+    # 7. Add to SHARED FAISS index (so others can match against it), unless
+    # the same text is already there
+    on_stage("indexing")
+    if indexed_copy is None:
+        with stage("indexing"):
+            get_ai_engine().add_to_index(sentences, str(submission.id), embeddings=embeddings)
+
+    CHECKS.inc(outcome="analysed")
+    return _check_result(submission, sentences)
+
+def _risk_counts(matches: list, threshold_high: float, threshold_medium: float) -> dict:
+    return {
+        "high": len([m for m in matches if m['similarity_score'] >= threshold_high]),
+        "medium": len([m for m in matches if threshold_medium <= m['similarity_score'] < threshold_high]),
+        "low": len([m for m in matches if m['similarity_score'] < threshold_medium])
+    }
+
+def _check_result(submission: Submission, sentences: list[str]) -> dict:
+    # /api/check response for a completed submission
+    text = submission.content_text
+    report = submission.plagiarism_report
+
+    # Prepare chunks for UI, as they appear in the submitted text
+    chunks = []
+    for i, position in enumerate(_sentence_positions(submission, sentences)):
+        if position is not None:
+            start_pos, end_pos = position
+            chunks.append({
+                "text": text[start_pos:end_pos], "chunk_id": i,
+                "start_pos": start_pos, "end_pos": end_pos
+            })
+
+    result = {
+        "overall_score": report["overall_score"],
+        "ai_score": report["ai_score"],
+        "ai_windows": report["ai_windows"],
+        "chunks": chunks,
+        "matches": report["matches"],
+        "sources": _source_positions(report["sources"], chunks),
+        "high_risk_count": report["risk_counts"]["high"],
+        "medium_risk_count": report["risk_counts"]["medium"],
+        "low_risk_count": report["risk_counts"]["low"],
+        "processing_time": report["processing_time"],
+        "timestamp": report["timestamp"]
+    }
+    if "reused_from" in report:
+        result["reused_from"] = report["reused_from"]
+    if "batch_matches" in report:
+        result["batch_matches"] = report["batch_matches"]
+    if (submission.stylometry_data or {}).get("drift"):
+        result["style_drift"] = submission.stylometry_data["drift"]
+    return result
+
+def _earlier_copies(db: Session, submission: Submission):
+    # (ids of the owner's earlier checks of this text, id of the copy already
+    # in the index). Owners are identified by account and student name.
+    if DEDUP_POLICY == "off":
+        return [], None
+    copies = db.query(Submission.id, Submission.user_id, Submission.student_name, Submission.duplicate_of).filter(
+        Submission.text_hash == submission.text_hash,
+        Submission.status == "completed",
+        Submission.id != submission.id
+    ).order_by(Submission.id).all()
+    own = [c.id for c in copies
+           if submission.user_id is not None and c.user_id == submission.user_id and c.student_name == submission.student_name]
+    indexed = next((c.id for c in copies if c.duplicate_of is None), None)
+    return own, indexed
+
+def _reuse_check(db: Session, submission: Submission, previous_id: int, indexed_copy, sentences: list[str],
+                 threshold_high: float, threshold_medium: float) -> dict:
+    previous = db.query(Submission).filter(Submission.id == previous_id).first()
+    report = dict(previous.plagiarism_report, reused_from=previous.id,
+                  risk_counts=_risk_counts(previous.plagiarism_report["matches"], threshold_high, threshold_medium))
+    report.setdefault("sources", _group_matches_by_source(report["matches"], len(sentences)))
+    report.setdefault("ai_windows", [])
+    submission.similarity_score = previous.similarity_score
+    submission.ai_score = previous.ai_score
+    submission.plagiarism_report = report
+    submission.stylometry_data = previous.stylometry_data
+    submission.duplicate_of = indexed_copy
+    submission.status = "completed"
+    submission.stage = "completed"
+    db.add(submission)
+    with stage("db_commit"):
+        db.commit()
+    db.refresh(submission)
+    CHECKS.inc(outcome="reused")
+    return _check_result(submission, sentences)
 
-    # 6. Save to DB with USER_ID (Isolation)
-    submission = Submission(
-        user_id=user_id,
-        filename=filename,
-        student_name=student_name,
+def _new_submission(request: dict, db: Session, status: str) -> Submission:
+    text = request.get("text", "")
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+
+    # Find user for ownership
+    user = db.query(User).filter(User.email == request.get("user_email")).first()
+    return Submission(
+        user_id=user.id if user else None,
+        filename=request.get("filename", "unknown.txt"),
+        student_name=request.get("student_name", "Academic User"),
         content_text=text,
-        similarity_score=plagiarism_score,
-        ai_score=ai_prob,
-        plagiarism_report={
-            "matches": matches,
-            "overall_score": plagiarism_score,
-            "ai_score": ai_prob,
-            "processing_time": processing_time,
-            "timestamp": timestamp,
-            "risk_counts": {
-                "high": high_risk,
-                "medium": medium_risk,
-                "low": low_risk
-            }
-        },
-        stylometry_data=style_metrics
+        status=status,
+        stage=status,
+        job_options={
+            "threshold_high": request.get("threshold_high", 0.85),
+            "threshold_medium": request.get("threshold_medium", 0.7)
+        }
     )
+
+@app.post("/api/check")
+async def check_plagiarism_api(request: dict, db: Session = Depends(get_db)):
+    submission = _new_submission(request, db, status="running")
+    options = submission.job_options
+    result = await run_in_pool(_run_check, db, submission, options["threshold_high"], options["threshold_medium"])
+    return {"success": True, "result": result}
+
+# Job-based checks: submit returns immediately, progress via polling or SSE
+def _run_check_job(job_id: int, on_stage):
+    db = SessionLocal()
+    try:
+        submission = db.query(Submission).filter(Submission.id == job_id).first()
+        if submission is None:
+            raise ValueError(f"Submission {job_id} not found")
+
+        def report_stage(stage):
+            on_stage(stage)
+            # Indexing runs after the completed row is committed; keep it completed
+            if submission.status != "completed":
+                submission.status = "running"
+                submission.stage = stage
+                db.commit()
+
+        try:
+            options = submission.job_options or {}
+            return _run_check(db, submission, options.get("threshold_high", 0.85),
+                              options.get("threshold_medium", 0.7), on_stage=report_stage)
+        except Exception as e:
+            CHECKS.inc(outcome="failed")
+            db.rollback()
+            submission.status = "failed"
+            submission.error = str(e)
+            db.commit()
+            raise
+    finally:
+        db.close()
+
+# Job threads only wait; the pipeline itself runs in the bounded worker pool
+check_jobs = JobQueue(lambda job_id, on_stage: worker_pool.call(_run_check_job, job_id, on_stage))
+
+@app.on_event("startup")
+def start_check_jobs():
+    check_jobs.start()
+    # Re-queue jobs interrupted by a restart; their input is on the Submission row
+    db = SessionLocal()
+    try:
+        pending = db.query(Submission.id).filter(
+            Submission.status.in_(["queued", "running"]), Submission.batch_id.is_(None)
+        ).order_by(Submission.id).all()
+        for (job_id,) in pending:
+            try:
+                check_jobs.submit(job_id)
+            except JobQueueFull:
+                break
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def stop_check_jobs():
+    check_jobs.shutdown()
+
+def _job_status(job_id: int, db: Session) -> dict:
+    state = check_jobs.get(job_id)
+    submission = None
+    if state is None or (state["status"] in ("completed", "failed") and "result" not in state):
+        submission = db.query(Submission).filter(Submission.id == job_id).first()
+        if submission is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        state = {"status": submission.status, "stage": submission.stage, "error": submission.error}
+
+    stage = state.get("stage") or state["status"]
+    status = {
+        "job_id": job_id,
+        "status": state["status"],
+        "stage": stage,
+        "progress": round(CHECK_STAGES.index(stage) / (len(CHECK_STAGES) - 1), 2) if stage in CHECK_STAGES else None,
+        "queue_position": check_jobs.position(job_id) if state["status"] == "queued" else None,
+        "error": state.get("error")
+    }
+    if state["status"] == "completed":
+        # Live result when still retained in memory, otherwise the stored report
+        status["result"] = state.get("result") or _check_result(submission, (submission.sentences or {}).get("sentences", []))
+    return status
+
+@app.post("/api/check/jobs")
+async def submit_check_job_api(request: dict, db: Session = Depends(get_db)):
+    try:
+        priority = int(request.get("priority", 5))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="priority must be an integer")
+    submission = _new_submission(request, db, status="queued")
     db.add(submission)
     db.commit()
     db.refresh(submission)
+    try:
+        check_jobs.submit(submission.id, priority=priority)
+    except JobQueueFull:
+        db.delete(submission)
+        db.commit()
+        raise HTTPException(status_code=503, detail="Too many pending checks, please retry shortly",
+                            headers={"Retry-After": "30"})
+    return {
+        "success": True,
+        "job_id": submission.id,
+        "status_url": f"/api/check/jobs/{submission.id}",
+        "events_url": f"/api/check/jobs/{submission.id}/events"
+    }
 
-    # 7. Add to SHARED FAISS index (so others can match against it)
-    get_ai_engine().add_to_index(sentences, str(submission.id))
+@app.get("/api/check/jobs/{job_id}")
+def get_check_job_api(job_id: int, db: Session = Depends(get_db)):
+    return {"success": True, "job": _job_status(job_id, db)}
 
-    # 8. Prepare chunks for UI
-    chunks = []
-    current_pos = 0
-    for i, sent in enumerate(sentences):
-        start_pos = text.find(sent, current_pos)
-        if start_pos == -1: start_pos = text.find(sent)
-        if start_pos != -1:
-            chunks.append({
-                "text": sent, "chunk_id": i,
-                "start_pos": start_pos, "end_pos": start_pos + len(sent)
-            })
-            current_pos = start_pos + len(sent)
+@app.get("/api/check/jobs/{job_id}/events")
+async def stream_check_job_api(job_id: int, request: Request):
+    # Server-sent events: one "progress" event per stage change, then "result" or "error"
+    async def events():
+        last_stage = None
+        while not await request.is_disconnected():
+            db = SessionLocal()
+            try:
+                status = _job_status(job_id, db)
+            except HTTPException as e:
+                yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
+                return
+            finally:
+                db.close()
+
+            if status["stage"] != last_stage:
+                last_stage = status["stage"]
+                progress = {k: v for k, v in status.items() if k != "result"}
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            if status["status"] == "completed":
+                yield f"event: result\ndata: {json.dumps(status['result'], default=str)}\n\n"
+                return
+            if status["status"] == "failed":
+                yield f"event: error\ndata: {json.dumps({'detail': status['error']})}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Batch checks: many documents (files or zip archives) checked together,
+# e.g. a whole class. Sentences of the whole batch are segmented, encoded
+# and AI-scored in shared passes, and every document is compared with every
+# other one in the batch as well as with the shared index.
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 200))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 500 * 1024 * 1024))
+BATCH_EXTRACT_THREADS = int(os.environ.get("BATCH_EXTRACT_THREADS", 4))
+# Sentence similarity that counts as a match between two batch documents
+BATCH_PAIR_THRESHOLD = float(os.environ.get("BATCH_PAIR_THRESHOLD", 0.85))
+BATCH_STAGES = ["queued", "preprocessing", "encoding", "cross_matching", "ai_detection", "similarity_search", "saving", "completed"]
+
+def _extract_files(paths: list[str]) -> list:
+    # [(text, error)] per path, extracted in parallel; OCR work still goes
+    # through the shared OCR process pool
+    def extract(path):
+        try:
+            return TextExtractor.extract_text(path), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=BATCH_EXTRACT_THREADS, thread_name_prefix="batch-extract") as executor:
+        return list(executor.map(contextvars.copy_context().run, [extract] * len(paths), paths))
+
+@app.post("/api/batch")
+async def submit_batch_api(
+    files: List[UploadFile] = File(...),
+    user_email: str = Form(None),
+    name: str = Form(None),
+    threshold_high: float = Form(0.85),
+    threshold_medium: float = Form(0.7),
+    pair_threshold: float = Form(BATCH_PAIR_THRESHOLD),
+    db: Session = Depends(get_db)
+):
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=UPLOAD_TMP_DIR)
+    documents, skipped = [], []
+    try:
+        # 1. Spool every upload, unpacking zip archives
+        total = 0
+        for file in files:
+            is_zip = (file.filename or "").lower().endswith(".zip")
+            path, size, content_hash = await _spool_upload(file, work_dir, BATCH_MAX_BYTES if is_zip else UPLOAD_MAX_BYTES)
+            total += size
+            if BATCH_MAX_BYTES and total > BATCH_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Batch is larger than {BATCH_MAX_BYTES} bytes")
+            if not is_zip:
+                documents.append({"filename": file.filename, "path": path, "content_hash": content_hash})
+                continue
+            unpacked_dir = tempfile.mkdtemp(dir=work_dir)
+            try:
+                members = await run_in_pool(expand_archive, path, unpacked_dir, BATCH_MAX_FILES,
+                                            UPLOAD_MAX_BYTES, BATCH_MAX_BYTES - total if BATCH_MAX_BYTES else 0)
+            except ExtractionLimitExceeded as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid zip archive")
+            for member, member_path in members:
+                documents.append({"filename": os.path.basename(member), "path": member_path,
+                                  "content_hash": _file_hash(member_path)})
+        if BATCH_MAX_FILES and len(documents) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Batch has more than {BATCH_MAX_FILES} documents")
+
+        # 2. Extract text, reusing earlier extractions of identical files
+        to_extract = []
+        for document in documents:
+            cached = db.query(UploadCache.text).filter(UploadCache.content_hash == document["content_hash"]).first() \
+                if DEDUP_POLICY != "off" else None
+            (CACHE_MISSES if cached is None else CACHE_HITS).inc(cache="upload")
+            if cached is not None:
+                document["text"] = cached.text
+            elif os.path.splitext(document["filename"])[1].lower() not in SUPPORTED_EXTENSIONS:
+                document["error"] = "Unsupported file format"
+            else:
+                to_extract.append(document)
+        if to_extract:
+            extracted = await run_in_pool(_extract_files, [d["path"] for d in to_extract])
+            for document, (text, error) in zip(to_extract, extracted):
+                document["text"], document["error"] = text, error
+                if text and text.strip() and DEDUP_POLICY != "off":
+                    db.merge(UploadCache(content_hash=document["content_hash"], text=text))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for document in documents:
+        if not (document.get("text") or "").strip():
+            skipped.append({"filename": document["filename"],
+                            "error": document.get("error") or "Could not extract text from file."})
+    documents = [d for d in documents if (d.get("text") or "").strip()]
+    if not documents:
+        db.commit()
+        raise HTTPException(status_code=400, detail={"message": "No text could be extracted", "skipped": skipped})
+
+    # 3. One Submission per document, checked by a batch job
+    user = db.query(User).filter(User.email == user_email).first() if user_email else None
+    batch = BatchCheck(user_id=user.id if user else None, name=name, status="queued", stage="queued", options={
+        "threshold_high": threshold_high, "threshold_medium": threshold_medium, "pair_threshold": pair_threshold
+    })
+    db.add(batch)
+    db.flush()
+    submissions = [Submission(
+        user_id=batch.user_id,
+        batch_id=batch.id,
+        filename=document["filename"],
+        student_name=os.path.splitext(document["filename"])[0],
+        content_text=document["text"],
+        status="queued",
+        stage="queued",
+        job_options={"threshold_high": threshold_high, "threshold_medium": threshold_medium}
+    ) for document in documents]
+    db.add_all(submissions)
+    db.commit()
+    try:
+        batch_jobs.submit(batch.id)
+    except JobQueueFull:
+        for submission in submissions:
+            db.delete(submission)
+        db.delete(batch)
+        db.commit()
+        raise HTTPException(status_code=503, detail="Too many pending batches, please retry shortly",
+                            headers={"Retry-After": "60"})
+    return {
+        "success": True,
+        "batch_id": batch.id,
+        "documents": [{"submission_id": s.id, "filename": s.filename, "student_name": s.student_name} for s in submissions],
+        "skipped": skipped,
+        "status_url": f"/api/batch/{batch.id}"
+    }
+
+def _run_batch(db: Session, batch: BatchCheck, on_stage) -> dict:
+    start_time = time.time()
+    options = batch.options or {}
+    threshold_high = options.get("threshold_high", 0.85)
+    threshold_medium = options.get("threshold_medium", 0.7)
+    submissions = db.query(Submission).filter(Submission.batch_id == batch.id).order_by(Submission.id).all()
+    # Documents finished before a restart are compared again but not re-checked
+    pending = [i for i, submission in enumerate(submissions) if submission.status != "completed"]
+
+    # 1. Sentence splits of the whole batch, parsed in one pass
+    on_stage("preprocessing")
+    with stage("preprocessing"):
+        sentence_lists = _segment_submissions(db, submissions)
+    db.commit()
+    SENTENCES_PROCESSED.inc(sum(len(sentences) for sentences in sentence_lists), stage="preprocessing")
+    offsets = [0]
+    for sentences in sentence_lists:
+        offsets.append(offsets[-1] + len(sentences))
+
+    # 2. One encode call for every sentence in the batch
+    on_stage("encoding")
+    all_sentences = [sentence for sentences in sentence_lists for sentence in sentences]
+    with stage("batch_encoding"):
+        embeddings = get_ai_engine().generate_embeddings(all_sentences)
+
+    # 3. Every document against every other one: one similarity matrix over
+    # the batch's sentence embeddings
+    on_stage("cross_matching")
+    with stage("cross_matching"):
+        coverage, pairs = cross_document_matches(embeddings, [len(sentences) for sentences in sentence_lists],
+                                                 threshold=options.get("pair_threshold", BATCH_PAIR_THRESHOLD))
+    batch_matches = [[] for _ in submissions]
+    for pair in pairs:
+        a, b = pair["documents"]
+        pair["submission_ids"] = [submissions[a].id, submissions[b].id]
+        for example in pair["examples"]:
+            example["text_a"] = sentence_lists[a][example["sentence_a"]]
+            example["text_b"] = sentence_lists[b][example["sentence_b"]]
+        for this, other, side in ((a, b, 0), (b, a, 1)):
+            batch_matches[this].append({"submission_id": submissions[other].id, "filename": submissions[other].filename,
+                                        "coverage": pair["coverage"][side], "max_score": pair["max_score"]})
+
+    # 4. AI detection, windows of all documents batched together
+    on_stage("ai_detection")
+    with stage("ai_detection"):
+        detections = get_ai_detector().detect_windows_batch([submissions[i].content_text for i in pending])
+
+    # 5. Each document against the shared index with its precomputed
+    # vectors. All searches run before any document of the batch is added,
+    # so batch documents only ever match each other through step 3.
+    on_stage("similarity_search")
+    completed_ids = [submission.id for submission in submissions if submission.status == "completed"]
+    searches = []
+    with stage("similarity_search"):
+        for i in pending:
+            own_copies, _ = _earlier_copies(db, submissions[i])
+            searches.append(get_ai_engine().search_document(
+                sentence_lists[i], top_k=1, exclude_doc_ids=own_copies + completed_ids,
+                embeddings=embeddings[offsets[i]:offsets[i + 1]]))
+
+    # 6. Save each report and index the documents, one copy per text
+    on_stage("saving")
+    for i, detection, (results, doc_embeddings) in zip(pending, detections, searches):
+        submission = submissions[i]
+        _, indexed_copy = _earlier_copies(db, submission)
+        with stage("stylometry"):
+            style_metrics, style_vector = Stylometry.extract(submission.content_text)
+        _complete_check(db, submission, sentence_lists[i], style_metrics, detection, results, doc_embeddings,
+                        indexed_copy, threshold_high, threshold_medium, start_time, lambda stage: None,
+                        extra_report={"batch_id": batch.id, "batch_matches": batch_matches[i]},
+                        style_vector=style_vector)
+
+    report = {
+        "documents": [{
+            "submission_id": submission.id,
+            "filename": submission.filename,
+            "student_name": submission.student_name,
+            "overall_score": submission.similarity_score,
+            "ai_score": submission.ai_score,
+            "sentences": len(sentence_lists[i])
+        } for i, submission in enumerate(submissions)],
+        "coverage": coverage,
+        "pairs": pairs,
+        "pair_threshold": options.get("pair_threshold", BATCH_PAIR_THRESHOLD),
+        "processing_time": round(time.time() - start_time, 2),
+        "timestamp": datetime.now().isoformat()
+    }
+    batch.report = report
+    batch.status = "completed"
+    batch.stage = "completed"
+    db.commit()
+    return report
 
+def _run_batch_job(batch_id: int, on_stage):
+    db = SessionLocal()
+    try:
+        batch = db.query(BatchCheck).filter(BatchCheck.id == batch_id).first()
+        if batch is None:
+            raise ValueError(f"Batch {batch_id} not found")
+
+        def report_stage(stage):
+            on_stage(stage)
+            batch.status = "running"
+            batch.stage = stage
+            db.commit()
+
+        try:
+            return _run_batch(db, batch, report_stage)
+        except Exception as e:
+            db.rollback()
+            batch.status = "failed"
+            batch.error = str(e)
+            db.commit()
+            raise
+    finally:
+        db.close()
+
+batch_jobs = JobQueue(lambda batch_id, on_stage: worker_pool.call(_run_batch_job, batch_id, on_stage),
+                      workers=int(os.environ.get("BATCH_WORKERS", 1)),
+                      max_pending=int(os.environ.get("BATCH_QUEUE_LIMIT", 10)))
+
+@app.on_event("startup")
+def start_batch_jobs():
+    batch_jobs.start()
+    db = SessionLocal()
+    try:
+        pending = db.query(BatchCheck.id).filter(BatchCheck.status.in_(["queued", "running"])).order_by(BatchCheck.id).all()
+        for (batch_id,) in pending:
+            try:
+                batch_jobs.submit(batch_id)
+            except JobQueueFull:
+                break
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def stop_batch_jobs():
+    batch_jobs.shutdown()
+
+@app.get("/api/batch/{batch_id}")
+def get_batch_api(batch_id: int, db: Session = Depends(get_db)):
+    batch = db.query(BatchCheck).filter(BatchCheck.id == batch_id).first()
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    counts = dict(db.query(Submission.status, func.count(Submission.id)).filter(
+        Submission.batch_id == batch_id).group_by(Submission.status).all())
+    state = batch_jobs.get(batch_id) or {}
+    stage = state.get("stage") or batch.stage or batch.status
     return {
         "success": True,
-        "result": {
-            "overall_score": plagiarism_score,
-            "ai_score": ai_prob,
-            "chunks": chunks,
-            "matches": matches,
-            "high_risk_count": high_risk,
-            "medium_risk_count": medium_risk,
-            "low_risk_count": low_risk,
-            "processing_time": processing_time,
-            "timestamp": timestamp
+        "batch": {
+            "batch_id": batch.id,
+            "name": batch.name,
+            "status": state.get("status") if state.get("status") in ("queued", "running") else batch.status,
+            "stage": stage,
+            "progress": round(BATCH_STAGES.index(stage) / (len(BATCH_STAGES) - 1), 2) if stage in BATCH_STAGES else None,
+            "queue_position": batch_jobs.position(batch_id),
+            "documents": sum(counts.values()),
+            "completed_documents": counts.get("completed", 0),
+            "error": batch.error or state.get("error"),
+            "result": batch.report if batch.status == "completed" else None
         }
     }
 
+# History is paged newest first by (upload_time, id); the cursor is the id
+# of the last row returned. Only summary columns are read unless
+# include=report / include=text.
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
 @app.get("/api/history")
-async def get_user_history(user_email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_email).first()
+def get_user_history(user_email: str, limit: int = HISTORY_PAGE_SIZE, cursor: str = None, include: str = "",
+                     db: Session = Depends(get_db)):
+    user = db.query(User.id).filter(User.email == user_email).first()
     if not user:
-        return {"success": True, "history": []}
-        
-    submissions = db.query(Submission).filter(Submission.user_id == user.id).order_by(Submission.upload_time.desc()).all()
-    
+        return {"success": True, "history": [], "next_cursor": None}
+
+    extra = set(filter(None, include.split(",")))
+    columns = [Submission.id, Submission.filename, Submission.student_name, Submission.upload_time,
+               Submission.similarity_score, Submission.ai_score]
+    if "report" in extra:
+        columns.append(SubmissionContent.plagiarism_report)
+    if "text" in extra:
+        columns.append(SubmissionContent.text)
+
+    query = db.query(*columns)
+    if extra & {"report", "text"}:
+        query = query.outerjoin(SubmissionContent)
+    query = query.filter(Submission.user_id == user.id, Submission.status == "completed")
+    if cursor:
+        if not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Compare against the stored timestamp itself, not a re-encoded copy
+        cursor_time = db.query(Submission.upload_time).filter(Submission.id == int(cursor)).scalar_subquery()
+        query = query.filter(or_(Submission.upload_time < cursor_time,
+                                 and_(Submission.upload_time == cursor_time, Submission.id < int(cursor))))
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    rows = query.order_by(Submission.upload_time.desc(), Submission.id.desc()).limit(limit + 1).all()
+
     history = []
-    for sub in submissions:
+    for sub in rows[:limit]:
         # Reconstruct the expected frontend format
-        history.append({
+        item = {
             "id": f"analysis_{sub.id}",
             "filename": sub.filename,
             "student_name": sub.student_name,
             "timestamp": sub.upload_time,
-            "result": sub.plagiarism_report,
+            "result": sub.plagiarism_report if "report" in extra else
+                      {"overall_score": sub.similarity_score, "ai_score": sub.ai_score},
             "status": "completed"
-        })
-        
-    return {"success": True, "history": history}
+        }
+        if "text" in extra:
+            item["text"] = sub.text
+        history.append(item)
+
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    return {"success": True, "history": history, "next_cursor": next_cursor}
+
+@app.get("/api/history/{submission_id}")
+def get_history_item(submission_id: int, user_email: str, db: Session = Depends(get_db)):
+    # Full stored report and text of one of the user's submissions
+    sub = db.query(Submission).join(User, Submission.user_id == User.id).filter(
+        Submission.id == submission_id, User.email == user_email).first()
+    if sub is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return {
+        "success": True,
+        "item": {
+            "id": f"analysis_{sub.id}",
+            "filename": sub.filename,
+            "student_name": sub.student_name,
+            "timestamp": sub.upload_time,
+            "text": sub.content_text,
+            "result": sub.plagiarism_report,
+            "status": sub.status
+        }
+    }
+
+@app.get("/api/students/style")
+def get_student_styles(user_email: str, student_name: str = None, db: Session = Depends(get_db)):
+    # Style profiles of the user's students, built up from their checks
+    user = db.query(User.id).filter(User.email == user_email).first()
+    if not user:
+        return {"success": True, "profiles": []}
+    query = db.query(StudentStyleProfile).filter(StudentStyleProfile.user_id == user.id)
+    if student_name is not None:
+        query = query.filter(StudentStyleProfile.student_name == student_name)
+    return {"success": True,
+            "profiles": [profile_summary(record) for record in query.order_by(StudentStyleProfile.student_name)]}
+
+def _index_size(timeout: float = None):
+    # Never loads the model just for a number: ask whoever owns the index,
+    # otherwise read the size off the index files. None when the index
+    # server can't be reached.
+    if _index_service is not None:
+        try:
+            return _index_service.index_size(timeout=timeout)
+        except IndexServiceError:
+            return None
+    if ai_engine_model.instance is not None:
+        return ai_engine_model.instance.index_size()
+    return IndexStore(DEFAULT_INDEX_PATH, DIMENSION).count_rows() or 0
+
+# Scrape-time values for /metrics. A scrape asks a separate index server
+# for the index size with a short timeout and reports nothing if it is slow.
+INDEX_METRICS_TIMEOUT = float(os.environ.get("INDEX_METRICS_TIMEOUT", 1))
+QUEUE_DEPTH.set_function(lambda: worker_pool.queue_depth, queue="worker_pool")
+QUEUE_DEPTH.set_function(lambda: check_jobs.pending, queue="check_jobs")
+QUEUE_DEPTH.set_function(lambda: batch_jobs.pending, queue="batch_jobs")
+_engine = lambda: ai_engine_model.instance
+QUEUE_DEPTH.set_function(lambda: _engine().writer.pending if _engine() else None, queue="index_writer")
+CACHE_HITS.set_function(lambda: _engine().embedding_cache.hits if _engine() else None, cache="embedding")
+CACHE_MISSES.set_function(lambda: _engine().embedding_cache.misses if _engine() else None, cache="embedding")
+INDEX_VECTORS.set_function(lambda: _index_size(timeout=INDEX_METRICS_TIMEOUT))
+
+@app.get("/metrics")
+def metrics_api():
+    # Prometheus text format; encoding and FAISS timings of a separate
+    # index server are on its own /metrics
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/api/stats")
-async def get_stats_api(user_email: str = None, db: Session = Depends(get_db)):
+def get_stats_api(user_email: str = None, db: Session = Depends(get_db)):
+    query = db.query(func.count(Submission.id))
     if user_email:
-        user = db.query(User).filter(User.email == user_email).first()
+        user = db.query(User.id).filter(User.email == user_email).first()
         if user:
-            count = db.query(Submission).filter(Submission.user_id == user.id).count()
-            return {
-                "success": True,
-                "stats": {
-                    "total_documents": count,
-                    "index_size": get_ai_engine().index.ntotal
-                }
-            }
-            
-    count = db.query(Submission).count()
+            query = query.filter(Submission.user_id == user.id)
     return {
         "success": True,
         "stats": {
-            "total_documents": count,
-            "index_size": get_ai_engine().index.ntotal
+            "total_documents": query.scalar(),
+            "index_size": _index_size()
         }
     }
 
+# Streaming rebuild: paged reads, batched parsing/encoding, built beside the
+# live index and swapped in when complete (see core/index_builder.py)
+_index_rebuilder = None
+
+def get_index_rebuilder():
+    global _index_rebuilder
+    if _index_rebuilder is None:
+        _index_rebuilder = IndexRebuilder(get_ai_engine(), rebuild_fetch_page,
+                                          rebuild_segment_page, rebuild_count_total)
+    return _index_rebuilder
+
 @app.post("/api/rebuild-index")
-async def rebuild_index_api(db: Session = Depends(get_db)):
+async def rebuild_index_api(request: dict = None):
+    # Starts (or resumes after a crash) a background rebuild; pass
+    # {"restart": true} to discard an unfinished one
+    restart = bool((request or {}).get("restart", False))
     try:
-        import faiss
-        engine_instance = get_ai_engine()
-        engine_instance.index = faiss.IndexFlatIP(engine_instance.dimension)
-        engine_instance.metadata = []
-        submissions = db.query(Submission).all()
-        for sub in submissions:
-            preprocessed = Preprocessor.preprocess(sub.content_text)
-            sentences = preprocessed["sentences"]
-            if sentences:
-                engine_instance.add_to_index(sentences, str(sub.id))
-        return {"success": True, "message": f"Successfully re-indexed {len(submissions)} documents"}
+        if _index_service is not None:
+            # The index server owns the index, so it runs the rebuild
+            response = await run_in_pool(_index_service.start_rebuild, restart)
+            started, status = response["started"], response["rebuild"]
+        else:
+            rebuilder = await run_in_pool(get_index_rebuilder)
+            started = rebuilder.start(restart=restart)
+            status = rebuilder.status()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Rebuild failed: {str(e)}")
+    return {
+        "success": True,
+        "message": "Index rebuild started" if started else "Index rebuild already in progress",
+        "status_url": "/api/rebuild-index/status",
+        "rebuild": status
+    }
+
+@app.get("/api/rebuild-index/status")
+def rebuild_index_status_api():
+    if _index_service is not None:
+        return {"success": True, "rebuild": _index_service.rebuild_status()}
+    if _index_rebuilder is None:
+        return {"success": True, "rebuild": {"status": "idle"}}
+    return {"success": True, "rebuild": _index_rebuilder.status()}
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,167 @@
+import argparse
+import os
+import sys
+
+from sqlalchemy import Column, Integer, JSON, MetaData, Table, Text, inspect, null, select, text
+from sqlalchemy.orm import Session
+
+# Add the current directory to sys.path to allow imports to work when run from root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Base, engine as default_engine, make_engine, upgrade_schema
+from models import Submission, SubmissionContent, StudentStyleProfile
+from core.stylometry import Stylometry
+from style_profiles import load_profile, store_profile
+
+# Data migrations. The API runs migrate_submission_content() at startup;
+# the rest is run by hand:
+#
+#   python backend/migrations.py content [--database URL]
+#   python backend/migrations.py copy --source sqlite:///./data/plagiarism_v3.db --target postgresql://...
+#   python backend/migrations.py style [--database URL]
+MIGRATION_BATCH = int(os.environ.get("MIGRATION_BATCH", 500))
+
+# The columns that moved from submissions to submission_content
+_legacy_submissions = Table(
+    "submissions", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("content_text", Text),
+    Column("sentences", JSON),
+    Column("plagiarism_report", JSON)
+)
+
+def migrate_submission_content(bind=None) -> int:
+    # Databases created before submission_content keep text (and, from some
+    # versions, sentences) and report inline in submissions. Copy them over
+    # in batches and blank the old columns; safe to interrupt and re-run.
+    bind = bind or default_engine
+    present = {c["name"] for c in inspect(bind).get_columns("submissions")}
+    if "content_text" not in present:
+        return 0
+
+    legacy = _legacy_submissions.c
+    # Only the original schema's columns are guaranteed; sentences was
+    # inline only in some intermediate versions
+    moved_columns = [name for name in ("sentences", "plagiarism_report") if name in present]
+    content = SubmissionContent.__table__
+    moved = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(legacy.id, legacy.content_text, *(legacy[name] for name in moved_columns)).where(
+                    legacy.id > last_id, legacy.content_text.isnot(None)
+                ).order_by(legacy.id).limit(MIGRATION_BATCH)
+            ).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            done = set(conn.execute(select(content.c.submission_id).where(content.c.submission_id.in_(ids))).scalars())
+            pending = [dict({"submission_id": row.id, "text": row.content_text},
+                            **{name: row._mapping[name] for name in moved_columns})
+                       for row in rows if row.id not in done]
+            if pending:
+                conn.execute(content.insert(), pending)
+            # null(), not None: None would be stored as the JSON literal 'null'
+            conn.execute(_legacy_submissions.update().where(legacy.id.in_(ids)).values(
+                content_text=null(), **{name: null() for name in moved_columns}))
+        last_id = ids[-1]
+        moved += len(rows)
+        print(f"Moved content of {moved} submissions to submission_content")
+    return moved
+
+def copy_database(source_url: str, target_url: str):
+    # Copy every table into a fresh database, e.g. SQLite to Postgres. The
+    # source is brought up to the current schema first.
+    source = make_engine(source_url)
+    target = make_engine(target_url)
+    Base.metadata.create_all(bind=source)
+    upgrade_schema(source)
+    migrate_submission_content(source)
+    Base.metadata.create_all(bind=target)
+
+    source_inspector = inspect(source)
+    for table in Base.metadata.sorted_tables:
+        present = {c["name"] for c in source_inspector.get_columns(table.name)}
+        columns = [c for c in table.columns if c.name in present]
+        order = list(table.primary_key.columns)
+        copied = 0
+        with source.connect() as src:
+            result = src.execution_options(stream_results=True).execute(select(*columns).order_by(*order))
+            for batch in result.partitions(MIGRATION_BATCH):
+                with target.begin() as dst:
+                    dst.execute(table.insert(), [dict(row._mapping) for row in batch])
+                copied += len(batch)
+        print(f"{table.name}: {copied} rows")
+
+    if target.dialect.name == "postgresql":
+        # Rows were inserted with explicit ids; move the sequences past them
+        with target.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                if "id" in table.c and table.c.id.autoincrement in (True, "auto") and table.c.id.primary_key:
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                        f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                    ))
+
+def rebuild_style_profiles(bind=None) -> int:
+    # Style profiles from scratch, from every completed submission with an
+    # owner in upload order. Profiles otherwise only grow with new checks.
+    bind = bind or default_engine
+    profiles = {}
+    seen = 0
+    with Session(bind) as db:
+        last_id = 0
+        while True:
+            rows = db.query(Submission.id, Submission.user_id, Submission.student_name, SubmissionContent.text).join(
+                SubmissionContent).filter(
+                Submission.status == "completed", Submission.user_id.isnot(None), Submission.id > last_id
+            ).order_by(Submission.id).limit(MIGRATION_BATCH).all()
+            if not rows:
+                break
+            for row in rows:
+                vector = Stylometry.extract(row.text or "")[1]
+                profile = profiles.setdefault((row.user_id, row.student_name), load_profile(None))
+                if vector is not None and not profile.contains(vector):
+                    profile.add(vector, row.id)
+            last_id = rows[-1].id
+            seen += len(rows)
+            print(f"Profiled {seen} submissions")
+
+        db.query(StudentStyleProfile).delete()
+        for (user_id, student_name), profile in profiles.items():
+            record = StudentStyleProfile(user_id=user_id, student_name=student_name)
+            store_profile(record, profile)
+            db.add(record)
+        db.commit()
+    print(f"{len(profiles)} student style profiles")
+    return len(profiles)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    content_parser = commands.add_parser("content", help="move submission text and reports to submission_content")
+    content_parser.add_argument("--database", help="database URL (default: DATABASE_URL)")
+    copy_parser = commands.add_parser("copy", help="copy all data into another database")
+    copy_parser.add_argument("--source", required=True)
+    copy_parser.add_argument("--target", required=True)
+    style_parser = commands.add_parser("style", help="rebuild student style profiles from stored submissions")
+    style_parser.add_argument("--database", help="database URL (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    if args.command == "content":
+        bind = make_engine(args.database) if args.database else default_engine
+        Base.metadata.create_all(bind=bind)
+        upgrade_schema(bind)
+        migrate_submission_content(bind)
+        if bind.dialect.name == "sqlite":
+            # Hand the space freed by the blanked columns back to the filesystem
+            with bind.connect() as conn:
+                conn.execute(text("VACUUM"))
+    elif args.command == "style":
+        bind = make_engine(args.database) if args.database else default_engine
+        Base.metadata.create_all(bind=bind)
+        upgrade_schema(bind)
+        rebuild_style_profiles(bind)
+    else:
+        copy_database(args.source, args.target)
@@ -1,8 +1,45 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Text, ForeignKey
+import json
+import zlib
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Text, ForeignKey, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from database import Base
 
+class CompressedText(TypeDecorator):
+    # zlib-compressed UTF-8; essays and reports shrink 3-5x
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else zlib.compress(value.encode("utf-8"), 6)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else zlib.decompress(value).decode("utf-8")
+
+class CompressedJSON(CompressedText):
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return super().process_bind_param(None if value is None else json.dumps(value), dialect)
+
+    def process_result_value(self, value, dialect):
+        value = super().process_result_value(value, dialect)
+        return None if value is None else json.loads(value)
+
+def _content_property(name):
+    # Submission.<name> reads and writes the row in submission_content,
+    # creating it on first write
+    def getter(self):
+        return getattr(self.content, name) if self.content is not None else None
+
+    def setter(self, value):
+        if self.content is None:
+            self.content = SubmissionContent()
+        setattr(self.content, name, value)
+
+    return property(getter, setter)
+
 class Submission(Base):
     __tablename__ = "submissions"
 
@@ -11,16 +48,92 @@ class Submission(Base):
     filename = Column(String, index=True)
     student_name = Column(String, index=True)
     upload_time = Column(DateTime(timezone=True), server_default=func.now())
-    content_text = Column(Text)
+    # SHA-256 of the normalised content_text, so rebuilds and re-checks of
+    # unchanged text can reuse the stored sentence split
+    text_hash = Column(String, index=True)
+    # Earlier submission of the same text whose sentences are in the index;
+    # set means this one was never added to it
+    duplicate_of = Column(Integer, nullable=True, index=True)
+    # Set for documents submitted together through /api/batch
+    batch_id = Column(Integer, ForeignKey("batch_checks.id"), nullable=True, index=True)
     
     # Analysis Results
     similarity_score = Column(Float, default=0.0)
     ai_score = Column(Float, default=0.0)
-    plagiarism_report = Column(JSON, default={})
     stylometry_data = Column(JSON, default={})
 
+    # Job state for /api/check/jobs; synchronous checks are stored as completed
+    status = Column(String, default="completed", server_default="completed", index=True)
+    stage = Column(String, nullable=True)
+    job_options = Column(JSON, default={})
+    error = Column(Text, nullable=True)
+
     # Relationships
     owner = relationship("User", back_populates="submissions")
+    # Full text, sentences and report live in submission_content so the rows
+    # scanned by history, stats and job polling stay small
+    content = relationship("SubmissionContent", uselist=False, cascade="all, delete-orphan")
+
+    content_text = _content_property("text")
+    sentences = _content_property("sentences")
+    plagiarism_report = _content_property("plagiarism_report")
+
+    # History pages: one user's submissions, newest first
+    __table_args__ = (Index("ix_submissions_user_upload_time", "user_id", "upload_time"),)
+
+class SubmissionContent(Base):
+    __tablename__ = "submission_content"
+
+    submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), primary_key=True)
+    text = Column(CompressedText)
+    # {"segmenter": ..., "sentences": [...], "offsets": [[start, end], ...]} with
+    # offsets into the cleaned text, so re-checks skip spaCy
+    sentences = Column(CompressedJSON, nullable=True)
+    plagiarism_report = Column(CompressedJSON, nullable=True)
+
+class BatchCheck(Base):
+    # A set of documents checked together, e.g. a whole class; each is also a
+    # Submission with this batch_id
+    __tablename__ = "batch_checks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    name = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    status = Column(String, default="queued", index=True)
+    stage = Column(String, nullable=True)
+    options = Column(JSON, default={})
+    error = Column(Text, nullable=True)
+    # Cross-document comparison: coverage matrix and matching pairs
+    report = Column(CompressedJSON, nullable=True)
+
+class StudentStyleProfile(Base):
+    # Running style statistics of one owner's student (user_id, student_name),
+    # updated after each of their checks (see core/stylometry.py:StyleProfile).
+    # Vectors are raw float arrays of the feature layout in feature_version.
+    __tablename__ = "student_style_profiles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    student_name = Column(String)
+    feature_version = Column(String)
+    count = Column(Integer, default=0)
+    mean = Column(LargeBinary)
+    m2 = Column(LargeBinary)
+    # Vectors of the latest documents, oldest first, and their submission ids
+    history = Column(LargeBinary)
+    history_ids = Column(JSON, default=[])
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("ix_style_profiles_student", "user_id", "student_name", unique=True),)
+
+class UploadCache(Base):
+    # Extracted text by SHA-256 of the raw uploaded bytes
+    __tablename__ = "upload_cache"
+
+    content_hash = Column(String, primary_key=True)
+    text = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class User(Base):
     __tablename__ = "users"
@@ -0,0 +1,81 @@
+# Per-student style profiles in the database: the StudentStyleProfile rows
+# behind core/stylometry.py:StyleProfile, used by the API after each check
+# and by migrations.py to build profiles from existing submissions
+import os
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import StudentStyleProfile
+from core.stylometry import StyleProfile, FEATURE_VERSION, DIMENSION
+
+# Documents whose vectors are kept per student for comparison
+STYLE_HISTORY_LIMIT = int(os.environ.get("STYLE_HISTORY_LIMIT", 50))
+# Earlier documents needed before drift is judged at all
+STYLE_MIN_HISTORY = int(os.environ.get("STYLE_MIN_HISTORY", 3))
+# How far outside the student's usual spread (in standard deviations) a
+# document must be to be flagged
+STYLE_DRIFT_Z = float(os.environ.get("STYLE_DRIFT_Z", 3.0))
+
+def load_profile(record: StudentStyleProfile) -> StyleProfile:
+    if record is None or record.feature_version != FEATURE_VERSION or not record.count:
+        return StyleProfile(limit=STYLE_HISTORY_LIMIT)
+    return StyleProfile(
+        count=record.count,
+        # Copies: arrays over the stored bytes are read-only
+        mean=np.frombuffer(record.mean, dtype=np.float64).copy(),
+        m2=np.frombuffer(record.m2, dtype=np.float64).copy(),
+        history=np.frombuffer(record.history, dtype=np.float32).reshape(-1, DIMENSION).copy(),
+        history_ids=record.history_ids,
+        limit=STYLE_HISTORY_LIMIT
+    )
+
+def store_profile(record: StudentStyleProfile, profile: StyleProfile):
+    record.feature_version = FEATURE_VERSION
+    record.count = profile.count
+    record.mean = profile.mean.tobytes()
+    record.m2 = profile.m2.tobytes()
+    record.history = profile.history.astype(np.float32).tobytes()
+    record.history_ids = list(profile.history_ids)
+
+def _profile_record(db: Session, user_id: int, student_name: str) -> StudentStyleProfile:
+    # The student's row, locked for the update on databases that support it;
+    # created if missing (a concurrent insert of the same student wins)
+    query = db.query(StudentStyleProfile).filter(
+        StudentStyleProfile.user_id == user_id, StudentStyleProfile.student_name == student_name
+    )
+    record = query.with_for_update().first()
+    if record is not None:
+        return record
+    try:
+        with db.begin_nested():
+            record = StudentStyleProfile(user_id=user_id, student_name=student_name, count=0)
+            db.add(record)
+            db.flush()
+        return record
+    except IntegrityError:
+        return query.with_for_update().first()
+
+def compare_and_update(db: Session, user_id: int, student_name: str, vector, submission_id: int):
+    # Drift of a new document against the student's profile, then the
+    # document is added to it. Documents without an owner have no profile.
+    # The caller commits.
+    if user_id is None or vector is None:
+        return None
+    record = _profile_record(db, user_id, student_name)
+    profile = load_profile(record)
+    drift = profile.compare(vector, min_history=STYLE_MIN_HISTORY, drift_z=STYLE_DRIFT_Z)
+    if not profile.contains(vector):
+        profile.add(vector, submission_id)
+        store_profile(record, profile)
+    return drift
+
+def profile_summary(record: StudentStyleProfile) -> dict:
+    profile = load_profile(record)
+    return {
+        "student_name": record.student_name,
+        "documents": profile.count,
+        "submission_ids": profile.history_ids,
+        "updated_at": record.updated_at,
+        "baseline_ready": profile.count >= STYLE_MIN_HISTORY
+    }
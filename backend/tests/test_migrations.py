@@ -0,0 +1,74 @@
+# Upgrading databases created by earlier schemas to the current one, the way
+# main.py does at startup
+import os
+import sys
+
+import pytest
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, JSON, MetaData, String, Table, Text, create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, upgrade_schema
+from migrations import migrate_submission_content
+from models import Submission, SubmissionContent
+
+def legacy_schema(with_sentences: bool) -> MetaData:
+    # The original models (submissions holding text and report inline); the
+    # intermediate schema also kept the sentence split there
+    metadata = MetaData()
+    Table("users", metadata,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("name", String),
+          Column("email", String, unique=True, index=True),
+          Column("password_hash", String),
+          Column("created_at", DateTime(timezone=True)))
+    columns = [
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id"), index=True),
+        Column("filename", String, index=True),
+        Column("student_name", String, index=True),
+        Column("upload_time", DateTime(timezone=True)),
+        Column("content_text", Text),
+        Column("similarity_score", Float, default=0.0),
+        Column("ai_score", Float, default=0.0),
+        Column("plagiarism_report", JSON, default={}),
+        Column("stylometry_data", JSON, default={}),
+    ]
+    if with_sentences:
+        columns.append(Column("sentences", JSON))
+    Table("submissions", metadata, *columns)
+    return metadata
+
+@pytest.mark.parametrize("with_sentences", [False, True], ids=["baseline", "inline_sentences"])
+def test_migrate_legacy_database(tmp_path, with_sentences):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    metadata = legacy_schema(with_sentences)
+    metadata.create_all(engine)
+    submissions = metadata.tables["submissions"]
+    with engine.begin() as conn:
+        conn.execute(metadata.tables["users"].insert(), [{"id": 1, "name": "T", "email": "t@example.org"}])
+        rows = [{"id": i, "user_id": 1, "filename": f"essay{i}.txt", "content_text": f"Essay number {i}.",
+                 "plagiarism_report": {"overall_score": i}} for i in (1, 2, 3)]
+        if with_sentences:
+            for row in rows:
+                row["sentences"] = {"segmenter": "test", "sentences": [row["content_text"]]}
+        conn.execute(submissions.insert(), rows)
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    assert migrate_submission_content(engine) == 3
+    # Nothing left to move on a second run
+    assert migrate_submission_content(engine) == 0
+
+    with Session(engine) as db:
+        contents = db.query(SubmissionContent).order_by(SubmissionContent.submission_id).all()
+        assert [c.text for c in contents] == ["Essay number 1.", "Essay number 2.", "Essay number 3."]
+        assert [c.plagiarism_report for c in contents] == [{"overall_score": 1}, {"overall_score": 2}, {"overall_score": 3}]
+        if with_sentences:
+            assert contents[0].sentences == {"segmenter": "test", "sentences": ["Essay number 1."]}
+        else:
+            assert all(c.sentences is None for c in contents)
+        assert db.get(Submission, 2).content_text == "Essay number 2."
+    with engine.connect() as conn:
+        assert conn.execute(select(submissions.c.content_text)).scalars().all() == [None, None, None]
@@ -19,39 +19,69 @@ interface AnalysisContextType {
     setCurrentAnalysis: (analysis: AnalysisData | null) => void;
     addToHistory: (analysis: AnalysisData) => void;
     refreshHistory: () => Promise<void>;
+    hasMoreHistory: boolean;
+    loadingMoreHistory: boolean;
+    loadMoreHistory: () => Promise<void>;
     clearHistory: () => void;
     getAnalysisById: (id: string) => AnalysisData | undefined;
 }
 
 const AnalysisContext = createContext<AnalysisContextType | undefined>(undefined);
 
+// History items from the API, with timestamps converted back to Date objects
+const toAnalyses = (history: any[]): AnalysisData[] => history.map(item => ({
+    ...item,
+    timestamp: new Date(item.timestamp)
+}));
+
 export const AnalysisProvider: React.FC<{ children: ReactNode }> = ({ children }) => {
     const [currentAnalysis, setCurrentAnalysis] = useState<AnalysisData | null>(null);
     const [analysisHistory, setAnalysisHistory] = useState<AnalysisData[]>([]);
+    // Cursor of the next history page; null once everything is loaded
+    const [historyCursor, setHistoryCursor] = useState<string | null>(null);
+    const [loadingMoreHistory, setLoadingMoreHistory] = useState(false);
     const userInfo = useUser();
 
-    // Fetch history from backend whenever user changes
+    // Fetch the first history page from backend whenever user changes
     const fetchHistory = React.useCallback(async () => {
         if (!userInfo?.email) {
             setAnalysisHistory([]);
+            setHistoryCursor(null);
             return;
         }
 
         try {
             const response = await api.fetchHistory(userInfo.email);
             if (response.success) {
-                // Convert back to Date objects
-                const history = response.history.map(item => ({
-                    ...item,
-                    timestamp: new Date(item.timestamp)
-                }));
-                setAnalysisHistory(history);
+                setAnalysisHistory(toAnalyses(response.history));
+                setHistoryCursor(response.next_cursor);
             }
         } catch (error) {
             console.error('Failed to fetch history:', error);
         }
     }, [userInfo?.email]);
 
+    // Append the next page on demand
+    const loadMoreHistory = React.useCallback(async () => {
+        if (!userInfo?.email || !historyCursor || loadingMoreHistory) return;
+        setLoadingMoreHistory(true);
+        try {
+            const response = await api.fetchHistory(userInfo.email, historyCursor);
+            if (response.success) {
+                const page = toAnalyses(response.history);
+                setAnalysisHistory(prev => {
+                    const seen = new Set(prev.map(a => a.id));
+                    return [...prev, ...page.filter(a => !seen.has(a.id))];
+                });
+                setHistoryCursor(response.next_cursor);
+            }
+        } catch (error) {
+            console.error('Failed to fetch history:', error);
+        } finally {
+            setLoadingMoreHistory(false);
+        }
+    }, [userInfo?.email, historyCursor, loadingMoreHistory]);
+
     useEffect(() => {
         fetchHistory();
     }, [fetchHistory]);
@@ -62,6 +92,7 @@ export const AnalysisProvider: React.FC<{ children: ReactNode }> = ({ children }
 
     const clearHistory = () => {
         setAnalysisHistory([]);
+        setHistoryCursor(null);
     };
 
     const getAnalysisById = (id: string) => {
@@ -77,6 +108,9 @@ export const AnalysisProvider: React.FC<{ children: ReactNode }> = ({ children }
                 setCurrentAnalysis,
                 addToHistory,
                 refreshHistory: fetchHistory,
+                hasMoreHistory: historyCursor !== null,
+                loadingMoreHistory,
+                loadMoreHistory,
                 clearHistory,
                 getAnalysisById,
             }}
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { useAnalysis } from '../context/AnalysisContext';
 
 const MyReports: React.FC = () => {
-    const { analysisHistory } = useAnalysis();
+    const { analysisHistory, hasMoreHistory, loadingMoreHistory, loadMoreHistory } = useAnalysis();
     const navigate = useNavigate();
 
     return (
@@ -34,6 +34,17 @@ const MyReports: React.FC = () => {
                     ))}
                 </ul>
             )}
+            {hasMoreHistory && (
+                <div className="mt-6 flex justify-center">
+                    <button
+                        className="px-4 py-2 border border-border text-white text-xs rounded hover:bg-card transition-colors disabled:opacity-50"
+                        onClick={loadMoreHistory}
+                        disabled={loadingMoreHistory}
+                    >
+                        {loadingMoreHistory ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
@@ -55,6 +55,7 @@ export interface HealthResponse {
     status: string;
     model_loaded: boolean;
     index_ready: boolean;
+    models: Record<string, string>;
     version: string;
 }
 
@@ -169,9 +170,12 @@ class ApiService {
         return response.json();
     }
 
-    // Get user history
-    async fetchHistory(userEmail: string): Promise<{ success: boolean; history: any[] }> {
-        const response = await fetch(`${this.baseUrl}/api/history?user_email=${encodeURIComponent(userEmail)}`);
+    // Get one page of user history (summaries only), newest first. Pass the
+    // returned next_cursor to get the following page; null means no more.
+    async fetchHistory(userEmail: string, cursor?: string | null): Promise<{ success: boolean; history: any[]; next_cursor: string | null }> {
+        const params = new URLSearchParams({ user_email: userEmail });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${this.baseUrl}/api/history?${params}`);
         if (!response.ok) {
             throw new Error('Failed to fetch history');
         }